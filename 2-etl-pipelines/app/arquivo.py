@@ -0,0 +1,74 @@
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.config import ARQUIVO_PARQUET_COMPRESSION
+
+# ============================================================
+# PARQUET SNAPSHOT ARCHIVE (FILES)
+# ============================================================
+# Purpose:
+# - Offline, columnar copy of the snapshot batches, readable
+#   without a database (pd.read_parquet with columns=...)
+#
+# Layout:
+#   <destino>/<TABLE>/dia=YYYY-MM-DD/<YYYYMMDDTHHMMSS>.parquet
+# - One file per batch (dt_carga / dt_insercao); the dia=
+#   directory is a Hive-style partition, so a whole day or a
+#   single batch can be read on its own
+#
+# Notes:
+# - Files are written to a temporary name and renamed, so an
+#   interrupted run never leaves a partial file behind
+# - Optional dependency: only imported by run_arquivo_parquet
+#   (pip install pyarrow)
+# ============================================================
+
+
+def nome_lote(lote):
+    return pd.Timestamp(lote).strftime("%Y%m%dT%H%M%S")
+
+
+def caminho_lote(destino, tabela, lote):
+    dia = pd.Timestamp(lote).strftime("%Y-%m-%d")
+    return os.path.join(destino, tabela, f"dia={dia}", f"{nome_lote(lote)}.parquet")
+
+
+def lotes_arquivados(destino, tabela):
+    raiz = os.path.join(destino, tabela)
+    nomes = set()
+
+    if not os.path.isdir(raiz):
+        return nomes
+
+    for particao in os.listdir(raiz):
+        pasta = os.path.join(raiz, particao)
+        if particao.startswith("dia=") and os.path.isdir(pasta):
+            nomes.update(
+                arquivo[:-len(".parquet")]
+                for arquivo in os.listdir(pasta)
+                if arquivo.endswith(".parquet")
+            )
+
+    return nomes
+
+
+def gravar_lote(df, destino, tabela, lote, compressao=ARQUIVO_PARQUET_COMPRESSION):
+    caminho = caminho_lote(destino, tabela, lote)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+
+    dados = pa.Table.from_pandas(df, preserve_index=False)
+
+    # All-NULL columns have no Arrow type; store them as string
+    # so the day's files share one schema
+    for i, campo in enumerate(dados.schema):
+        if pa.types.is_null(campo.type):
+            dados = dados.set_column(i, campo.name, dados.column(i).cast(pa.string()))
+
+    temporario = caminho + ".tmp"
+    pq.write_table(dados, temporario, compression=compressao)
+    os.replace(temporario, caminho)
+
+    return caminho
@@ -0,0 +1,366 @@
+import hashlib
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from sqlalchemy import inspect, text
+
+from app.config import BACKUP_MAX_WORKERS, BACKUP_CHUNK_ROWS, BACKUP_INCREMENTAL
+from app.db import ENGINE_REMOTE as ENGINE, ENGINE_LOCAL, bulk_insert, bulk_upsert
+
+# ============================================================
+# JOB — FULL REMOTE → LOCAL DATABASE REPLICATION
+# ============================================================
+# Purpose:
+# - Fully replicate ALL tables from the remote database
+# - Preserve schema 1:1 (DDL, types, precision, nullability)
+# - Copy all data into a local MySQL instance
+#
+# IMPORTANT:
+# - This is NOT a dump/export
+# - This is a full structural + data replication
+# - Tables are replicated concurrently (BACKUP_MAX_WORKERS),
+#   each one streamed in BACKUP_CHUNK_ROWS chunks
+#
+# Incremental mode (BACKUP_INCREMENTAL):
+# - Append-only tables listed in TABELAS_INCREMENTAIS copy only
+#   rows past the local high-watermark (MAX of the key column)
+# - Timestamp watermarks re-copy the watermark batch itself,
+#   since a batch may keep growing after the previous backup
+# - Upsert-loaded tables (TABELAS_UPSERT) are tracked by
+#   dt_carga and upserted locally on their unique key
+# - A table is rebuilt from scratch only when its remote DDL
+#   hash differs from the one stored in TB_ENQ_BACKUP_CONTROLE
+#
+# Views:
+# - Recreated locally after every table is copied (CREATE OR
+#   REPLACE), without DEFINER and schema qualifiers, so the
+#   BI queries run unchanged against the local copy
+# ============================================================
+
+# Append-only / upsert tables → watermark column
+TABELAS_INCREMENTAIS = {
+    "TB_ENQ_PL_HISTORICO": "dt_carga",
+    "TB_ENQ_PL_SNAPSHOT": "id_carga",
+    "TB_ENQ_MARGEM_GESTOR_SNAPSHOT": "id_carga",
+    "TB_ENQ_EXPOSI_RISCO_SNAPSHOT_BACKUP": "id_carga",
+    "TB_ENQ_POSICOES_FUNDOS_EXPOSTOS": "dt_insercao",
+    "TB_ENQ_EXPOSI_RISCO_SNAPSHOT": "dt_carga",
+    "TB_ENQ_MARGEM_LOTE_MEMBROS": "dt_carga",
+}
+
+# Tables loaded with upsert → unique key; rows updated in place
+# keep their id_carga, so they are tracked by dt_carga and
+# upserted into the local copy
+TABELAS_UPSERT = {
+    "TB_ENQ_PL_HISTORICO": ["cgePortfolio", "data"],
+}
+
+def backup_local(log, incremental=BACKUP_INCREMENTAL):
+    log("Starting local database replication.")
+
+    # ======================================================
+    # 0. LOCAL CONTROL TABLE (DDL HASH PER TABLE)
+    # ======================================================
+
+    with ENGINE_LOCAL.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS TB_ENQ_BACKUP_CONTROLE (
+                tabela varchar(128) NOT NULL,
+                ddl_hash char(64) NOT NULL,
+                coluna_marca varchar(64) DEFAULT NULL,
+                marca varchar(32) DEFAULT NULL,
+                dt_atualizacao datetime NOT NULL,
+                PRIMARY KEY (tabela)
+            )
+        """))
+
+    controle = pd.read_sql(
+        "SELECT tabela, ddl_hash FROM TB_ENQ_BACKUP_CONTROLE;",
+        ENGINE_LOCAL
+    )
+    ddl_hash_local = dict(zip(controle["tabela"], controle["ddl_hash"]))
+
+    def obter_ddl(tabela):
+        ddl_query = f"SHOW CREATE TABLE {tabela};"
+        return pd.read_sql(ddl_query, ENGINE).iloc[0, 1]
+
+    def hash_ddl(ddl):
+        # AUTO_INCREMENT=N changes on every insert; it is not schema
+        ddl = re.sub(r"\s+AUTO_INCREMENT=\d+", "", ddl)
+        return hashlib.sha256(ddl.encode("utf-8")).hexdigest()
+
+    def registrar_controle(tabela, ddl_hash, coluna, marca):
+        with ENGINE_LOCAL.begin() as conn:
+            conn.execute(
+                text("""
+                    INSERT INTO TB_ENQ_BACKUP_CONTROLE
+                        (tabela, ddl_hash, coluna_marca, marca, dt_atualizacao)
+                    VALUES (:tabela, :ddl_hash, :coluna, :marca, NOW())
+                    ON DUPLICATE KEY UPDATE
+                        ddl_hash = VALUES(ddl_hash),
+                        coluna_marca = VALUES(coluna_marca),
+                        marca = VALUES(marca),
+                        dt_atualizacao = VALUES(dt_atualizacao)
+                """),
+                {
+                    "tabela": tabela,
+                    "ddl_hash": ddl_hash,
+                    "coluna": coluna,
+                    "marca": None if marca is None else str(marca)
+                }
+            )
+
+    # ======================================================
+    # 1. LIST ALL TABLES FROM REMOTE DATABASE
+    # ======================================================
+
+    def listar_tabelas():
+        # Base tables only: views are recreated afterwards (3c)
+        query = "SHOW FULL TABLES WHERE Table_type = 'BASE TABLE';"
+        df = pd.read_sql(query, ENGINE)
+        tabelas = df.iloc[:, 0].tolist()
+
+        # Largest tables first, so the worker pool finishes close
+        # to the copy time of the biggest table
+        df_tamanho = pd.read_sql(
+            """
+            SELECT TABLE_NAME, TABLE_ROWS
+            FROM information_schema.TABLES
+            WHERE TABLE_SCHEMA = DATABASE();
+            """,
+            ENGINE
+        )
+        tamanho = dict(zip(df_tamanho["TABLE_NAME"], df_tamanho["TABLE_ROWS"].fillna(0)))
+        tabelas.sort(key=lambda t: tamanho.get(t, 0), reverse=True)
+
+        print("\n=== TABLES FOUND IN REMOTE DATABASE ===")
+        for t in tabelas:
+            print(" -", t)
+
+        return tabelas
+
+    # ======================================================
+    # 2. RECREATE LOCAL TABLE WITH IDENTICAL SCHEMA
+    # ======================================================
+
+    def recriar_tabela_local(tabela, ddl_remote):
+        print(f"\nRecreating table: {tabela}")
+
+        # Drop and recreate locally
+        with ENGINE_LOCAL.begin() as conn:
+            print(" - Dropping local table if exists...")
+            conn.execute(text(f"DROP TABLE IF EXISTS {tabela};"))
+
+            print(" - Creating local table...")
+            conn.execute(text(ddl_remote))
+
+        print(f"   Table {tabela} recreated locally.")
+
+    # ======================================================
+    # 3. COPY DATA FROM REMOTE TO LOCAL
+    # ======================================================
+
+    def copiar_dados(tabela, filtro="", params=None, chaves=None):
+        print(f"\nCopying data from table: {tabela} {filtro}")
+
+        # Server-side cursor: rows are streamed in BACKUP_CHUNK_ROWS
+        # chunks straight into the local engine, so memory is bounded
+        # by one chunk per worker regardless of table size
+        total = 0
+
+        with ENGINE.connect().execution_options(stream_results=True) as conn:
+            for df in pd.read_sql(
+                text(f"SELECT * FROM {tabela} {filtro};"),
+                conn,
+                params=params,
+                chunksize=BACKUP_CHUNK_ROWS
+            ):
+                # Clean zero-date issues (only if columns exist)
+                for col in ["dataProcessamento", "dataPosicao"]:
+                    if col in df.columns:
+                        df[col] = pd.to_datetime(
+                            df[col].replace(
+                                ["0000-00-00 00:00:00", "0000-00-00", ""],
+                                None
+                            ),
+                            errors="coerce"
+                        )
+
+                if chaves:
+                    bulk_upsert(df, tabela, chaves, engine=ENGINE_LOCAL)
+                else:
+                    bulk_insert(df, tabela, engine=ENGINE_LOCAL)
+                total += len(df)
+
+        if total == 0:
+            print(f" - Table {tabela} empty. Nothing to copy.")
+            return
+
+        print(f"   Copied {total} rows to local ({tabela}).")
+
+    # ======================================================
+    # 3b. INCREMENTAL COPY (ROWS PAST THE LOCAL WATERMARK)
+    # ======================================================
+
+    def marca_local(tabela, coluna):
+        marca = pd.read_sql(
+            f"SELECT MAX({coluna}) AS marca FROM {tabela};",
+            ENGINE_LOCAL
+        ).iloc[0]["marca"]
+
+        if pd.isna(marca):
+            return None
+
+        return marca.to_pydatetime() if isinstance(marca, pd.Timestamp) else int(marca)
+
+    def copiar_incremental(tabela, coluna):
+        marca = marca_local(tabela, coluna)
+
+        if marca is None:
+            copiar_dados(tabela)
+            return
+
+        if coluna == "id_carga":
+            copiar_dados(tabela, f"WHERE {coluna} > :marca", {"marca": marca})
+            return
+
+        # Timestamp batches can grow after the last backup
+        # (streamed flushes, swaps appended to the positions batch):
+        # drop the local copy of the watermark batch and re-copy it
+        with ENGINE_LOCAL.begin() as conn:
+            conn.execute(
+                text(f"DELETE FROM {tabela} WHERE {coluna} >= :marca"),
+                {"marca": marca}
+            )
+
+        copiar_dados(
+            tabela,
+            f"WHERE {coluna} >= :marca",
+            {"marca": marca},
+            chaves=TABELAS_UPSERT.get(tabela)
+        )
+
+    # ======================================================
+    # 3c. VIEWS (RECREATED AFTER THE TABLES)
+    # ======================================================
+
+    def recriar_views():
+        views = pd.read_sql("SHOW FULL TABLES WHERE Table_type = 'VIEW';", ENGINE).iloc[:, 0].tolist()
+
+        if not views:
+            return
+
+        banco = pd.read_sql("SELECT DATABASE() AS banco;", ENGINE).iloc[0]["banco"]
+
+        ddls = {}
+        for view in views:
+            ddl = pd.read_sql(f"SHOW CREATE VIEW {view};", ENGINE).iloc[0, 1]
+            # The remote DEFINER may not exist locally, and MySQL
+            # stores references qualified with the remote schema
+            ddl = re.sub(r"\s+DEFINER=\S+", "", ddl)
+            ddl = re.sub(r"\s+SQL SECURITY DEFINER", "", ddl)
+            ddl = ddl.replace(f"`{banco}`.", "")
+            ddls[view] = re.sub(r"^CREATE\s", "CREATE OR REPLACE ", ddl, count=1)
+
+        # A view may read another view: retry the failed ones
+        # while at least one succeeds per pass
+        pendentes = views
+        while pendentes:
+            erros = {}
+            for view in pendentes:
+                try:
+                    with ENGINE_LOCAL.begin() as conn:
+                        conn.exec_driver_sql(ddls[view])
+                except Exception as e:
+                    erros[view] = e
+
+            if len(erros) == len(pendentes):
+                for view, e in erros.items():
+                    log(f"ERROR — View {view} not recreated: {e}")
+                raise RuntimeError(f"Views not recreated: {', '.join(erros)}")
+
+            pendentes = list(erros)
+
+        log(f"{len(views)} views recreated locally.")
+
+    # ======================================================
+    # 4. FULL REPLICATION PROCESS
+    # ======================================================
+    # Tables are independent, so BACKUP_MAX_WORKERS of them are
+    # recreated and copied concurrently.
+    # ======================================================
+
+    def replicar_tabela(tabela):
+        log(f"Processing table: {tabela}")
+
+        print("\n-------------------------------------------------------")
+        print(f"PROCESSING TABLE: {tabela}")
+        print("-------------------------------------------------------")
+
+        ddl_remote = obter_ddl(tabela)
+        ddl_hash = hash_ddl(ddl_remote)
+        coluna = TABELAS_INCREMENTAIS.get(tabela)
+
+        if (
+            incremental
+            and coluna is not None
+            and ddl_hash_local.get(tabela) == ddl_hash
+            and inspect(ENGINE_LOCAL).has_table(tabela)
+        ):
+            print(f" - Incremental copy by {coluna}")
+            copiar_incremental(tabela, coluna)
+        else:
+            # A rebuild interrupted halfway must not be resumed
+            # incrementally: forget the hash until the copy finishes
+            with ENGINE_LOCAL.begin() as conn:
+                conn.execute(
+                    text("DELETE FROM TB_ENQ_BACKUP_CONTROLE WHERE tabela = :tabela"),
+                    {"tabela": tabela}
+                )
+
+            recriar_tabela_local(tabela, ddl_remote)
+            copiar_dados(tabela)
+
+        registrar_controle(
+            tabela,
+            ddl_hash,
+            coluna,
+            marca_local(tabela, coluna) if coluna else None
+        )
+
+        log(f"Table {tabela} processed.")
+
+    def replicar_completo():
+        print("\n=======================================================")
+        print("        STARTING REMOTE → LOCAL REPLICATION")
+        print("=======================================================\n")
+
+        tabelas = listar_tabelas()
+
+        with ThreadPoolExecutor(max_workers=max(BACKUP_MAX_WORKERS, 1)) as pool:
+            futuros = {pool.submit(replicar_tabela, t): t for t in tabelas}
+
+        falhas = []
+        for futuro, tabela in futuros.items():
+            erro = futuro.exception()
+            if erro is not None:
+                log(f"ERROR — Table {tabela} failed: {erro}")
+                falhas.append(tabela)
+
+        if falhas:
+            raise RuntimeError(f"Replication failed for: {', '.join(falhas)}")
+
+        recriar_views()
+
+        print("\n=======================================================")
+        print("   REPLICATION FINISHED SUCCESSFULLY")
+        print("=======================================================\n")
+
+    # ======================================================
+    # EXECUTION
+    # ======================================================
+
+    replicar_completo()
+    log("Local database replication completed successfully.")
+
@@ -0,0 +1,160 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from time import time
+
+from app.config import (
+    METABASE_CACHE,
+    METABASE_CACHE_DIR,
+    METABASE_CACHE_TTL,
+    METABASE_CACHE_TTL_CARDS,
+    METABASE_CACHE_MAX_MB
+)
+
+# ============================================================
+# METABASE RESPONSE CACHE (ON DISK)
+# ============================================================
+# Purpose:
+# - Avoid re-downloading card payloads on re-runs for the same
+#   reference date (e.g. after a partial failure)
+#
+# Behavior:
+# - Content-addressed: key = sha256(card id + method + url +
+#   serialized params / body)
+# - Payloads stored as gzip-compressed JSON under
+#   METABASE_CACHE_DIR/<key[:2]>/<key>.json.gz
+# - TTL per card (METABASE_CACHE_TTL_CARDS, default
+#   METABASE_CACHE_TTL), checked against the file mtime
+# - LRU size cap (METABASE_CACHE_MAX_MB): hits refresh atime,
+#   eviction removes least recently used files first
+# - evictar() is called after every batch fetch but only scans
+#   the directory when something was written, and then at most
+#   every INTERVALO_EVICCAO seconds unless a tenth of the cap
+#   was written since the last scan; jobs call
+#   evictar(forcar=True) once when they finish
+#
+# Modes (METABASE_CACHE, or CLI --no-cache / --refresh):
+# - off     : never read nor write
+# - on      : read hits, store misses
+# - refresh : ignore existing entries, store fresh payloads
+# ============================================================
+
+MISS = object()
+
+INTERVALO_EVICCAO = 60
+
+_modo = METABASE_CACHE
+_lock = threading.Lock()
+_gravados = 0          # bytes written since the last eviction scan
+_ultima_eviccao = 0.0
+
+
+def configurar(modo):
+    global _modo
+    _modo = modo
+
+
+def _chave(card, spec):
+    partes = {
+        "card": card,
+        "method": spec.get("method"),
+        "url": spec.get("url"),
+        "params": spec.get("params"),
+        "data": spec.get("data"),
+    }
+    bruto = json.dumps(partes, sort_keys=True, default=str)
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+def _caminho(chave):
+    return os.path.join(METABASE_CACHE_DIR, chave[:2], f"{chave}.json.gz")
+
+
+def _ttl(card):
+    return METABASE_CACHE_TTL_CARDS.get(str(card), METABASE_CACHE_TTL)
+
+
+def ler(card, spec):
+    if _modo != "on":
+        return MISS
+
+    caminho = _caminho(_chave(card, spec))
+
+    try:
+        idade = time() - os.path.getmtime(caminho)
+        if idade > _ttl(card):
+            return MISS
+
+        with gzip.open(caminho, "rb") as f:
+            payload = json.loads(f.read())
+
+        # LRU: bump access time only (mtime keeps the TTL origin)
+        os.utime(caminho, (time(), os.path.getmtime(caminho)))
+        return payload
+
+    except (OSError, ValueError):
+        return MISS
+
+
+def gravar(card, spec, payload):
+    if _modo == "off":
+        return
+
+    caminho = _caminho(_chave(card, spec))
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+
+    temporario = f"{caminho}.{threading.get_ident()}.tmp"
+    with gzip.open(temporario, "wb", compresslevel=6) as f:
+        f.write(json.dumps(payload).encode("utf-8"))
+    os.replace(temporario, caminho)
+
+    global _gravados
+    tamanho = os.path.getsize(caminho)
+    with _lock:
+        _gravados += tamanho
+
+
+def evictar(forcar=False):
+    global _gravados, _ultima_eviccao
+
+    if _modo == "off":
+        return
+
+    limite = METABASE_CACHE_MAX_MB * 1024 * 1024
+
+    with _lock:
+        # Only new writes can push the cache past the cap
+        if not _gravados:
+            return
+        if not forcar and _gravados < limite // 10 and time() - _ultima_eviccao < INTERVALO_EVICCAO:
+            return
+
+        _gravados = 0
+        _ultima_eviccao = time()
+
+        arquivos = []
+        for raiz, _, nomes in os.walk(METABASE_CACHE_DIR):
+            for nome in nomes:
+                if not nome.endswith(".json.gz"):
+                    continue
+                caminho = os.path.join(raiz, nome)
+                try:
+                    st = os.stat(caminho)
+                except OSError:
+                    continue
+                arquivos.append((st.st_atime, st.st_size, caminho))
+
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        if total <= limite:
+            return
+
+        for _, tamanho, caminho in sorted(arquivos):
+            try:
+                os.remove(caminho)
+            except OSError:
+                continue
+            total -= tamanho
+            if total <= limite:
+                break
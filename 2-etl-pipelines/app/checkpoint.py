@@ -0,0 +1,98 @@
+import os
+import sqlite3
+from contextlib import closing, contextmanager
+from datetime import datetime
+
+from app.config import POSICOES_CHECKPOINT_PATH
+
+# ============================================================
+# CHECKPOINT — PER-CGE PROGRESS OF A POSITIONS BATCH
+# ============================================================
+# Purpose:
+# - Let run_posicoes resume after a crash without re-fetching
+#   CGEs already persisted
+#
+# Store:
+# - Local SQLite file (POSICOES_CHECKPOINT_PATH)
+# - lotes: one row per batch key (reference date) with its
+#   dt_insercao and status (aberto / concluido)
+# - lote_cges: CGEs whose rows are already in the database
+#
+# A resumed run reuses the open batch's dt_insercao, so
+# atualizar_exposi_risco_snapshot still sees a single batch.
+# ============================================================
+
+class ProgressoPosicoes:
+    def __init__(self, caminho=POSICOES_CHECKPOINT_PATH):
+        self.caminho = caminho
+
+        pasta = os.path.dirname(caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+
+        with self._conectar() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS lotes (
+                    chave TEXT PRIMARY KEY,
+                    dt_insercao TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    atualizado_em TEXT NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS lote_cges (
+                    chave TEXT NOT NULL,
+                    cge TEXT NOT NULL,
+                    PRIMARY KEY (chave, cge)
+                )
+            """)
+
+    @contextmanager
+    def _conectar(self):
+        # sqlite3's own context manager commits but never closes
+        with closing(sqlite3.connect(self.caminho)) as conn:
+            with conn:
+                yield conn
+
+    def lote_aberto(self, chave):
+        with self._conectar() as conn:
+            row = conn.execute(
+                "SELECT dt_insercao FROM lotes WHERE chave = ? AND status = 'aberto'",
+                (chave,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def abrir_lote(self, chave, dt_insercao):
+        with self._conectar() as conn:
+            conn.execute("DELETE FROM lote_cges WHERE chave = ?", (chave,))
+            conn.execute(
+                "INSERT OR REPLACE INTO lotes VALUES (?, ?, 'aberto', ?)",
+                (chave, dt_insercao, datetime.now().isoformat(timespec="seconds"))
+            )
+
+    def concluidos(self, chave):
+        with self._conectar() as conn:
+            rows = conn.execute(
+                "SELECT cge FROM lote_cges WHERE chave = ?",
+                (chave,)
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def marcar(self, chave, cges):
+        with self._conectar() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO lote_cges VALUES (?, ?)",
+                [(chave, cge) for cge in cges]
+            )
+            conn.execute(
+                "UPDATE lotes SET atualizado_em = ? WHERE chave = ?",
+                (datetime.now().isoformat(timespec="seconds"), chave)
+            )
+
+    def fechar_lote(self, chave):
+        with self._conectar() as conn:
+            conn.execute("DELETE FROM lote_cges WHERE chave = ?", (chave,))
+            conn.execute(
+                "UPDATE lotes SET status = 'concluido', atualizado_em = ? WHERE chave = ?",
+                (datetime.now().isoformat(timespec="seconds"), chave)
+            )
@@ -0,0 +1,176 @@
+import argparse
+import importlib
+import sys
+from datetime import date, datetime
+
+# ============================================================
+# HEADLESS CLI ENTRY POINT
+# ============================================================
+# Purpose:
+# - Run the same jobs as the Tk App without a display server
+#   (cron / systemd timers on scheduler hosts)
+# - Heavy modules (pandas, SQLAlchemy, app.jobs) are imported
+#   only after argument parsing, and never tkinter
+#
+# Usage (from 2-etl-pipelines/):
+#   python -m app.cli run margem
+#   python -m app.cli run pl_historico --date 2025-12-01
+#   python -m app.cli run --all [--date 2025-12-01]
+#   python -m app.cli run posicoes --refresh | --no-cache
+#   python -m app.cli backfill pl_historico --from 2025-10-01 --to 2025-12-31
+#   python -m app.cli compact pl_historico
+#   python -m app.cli run arquivo   (Parquet archive, needs pyarrow)
+#   python -m app.cli migrate [--dry-run] [--to 0002]
+#
+# Exit codes:
+#   0  job(s) succeeded
+#   1  job failed (or pipeline had failed / skipped jobs)
+#   2  invalid arguments
+#   3  unexpected error
+# ============================================================
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_ERROR = 3
+
+
+def log(msg):
+    ts = datetime.now().strftime("%H:%M:%S")
+    print(f"[{ts}] {msg}", flush=True)
+
+
+def data_valida(valor):
+    try:
+        return datetime.strptime(valor, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date '{valor}' (expected YYYY-MM-DD)")
+
+
+# Job → (module, function). Only the module of the chosen job is
+# imported: backup loads app.backup (pandas, SQLAlchemy, the DB
+# engines) without app.jobs, which also brings requests and the
+# Metabase session. pandas / SQLAlchemy are needed by every job.
+JOB_FUNCOES = {
+    "margem": ("app.jobs", "run_margem"),
+    "pl_snapshot": ("app.jobs", "run_pl_snapshot"),
+    "pl_historico": ("app.jobs", "run_pl_historico"),
+    "posicoes": ("app.jobs", "run_posicoes"),
+    "swaps": ("app.jobs", "run_swaps"),
+    "margem_consolidada": ("app.jobs", "run_margem_consolidada"),
+    "backup": ("app.backup", "backup_local"),
+    "arquivo": ("app.jobs", "run_arquivo_parquet"),
+}
+
+
+def executar_job(nome, data_carteira):
+    modulo, funcao = JOB_FUNCOES[nome]
+    func = getattr(importlib.import_module(modulo), funcao)
+
+    if nome == "pl_historico":
+        return func(log, data_carteira)
+
+    return func(log)
+
+
+def executar_todos(data_carteira):
+    from app.dag import executar_dag, pipeline_completo
+
+    status = executar_dag(pipeline_completo(log, data_carteira), log)
+    return all(s == "ok" for s in status.values())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    run = sub.add_parser("run", help="run one job or the full pipeline")
+    run.add_argument("job", nargs="?", choices=list(JOB_FUNCOES))
+    run.add_argument("--all", action="store_true", help="run the full pipeline (DAG)")
+    run.add_argument(
+        "--date",
+        type=data_valida,
+        default=date.today().strftime("%Y-%m-%d"),
+        help="reference date for PL Historical (YYYY-MM-DD, default today)"
+    )
+    cache_modo = run.add_mutually_exclusive_group()
+    cache_modo.add_argument(
+        "--no-cache",
+        action="store_const", const="off", dest="cache",
+        help="bypass the Metabase response cache"
+    )
+    cache_modo.add_argument(
+        "--refresh",
+        action="store_const", const="refresh", dest="cache",
+        help="ignore cached responses and store fresh ones"
+    )
+
+    backfill = sub.add_parser("backfill", help="load a date range (missing dates only)")
+    backfill.add_argument("job", choices=["pl_historico"])
+    backfill.add_argument("--from", dest="inicio", type=data_valida, required=True, help="first date (YYYY-MM-DD)")
+    backfill.add_argument("--to", dest="fim", type=data_valida, required=True, help="last date (YYYY-MM-DD)")
+    backfill.add_argument("--workers", type=int, help="concurrent requests (default PL_BACKFILL_MAX_WORKERS)")
+    backfill.add_argument("--force", action="store_true", help="reload dates already present")
+
+    compact = sub.add_parser("compact", help="remove duplicate loads (one-off)")
+    compact.add_argument("job", choices=["pl_historico"])
+
+    migrate = sub.add_parser("migrate", help="apply pending schema migrations")
+    migrate.add_argument("--dry-run", action="store_true", help="list pending statements only")
+    migrate.add_argument("--to", dest="ate", metavar="VERSION", help="stop after this version (e.g. 0002)")
+
+    args = parser.parse_args(argv)
+
+    if args.comando == "migrate":
+        try:
+            from app.migrate import aplicar_migracoes
+            aplicar_migracoes(log, ate=args.ate, dry_run=args.dry_run)
+        except Exception as e:
+            log(f"ERROR — {e}")
+            return EXIT_ERROR
+        return EXIT_OK
+
+    if args.comando == "compact":
+        try:
+            from app.jobs import compactar_pl_historico
+            ok = compactar_pl_historico(log) is not False
+        except Exception as e:
+            log(f"ERROR — {e}")
+            return EXIT_ERROR
+        return EXIT_OK if ok else EXIT_FAILED
+
+    if args.comando == "backfill":
+        if args.inicio > args.fim:
+            parser.error("--from must not be after --to")
+        try:
+            from app.jobs import backfill_pl_historico
+            kwargs = {"pular_existentes": not args.force}
+            if args.workers:
+                kwargs["max_workers"] = args.workers
+            ok = backfill_pl_historico(log, args.inicio, args.fim, **kwargs) is not False
+        except Exception as e:
+            log(f"ERROR — {e}")
+            return EXIT_ERROR
+        return EXIT_OK if ok else EXIT_FAILED
+
+    if args.all == bool(args.job):
+        parser.error("choose exactly one of <job> or --all")
+
+    try:
+        if args.cache:
+            from app import cache
+            cache.configurar(args.cache)
+
+        if args.all:
+            ok = executar_todos(args.date)
+        else:
+            ok = executar_job(args.job, args.date) is not False
+    except Exception as e:
+        log(f"ERROR — {e}")
+        return EXIT_ERROR
+
+    return EXIT_OK if ok else EXIT_FAILED
+
+
+if __name__ == "__main__":
+    sys.exit(main())
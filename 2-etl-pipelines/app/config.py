@@ -53,3 +53,82 @@ REQUEST_TIMEOUT = int(os.getenv("REQUEST_TIMEOUT", 300))
 REQUEST_RETRY_SLEEP = float(os.getenv("REQUEST_RETRY_SLEEP", 0.5))
 VERIFY_SSL = os.getenv("VERIFY_SSL", "false").lower() == "true"
 TIMEZONE = os.getenv("TIMEZONE", "BRT")
+
+# Per-CGE positions fetch: worker pool size and global requests/second ceiling
+# (1 worker at 2 req/s reproduces the legacy sequential loop with a 0.5s sleep)
+POSICOES_MAX_WORKERS = int(os.getenv("POSICOES_MAX_WORKERS", 1))
+METABASE_MAX_RPS = float(os.getenv("METABASE_MAX_RPS", 2))
+
+# CGEs per public positions request (same ultima_data); 1 = one request per CGE
+POSICOES_BATCH_CGES = int(os.getenv("POSICOES_BATCH_CGES", 1))
+
+# PL Historical load mode: "append" (legacy) or "upsert" (INSERT ... ON
+# DUPLICATE KEY UPDATE on the (cgePortfolio, data) unique key). Switch to
+# upsert only once migration 0008 is applied; without the key it appends
+PL_HISTORICO_LOAD_MODE = os.getenv("PL_HISTORICO_LOAD_MODE", "append").lower()
+
+# Manager margin: write only new / changed rows plus batch membership
+# (requires migration 0009)
+MARGEM_DELTA = os.getenv("MARGEM_DELTA", "false").lower() == "true"
+
+# PL Historical date-range backfill: reference dates fetched concurrently
+# (shares the METABASE_MAX_RPS ceiling)
+PL_BACKFILL_MAX_WORKERS = int(os.getenv("PL_BACKFILL_MAX_WORKERS", 4))
+
+# asyncio Metabase client (app.metabase_async) instead of the shared requests.Session
+METABASE_ASYNC = os.getenv("METABASE_ASYNC", "false").lower() == "true"
+METABASE_MAX_CONN_PER_HOST = int(os.getenv("METABASE_MAX_CONN_PER_HOST", 8))
+
+# On-disk Metabase response cache (app.cache): "off", "on" or "refresh"
+# (refresh = skip reads, still store). TTLs in seconds; per-card overrides
+# as "card_id=seconds,card_id=seconds"
+METABASE_CACHE = os.getenv("METABASE_CACHE", "off").lower()
+METABASE_CACHE_DIR = os.getenv("METABASE_CACHE_DIR", ".cache/metabase")
+METABASE_CACHE_TTL = int(os.getenv("METABASE_CACHE_TTL", 12 * 3600))
+METABASE_CACHE_TTL_CARDS = {
+    card.strip(): int(ttl)
+    for card, ttl in (
+        item.split("=", 1)
+        for item in os.getenv("METABASE_CACHE_TTL_CARDS", "").split(",")
+        if "=" in item
+    )
+}
+METABASE_CACHE_MAX_MB = int(os.getenv("METABASE_CACHE_MAX_MB", 512))
+
+# Streaming positions pipeline: CGEs fetched per window and rows per flush
+POSICOES_STREAMING = os.getenv("POSICOES_STREAMING", "false").lower() == "true"
+POSICOES_STREAM_CGES = int(os.getenv("POSICOES_STREAM_CGES", 50))
+POSICOES_FLUSH_ROWS = int(os.getenv("POSICOES_FLUSH_ROWS", 5000))
+
+# Checkpoint/resume of the per-CGE positions loop (implies streaming writes)
+POSICOES_CHECKPOINT = os.getenv("POSICOES_CHECKPOINT", "false").lower() == "true"
+POSICOES_CHECKPOINT_PATH = os.getenv("POSICOES_CHECKPOINT_PATH", ".cache/posicoes_checkpoint.sqlite3")
+
+# Bulk loader (app.db.bulk_insert): "executemany" (default), "infile"
+# (LOAD DATA LOCAL INFILE; opt-in, needs local_infile=ON on the server,
+# falls back to executemany) or "to_sql" (legacy path)
+BULK_LOAD_METHOD = os.getenv("BULK_LOAD_METHOD", "executemany").lower()
+BULK_LOAD_CHUNK_ROWS = int(os.getenv("BULK_LOAD_CHUNK_ROWS", 50000))
+
+# Remote → local replication: tables copied concurrently and rows per streamed chunk
+BACKUP_MAX_WORKERS = int(os.getenv("BACKUP_MAX_WORKERS", 4))
+BACKUP_CHUNK_ROWS = int(os.getenv("BACKUP_CHUNK_ROWS", 50000))
+BACKUP_INCREMENTAL = os.getenv("BACKUP_INCREMENTAL", "true").lower() == "true"
+
+# Streaming Metabase reads: card responses parsed incrementally into
+# DataFrame chunks of METABASE_STREAM_CHUNK_ROWS rows (bypasses the response
+# cache). Cards listed in METABASE_CSV_CARDS ("id,id") use the CSV export
+METABASE_STREAMING = os.getenv("METABASE_STREAMING", "false").lower() == "true"
+METABASE_STREAM_CHUNK_ROWS = int(os.getenv("METABASE_STREAM_CHUNK_ROWS", 50000))
+METABASE_CSV_CARDS = {
+    card.strip()
+    for card in os.getenv("METABASE_CSV_CARDS", "").split(",")
+    if card.strip()
+}
+
+# Parquet snapshot archive (app.arquivo, requires pyarrow): one compressed file
+# per batch under ARQUIVO_PARQUET_DIR/<table>/dia=YYYY-MM-DD/. ARQUIVO_PARQUET
+# adds the export to the full pipeline
+ARQUIVO_PARQUET = os.getenv("ARQUIVO_PARQUET", "false").lower() == "true"
+ARQUIVO_PARQUET_DIR = os.getenv("ARQUIVO_PARQUET_DIR", ".archive/parquet")
+ARQUIVO_PARQUET_COMPRESSION = os.getenv("ARQUIVO_PARQUET_COMPRESSION", "zstd")
@@ -0,0 +1,160 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from time import perf_counter
+
+# ============================================================
+# JOB DAG EXECUTOR
+# ============================================================
+# Purpose:
+# - Run pipeline jobs respecting declared dependencies
+# - Run independent jobs concurrently
+# - Skip every downstream job of a failed job
+# - Report wall time and the critical path
+#
+# Contract:
+# - etapas: {name: (func, [dependencies])}, func takes no args
+# - A job fails when it raises or returns False
+#   (jobs return False on request errors / integrity aborts)
+#
+# Returns {name: "ok" | "failed" | "skipped"}
+# ============================================================
+
+def _descendentes(etapas, nome):
+    filhos = [n for n, (_, deps) in etapas.items() if nome in deps]
+    resultado = set(filhos)
+    for filho in filhos:
+        resultado |= _descendentes(etapas, filho)
+    return resultado
+
+def _validar(etapas):
+    for nome, (_, deps) in etapas.items():
+        for dep in deps:
+            if dep not in etapas:
+                raise ValueError(f"Job '{nome}' depends on unknown job '{dep}'")
+
+    # Kahn's algorithm: every job must become ready at some point
+    pendentes = {n: set(deps) for n, (_, deps) in etapas.items()}
+    while pendentes:
+        prontos = [n for n, deps in pendentes.items() if not deps]
+        if not prontos:
+            raise ValueError(f"Dependency cycle among: {', '.join(sorted(pendentes))}")
+        for n in prontos:
+            del pendentes[n]
+        for deps in pendentes.values():
+            deps.difference_update(prontos)
+
+def caminho_critico(etapas, duracoes):
+    # Longest chain of dependent jobs, by measured duration
+    memo = {}
+
+    def fim(nome):
+        if nome not in memo:
+            _, deps = etapas[nome]
+            anteriores = [fim(d) for d in deps if d in duracoes]
+            melhor = max(anteriores, default=(0.0, []))
+            memo[nome] = (melhor[0] + duracoes[nome], melhor[1] + [nome])
+        return memo[nome]
+
+    return max((fim(n) for n in duracoes), default=(0.0, []))
+
+def executar_dag(etapas, log, max_workers=None):
+    _validar(etapas)
+
+    status = {}
+    duracoes = {}
+    inicio_total = perf_counter()
+
+    def executar(nome):
+        func, _ = etapas[nome]
+        inicio = perf_counter()
+        try:
+            ok = func() is not False
+        except Exception as e:
+            log(f"ERROR — Job {nome} raised: {e}")
+            ok = False
+        return ok, perf_counter() - inicio
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(etapas)) as pool:
+        em_execucao = {}
+
+        while len(status) < len(etapas):
+            # Submit every job whose dependencies all succeeded
+            for nome, (_, deps) in etapas.items():
+                if nome in status or nome in em_execucao.values():
+                    continue
+                if all(status.get(d) == "ok" for d in deps):
+                    em_execucao[pool.submit(executar, nome)] = nome
+
+            if not em_execucao:
+                break
+
+            concluidos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+
+            for futuro in concluidos:
+                nome = em_execucao.pop(futuro)
+                ok, duracao = futuro.result()
+                duracoes[nome] = duracao
+
+                if ok:
+                    status[nome] = "ok"
+                    continue
+
+                status[nome] = "failed"
+                for filho in sorted(_descendentes(etapas, nome)):
+                    if filho not in status:
+                        status[filho] = "skipped"
+                        log(f"Skipping {filho} — upstream job {nome} failed.")
+
+    total = perf_counter() - inicio_total
+    tempo_critico, caminho = caminho_critico(etapas, duracoes)
+
+    log(
+        f"Pipeline wall time {total:.1f}s — critical path "
+        f"{' → '.join(caminho)} ({tempo_critico:.1f}s)"
+    )
+
+    return status
+
+
+# ============================================================
+# FULL PIPELINE DEFINITION
+# ============================================================
+# Shared by the Tk "Run ALL" button and the headless CLI.
+# - positions needs the latest PL history
+# - swaps reuses the positions batch (dt_insercao)
+# - margin consolidation reads the latest margin, PL and
+#   exposure snapshots (exposure is final after swaps)
+# - backup runs last; the Parquet archive (ARQUIVO_PARQUET)
+#   runs after the snapshot jobs, alongside backup
+# ============================================================
+
+def pipeline_completo(log, data_carteira):
+    from app.jobs import (
+        run_margem,
+        run_pl_snapshot,
+        run_pl_historico,
+        run_posicoes,
+        run_swaps,
+        run_margem_consolidada,
+        run_arquivo_parquet
+    )
+    from app.backup import backup_local
+    from app.config import ARQUIVO_PARQUET
+
+    dag = {
+        "margem":       (lambda: run_margem(log),                      []),
+        "pl_snapshot":  (lambda: run_pl_snapshot(log),                 []),
+        "pl_historico": (lambda: run_pl_historico(log, data_carteira), []),
+        "posicoes":     (lambda: run_posicoes(log),                    ["pl_historico"]),
+        "swaps":        (lambda: run_swaps(log),                       ["posicoes"]),
+        "margem_consolidada": (lambda: run_margem_consolidada(log),
+                               ["margem", "pl_snapshot", "swaps"]),
+        "backup":       (lambda: backup_local(log),
+                         ["margem", "pl_snapshot", "pl_historico", "posicoes", "swaps",
+                          "margem_consolidada"]),
+    }
+
+    if ARQUIVO_PARQUET:
+        dag["arquivo"] = (lambda: run_arquivo_parquet(log),
+                          ["margem", "pl_snapshot", "posicoes", "swaps"])
+
+    return dag
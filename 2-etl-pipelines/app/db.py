@@ -1,12 +1,23 @@
+import os
+import tempfile
+from time import perf_counter
+
+import pandas as pd
 from sqlalchemy import create_engine
 from app.config import (
     DB_REMOTE_USER, DB_REMOTE_PASS, DB_REMOTE_HOST, DB_REMOTE_PORT, DB_REMOTE_NAME,
-    DB_LOCAL_USER, DB_LOCAL_PASS, DB_LOCAL_HOST, DB_LOCAL_PORT, DB_LOCAL_NAME
+    DB_LOCAL_USER, DB_LOCAL_PASS, DB_LOCAL_HOST, DB_LOCAL_PORT, DB_LOCAL_NAME,
+    BULK_LOAD_METHOD, BULK_LOAD_CHUNK_ROWS
 )
 
 def _build_mysql_url(user, password, host, port, db):
     return f"mysql+pymysql://{user}:{password}@{host}:{port}/{db}"
 
+# LOAD DATA LOCAL INFILE is only enabled on the client when the
+# infile bulk path is selected (it also needs local_infile=ON on
+# the server)
+_CONNECT_ARGS = {"local_infile": True} if BULK_LOAD_METHOD == "infile" else {}
+
 # Engine — REMOTE
 ENGINE_REMOTE = create_engine(
     _build_mysql_url(
@@ -16,7 +27,8 @@ ENGINE_REMOTE = create_engine(
         DB_REMOTE_PORT,
         DB_REMOTE_NAME
     ),
-    pool_pre_ping=True
+    pool_pre_ping=True,
+    connect_args=_CONNECT_ARGS
 )
 
 # Engine — LOCAL
@@ -28,5 +40,175 @@ ENGINE_LOCAL = create_engine(
         DB_LOCAL_PORT,
         DB_LOCAL_NAME
     ),
-    pool_pre_ping=True
+    pool_pre_ping=True,
+    connect_args=_CONNECT_ARGS
 )
+
+# ============================================================
+# BULK LOADER
+# ============================================================
+# Purpose:
+# - Persist a DataFrame without pandas to_sql multi-row INSERTs
+#   (which build huge parameterized statements in Python)
+#
+# Paths:
+# - executemany : one prepared INSERT, rows sent as tuples
+#                 (default)
+# - infile      : LOAD DATA LOCAL INFILE from a CSV buffer
+#                 (opt-in, MySQL only; needs local_infile=ON on
+#                 the server, otherwise every load logs a WARNING
+#                 and falls back to executemany)
+# - to_sql      : legacy pandas path (kept for comparison)
+#
+# bulk_upsert (MySQL only): executemany of
+# INSERT ... ON DUPLICATE KEY UPDATE — PyMySQL rewrites it into
+# multi-row statements; rows hitting the table's unique key
+# update the non-key columns in place
+#
+# Notes:
+# - The target table must already exist
+# - In the infile path NULLs are written as \N (MySQL's own
+#   marker) and mapped back with NULLIF, so empty strings stay
+#   '' as in the other paths
+# - Returns the number of rows written; the throughput is
+#   reported through log (rows/second)
+# ============================================================
+
+def _quote(engine, nome):
+    return engine.dialect.identifier_preparer.quote(nome)
+
+def _linhas(df):
+    # Timestamps -> datetime (DB-API drivers adapt by exact type),
+    # NaN / NaT / pd.NA -> None, numpy scalars -> Python objects
+    df_obj = df.astype(object)
+
+    for col in df.select_dtypes(include=["datetime", "datetimetz"]).columns:
+        df_obj[col] = pd.Series(df[col].dt.to_pydatetime(), index=df.index, dtype=object)
+
+    df_obj = df_obj.where(pd.notna(df), None)
+    return list(df_obj.itertuples(index=False, name=None))
+
+def _insert_executemany(df, tabela, engine, sufixo=""):
+    colunas = ", ".join(_quote(engine, c) for c in df.columns)
+    marcador = "?" if engine.dialect.paramstyle == "qmark" else "%s"
+    valores = ", ".join([marcador] * len(df.columns))
+
+    sql = f"INSERT INTO {_quote(engine, tabela)} ({colunas}) VALUES ({valores}){sufixo}"
+
+    with engine.begin() as conn:
+        cursor = conn.connection.cursor()
+        try:
+            for i in range(0, len(df), BULK_LOAD_CHUNK_ROWS):
+                cursor.executemany(sql, _linhas(df.iloc[i:i + BULK_LOAD_CHUNK_ROWS]))
+        finally:
+            cursor.close()
+
+NULO_INFILE = "\\N"
+
+def _insert_infile(df, tabela, engine):
+    colunas = list(df.columns)
+    variaveis = ", ".join(f"@v{i}" for i in range(len(colunas)))
+    atribuicoes = ", ".join(
+        f"{_quote(engine, c)} = NULLIF(@v{i}, '\\\\N')" for i, c in enumerate(colunas)
+    )
+
+    # Booleans must reach MySQL as 0/1, not "True"/"False"
+    colunas_bool = df.select_dtypes(include="bool").columns
+    if len(colunas_bool):
+        df = df.astype({c: "int8" for c in colunas_bool})
+
+    # pymysql streams LOCAL INFILE from a path, so the in-memory
+    # CSV is spilled to a temporary file for the duration of the load
+    fd, caminho = tempfile.mkstemp(suffix=".csv")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", newline="") as f:
+            df.to_csv(
+                f,
+                index=False,
+                header=False,
+                na_rep=NULO_INFILE,
+                date_format="%Y-%m-%d %H:%M:%S",
+                lineterminator="\n"
+            )
+
+        # Backslashes are escapes inside a MySQL string literal;
+        # forward slashes work for Windows paths too
+        caminho_sql = caminho.replace("\\", "/").replace("'", "\\'")
+
+        sql = (
+            f"LOAD DATA LOCAL INFILE '{caminho_sql}' "
+            f"INTO TABLE {_quote(engine, tabela)} "
+            f"CHARACTER SET utf8mb4 "
+            f"FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '' "
+            f"LINES TERMINATED BY '\\n' "
+            f"({variaveis}) SET {atribuicoes}"
+        )
+
+        with engine.begin() as conn:
+            conn.exec_driver_sql(sql)
+    finally:
+        os.remove(caminho)
+
+def bulk_insert(df, tabela, engine=ENGINE_REMOTE, metodo=None, log=None):
+    metodo = metodo or BULK_LOAD_METHOD
+
+    if df.empty:
+        return 0
+
+    inicio = perf_counter()
+
+    if metodo == "to_sql":
+        df.to_sql(
+            name=tabela,
+            con=engine,
+            if_exists="append",
+            index=False,
+            chunksize=2000,
+            method="multi"
+        )
+
+    elif metodo == "infile" and engine.dialect.name == "mysql":
+        try:
+            _insert_infile(df, tabela, engine)
+        except Exception as e:
+            if log:
+                log(f"WARNING — LOAD DATA failed for {tabela}, using executemany: {e}")
+            metodo = "executemany"
+            _insert_executemany(df, tabela, engine)
+
+    else:
+        metodo = "executemany"
+        _insert_executemany(df, tabela, engine)
+
+    duracao = perf_counter() - inicio
+
+    if log:
+        log(
+            f"{tabela}: {len(df)} rows in {duracao:.2f}s "
+            f"({len(df) / max(duracao, 1e-9):,.0f} rows/s, {metodo})"
+        )
+
+    return len(df)
+
+def bulk_upsert(df, tabela, chaves, engine=ENGINE_REMOTE, log=None):
+    if df.empty:
+        return 0
+
+    inicio = perf_counter()
+
+    atualizar = [c for c in df.columns if c not in chaves]
+    sufixo = " ON DUPLICATE KEY UPDATE " + ", ".join(
+        f"{_quote(engine, c)} = VALUES({_quote(engine, c)})" for c in atualizar
+    )
+
+    _insert_executemany(df, tabela, engine, sufixo)
+
+    duracao = perf_counter() - inicio
+
+    if log:
+        log(
+            f"{tabela}: {len(df)} rows upserted in {duracao:.2f}s "
+            f"({len(df) / max(duracao, 1e-9):,.0f} rows/s)"
+        )
+
+    return len(df)
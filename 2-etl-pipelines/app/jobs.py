@@ -1,25 +1,52 @@
 import requests
+import numpy as np
 import pandas as pd
 import re
+import json
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
-from time import sleep
-from sqlalchemy import text
+from sqlalchemy import bindparam, text
 
 from app.config import (
     METABASE_BASE,
     METABASE_USER,
     METABASE_PASS,
     METABASE_PUBLIC_CARD_ENDPOINT,
+    METABASE_CARD_MARGEM,
+    METABASE_CARD_PL_HIST,
+    METABASE_CARD_POSICOES_OTC,
+    METABASE_CARD_POSICOES_SWAP,
+    METABASE_CARD_POSICOES_OFF,
+    METABASE_CARD_POSICOES_PUBLIC,
     FUNDS_API_BASE,
     FUNDS_API_ENDPOINT_PL,
     FUNDS_API_COOKIE,
     FUNDS_API_CRYPTO_TOKEN,
     REQUEST_TIMEOUT,
-    REQUEST_RETRY_SLEEP,
-    VERIFY_SSL
+    VERIFY_SSL,
+    POSICOES_MAX_WORKERS,
+    METABASE_MAX_RPS,
+    METABASE_ASYNC,
+    POSICOES_STREAMING,
+    POSICOES_STREAM_CGES,
+    POSICOES_FLUSH_ROWS,
+    POSICOES_BATCH_CGES,
+    POSICOES_CHECKPOINT,
+    PL_BACKFILL_MAX_WORKERS,
+    PL_HISTORICO_LOAD_MODE,
+    MARGEM_DELTA,
+    METABASE_STREAMING,
+    METABASE_STREAM_CHUNK_ROWS,
+    METABASE_CSV_CARDS,
+    ARQUIVO_PARQUET_DIR
 )
 
-from app.db import ENGINE_REMOTE as ENGINE, ENGINE_LOCAL
+from app.db import ENGINE_REMOTE as ENGINE, bulk_insert, bulk_upsert
+from app.throttle import RateLimiter
+from app import cache, stream
+from app.checkpoint import ProgressoPosicoes
 
 # ============================================================
 # METABASE — SESSION & AUTH
@@ -27,6 +54,11 @@ from app.db import ENGINE_REMOTE as ENGINE, ENGINE_LOCAL
 
 SESSION = requests.Session()
 
+# Single-flight re-login: threads hitting 401 at the same time
+# log in once; the others retry with the new session
+_login_lock = threading.Lock()
+_login_geracao = 0
+
 def metabase_login():
     r = SESSION.post(
         f"{METABASE_BASE}/api/session",
@@ -39,16 +71,165 @@ def metabase_login():
     )
     r.raise_for_status()
 
+def _relogin(geracao):
+    global _login_geracao
+
+    with _login_lock:
+        # Another thread already logged in since our request
+        if geracao != _login_geracao:
+            return
+
+        metabase_login()
+        _login_geracao += 1
+
 def mb_request(method, url, **kwargs):
+    geracao = _login_geracao
     r = SESSION.request(method, url, **kwargs)
 
     if r.status_code == 401:
-        metabase_login()
+        _relogin(geracao)
         r = SESSION.request(method, url, **kwargs)
 
     r.raise_for_status()
     return r
 
+# ------------------------------------------------------------
+# Batch of independent Metabase requests
+# ------------------------------------------------------------
+# specs: list of dicts with method, url and optional
+#        params / data / headers, plus an optional "card" id
+#        used by the response cache (per-card TTL)
+# Returns payloads (or the raised exception) in specs order.
+# Cache hits (app.cache) are served from disk; only misses go
+# to the network. METABASE_ASYNC=true routes the misses
+# through app.metabase_async so they overlap on one keep-alive
+# pool; otherwise a thread pool over mb_request is used.
+# ------------------------------------------------------------
+
+def _mb_fetch_json_rede(specs, max_workers, limiter):
+    if METABASE_ASYNC:
+        from app.metabase_async import fetch_json_all
+        return fetch_json_all(specs, limiter=limiter)
+
+    def _one(spec):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            resp = mb_request(
+                timeout=REQUEST_TIMEOUT,
+                verify=VERIFY_SSL,
+                **spec
+            )
+            return resp.json()
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as pool:
+        return list(pool.map(_one, specs))
+
+def mb_fetch_json(specs, max_workers=1, limiter=None):
+    specs = [dict(spec) for spec in specs]
+    cards = [spec.pop("card", None) for spec in specs]
+
+    resultados = [cache.ler(card, spec) for card, spec in zip(cards, specs)]
+    pendentes = [i for i, r in enumerate(resultados) if r is cache.MISS]
+
+    if not pendentes:
+        return resultados
+
+    buscados = _mb_fetch_json_rede(
+        [specs[i] for i in pendentes],
+        max_workers,
+        limiter
+    )
+
+    for i, data in zip(pendentes, buscados):
+        resultados[i] = data
+        if not isinstance(data, Exception):
+            cache.gravar(cards[i], specs[i], data)
+
+    cache.evictar()
+
+    return resultados
+
+def mb_json(method, url, **kwargs):
+    payload = mb_fetch_json([dict(method=method, url=url, **kwargs)])[0]
+
+    if isinstance(payload, Exception):
+        raise payload
+
+    return payload
+
+# ------------------------------------------------------------
+# Streaming card reads (METABASE_STREAMING)
+# ------------------------------------------------------------
+# mb_stream yields DataFrame chunks of at most `tamanho` rows
+# while the response is downloaded (app.stream); the body is
+# never held whole. Cards in METABASE_CSV_CARDS are read from
+# the CSV export (/query/csv, unformatted values); a card URL
+# that is not a /query/json endpoint raises instead of feeding
+# JSON to the CSV parser. Streamed responses bypass the
+# response cache.
+# mb_frame concatenates the chunks (empty DataFrame when the
+# card returned no rows); with `colunas` each chunk is reduced
+# to the distinct values of those columns first, so memory
+# follows the distinct values instead of the response size.
+# ------------------------------------------------------------
+
+def _spec_csv(method, url, kwargs):
+    base, sep, consulta = url.partition("?")
+
+    if not base.rstrip("/").endswith("/query/json"):
+        raise ValueError(f"CSV export needs a /query/json card URL, got {url}")
+
+    url = base.rstrip("/")[:-len("json")] + "csv" + sep + consulta
+    kwargs = dict(kwargs)
+
+    if method.upper() == "GET":
+        kwargs["params"] = {**(kwargs.get("params") or {}), "format_rows": "false"}
+    elif isinstance(kwargs.get("data"), dict):
+        kwargs["data"] = {**kwargs["data"], "format_rows": "false"}
+    else:
+        kwargs["data"] = "&".join(p for p in [kwargs.get("data"), "format_rows=false"] if p)
+
+    return url, kwargs
+
+def mb_stream(method, url, card=None, tamanho=METABASE_STREAM_CHUNK_ROWS, **kwargs):
+    csv = card is not None and str(card) in METABASE_CSV_CARDS
+
+    if csv:
+        url, kwargs = _spec_csv(method, url, kwargs)
+
+    resp = mb_request(
+        method,
+        url,
+        stream=True,
+        timeout=REQUEST_TIMEOUT,
+        verify=VERIFY_SSL,
+        **kwargs
+    )
+
+    try:
+        partes = resp.iter_content(chunk_size=stream.TAMANHO_LEITURA)
+        linhas = stream.linhas_csv(partes) if csv else stream.linhas_json(partes)
+        yield from stream.em_blocos(linhas, tamanho, converter_numericos=csv)
+    finally:
+        resp.close()
+
+def mb_frame(method, url, card=None, colunas=None, **kwargs):
+    blocos = []
+
+    for bloco in mb_stream(method, url, card=card, **kwargs):
+        if colunas is not None:
+            bloco = bloco[[c for c in colunas if c in bloco.columns]].drop_duplicates()
+        blocos.append(bloco)
+
+    if not blocos:
+        return pd.DataFrame()
+
+    df = pd.concat(blocos, ignore_index=True)
+    return df.drop_duplicates(ignore_index=True) if colunas is not None else df
+
 # ============================================================
 # JOB — MANAGER MARGIN SNAPSHOT
 # ============================================================
@@ -76,16 +257,10 @@ def run_margem(log):
     # API request (auto re-login handled by mb_request)
     # --------------------------------------------------------
     try:
-        resp = mb_request(
-            method="GET",
-            url=url,
-            timeout=REQUEST_TIMEOUT,
-            verify=VERIFY_SSL
-        )
-        data = resp.json()
+        data = mb_json(method="GET", url=url, card=METABASE_CARD_MARGEM)
     except Exception as e:
         log(f"ERROR — Manager Margin request failed: {e}")
-        return
+        return False
 
     # --------------------------------------------------------
     # Load into DataFrame
@@ -112,35 +287,278 @@ def run_margem(log):
     # Load timestamp (BRT)
     # --------------------------------------------------------
     tz_brt = timezone(timedelta(hours=-3))
-    df["dt_carga"] = datetime.now(tz_brt)
+    dt_carga = datetime.now(tz_brt).replace(microsecond=0)
+    df["dt_carga"] = dt_carga
 
     # --------------------------------------------------------
-    # Persist snapshot (append-only)
+    # Persist snapshot (append-only, or only changed rows in
+    # delta mode) + register batch
     # --------------------------------------------------------
-    df.to_sql(
-        name="TB_ENQ_MARGEM_GESTOR_SNAPSHOT",
-        con=ENGINE,
-        if_exists="append",
-        index=False,
-        method="multi",
-        chunksize=1000
-    )
+    if MARGEM_DELTA:
+        novos = gravar_margem_delta(df, dt_carga, log=log)
+        registrar_lote("TB_ENQ_MARGEM_GESTOR_SNAPSHOT", dt_carga, len(df))
+        log(f"Manager Margin batch: {len(df)} rows ({novos} new or changed written)")
+        return
+
+    bulk_insert(df, "TB_ENQ_MARGEM_GESTOR_SNAPSHOT", log=log)
+    registrar_lote("TB_ENQ_MARGEM_GESTOR_SNAPSHOT", dt_carga, len(df))
 
     log(f"Manager Margin inserted: {len(df)} rows")
 
+# ============================================================
+# AUX — MANAGER MARGIN DELTA SNAPSHOTS
+# ============================================================
+# Purpose:
+# - Most margin rows are identical from one run to the next;
+#   in delta mode (MARGEM_DELTA) only new / changed rows are
+#   written to TB_ENQ_MARGEM_GESTOR_SNAPSHOT
+#
+# Behavior:
+# - Each row gets hash_linha (SHA1 of its values; identical
+#   rows within a batch are numbered so none is lost)
+# - Numeric columns are hashed as float64 with 6 decimals, so
+#   a column read as int in one batch and as float in the
+#   next (one NaN) gives the same hashes
+# - The previous batch is loaded as an in-memory
+#   hash → id_carga index; rows found there are reused
+# - TB_ENQ_MARGEM_LOTE_MEMBROS lists (dt_carga, id_carga) of
+#   every row of the batch, reused or new
+# - VW_ENQ_MARGEM_GESTOR_ULTIMO_LOTE rebuilds the full latest
+#   batch (delta or legacy full batch) for the BI queries
+# ============================================================
+
+def hash_linhas_margem(df):
+    partes = []
+
+    for col in sorted(c for c in df.columns if c not in ("dt_carga", "hash_linha")):
+        serie = df[col]
+
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            txt = serie.dt.strftime("%Y-%m-%d %H:%M:%S")
+        elif pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+            serie = pd.to_numeric(serie, errors="coerce").astype("float64")
+            txt = serie.round(6).map("{:.6f}".format)
+        else:
+            txt = serie.astype(str)
+
+        partes.append(txt.where(serie.notna(), ""))
+
+    conteudo = partes[0].str.cat(partes[1:], sep="\x1f")
+    ocorrencia = conteudo.groupby(conteudo).cumcount().astype(str)
+
+    return (conteudo + "\x1f#" + ocorrencia).map(
+        lambda s: hashlib.sha1(s.encode("utf-8")).hexdigest()
+    )
+
+def indice_lote_anterior_margem():
+    # hash_linha → id_carga of the rows of the latest batch
+    # (empty when that batch was written in full mode)
+    df = pd.read_sql(
+        """
+        SELECT s.hash_linha, s.id_carga
+        FROM TB_ENQ_MARGEM_LOTE_MEMBROS mb
+        JOIN TB_ENQ_MARGEM_GESTOR_SNAPSHOT s
+            ON s.id_carga = mb.id_carga
+        WHERE mb.dt_carga = (
+            SELECT MAX(dt_carga)
+            FROM TB_ENQ_LOTES
+            WHERE tabela = 'TB_ENQ_MARGEM_GESTOR_SNAPSHOT'
+        )
+        """,
+        ENGINE
+    )
+    return dict(zip(df["hash_linha"], df["id_carga"].astype(int)))
+
+def gravar_margem_delta(df, dt_carga, log=None):
+    dt_carga = dt_carga.replace(tzinfo=None)
+
+    df = df.copy()
+    df["dt_carga"] = dt_carga
+    df["hash_linha"] = hash_linhas_margem(df)
+
+    anterior = indice_lote_anterior_margem()
+    novos = df[~df["hash_linha"].isin(anterior)]
+
+    bulk_insert(novos, "TB_ENQ_MARGEM_GESTOR_SNAPSHOT", log=log)
+
+    ids = dict(anterior)
+
+    if not novos.empty:
+        df_ids = pd.read_sql(
+            text("""
+                SELECT hash_linha, id_carga
+                FROM TB_ENQ_MARGEM_GESTOR_SNAPSHOT
+                WHERE dt_carga = :dt
+            """),
+            ENGINE,
+            params={"dt": dt_carga}
+        )
+        ids.update(zip(df_ids["hash_linha"], df_ids["id_carga"].astype(int)))
+
+    membros = pd.DataFrame({
+        "dt_carga": dt_carga,
+        "id_carga": df["hash_linha"].map(ids).astype("int64").to_numpy()
+    })
+    bulk_insert(membros, "TB_ENQ_MARGEM_LOTE_MEMBROS", log=log)
+
+    return len(novos)
+
 # ============================================================
 # JOB — PL SNAPSHOT
 # ============================================================
 # Purpose:
 # - Retrieve fund-level PL and risk metrics
-# - Expand nested JSON payload
-# - Normalize schema
+# - Extract the TB_ENQ_PL_SNAPSHOT fields from the nested
+#   JSON payload and type them like the table DDL
 # - Persist daily snapshot into MySQL
 #
+# Behavior:
+# - SCHEMA_PL_SNAPSHOT drives the extraction: each field is
+#   read from the record, its 'resultado' object or
+#   'resultado.detalhesJson' (no full flattening); fields
+#   missing from a record are NULL
+# - Values land in preallocated arrays and are typed per
+#   column: decimals rounded to the DDL scale, bigint / tinyint
+#   as nullable integers, dates parsed, text as str
+#
 # Source:
 # - Funds Platform internal API
 # ============================================================
 
+# (column, type, decimal scale) — mirrors the TB_ENQ_PL_SNAPSHOT DDL
+SCHEMA_PL_SNAPSHOT = [
+    ("sucesso", "tinyint", None),
+    ("erros", "texto", None),
+    ("cgePortfolio", "bigint", None),
+    ("dataProcessamento", "datetime", None),
+    ("dataPosicao", "date", None),
+    ("nomeFundo", "texto", None),
+    ("cnpj", "texto", None),
+    ("cgeGestor", "bigint", None),
+    ("nomeGestor", "texto", None),
+    ("publicoAlvo", "texto", None),
+    ("tipoPortfolio", "texto", None),
+    ("classAnbidScp", "texto", None),
+    ("fundoFechado", "tinyint", None),
+    ("restricaoInvestimento", "texto", None),
+    ("classeCvm", "texto", None),
+    ("descClasseCvm", "texto", None),
+    ("pl", "decimal", 2),
+    ("margemPl", "decimal", 2),
+    ("contaCorrente", "decimal", 2),
+    ("saldoCc", "decimal", 2),
+    ("derivativos", "decimal", 2),
+    ("derivativosRisco", "decimal", 2),
+    ("derivativosPl", "decimal", 2),
+    ("derivativosRiscoPl", "decimal", 2),
+    ("liquidezPl", "decimal", 2),
+    ("rentabilidadeDia", "decimal", 6),
+    ("rentabilidadeMes", "decimal", 6),
+    ("rentabilidadeAno", "decimal", 6),
+    ("criticidade", "texto", None),
+    ("var95", "decimal", 6),
+    ("var99", "decimal", 6),
+    ("bull", "decimal", 6),
+    ("bear", "decimal", 6),
+    ("bullParis", "decimal", 6),
+    ("bearParis", "decimal", 6),
+    ("var95Paris3M", "decimal", 6),
+    ("var95Paris1Y", "decimal", 6),
+    ("var95Paris2Y", "decimal", 6),
+    ("var99Paris3M", "decimal", 6),
+    ("var99Paris1Y", "decimal", 6),
+    ("var99Paris2Y", "decimal", 6),
+    ("fiiFiq", "decimal", 6),
+]
+
+def _coluna_inteira(valores, dtype):
+    # NaN -> masked slot of a nullable integer array
+    mascara = np.isnan(valores)
+    saida = np.zeros(len(valores), dtype=dtype)
+    saida[~mascara] = np.round(valores[~mascara])
+    return pd.arrays.IntegerArray(saida, mascara)
+
+# Time part ending in an explicit offset (Z, ±hh:mm, ±hhmm)
+_COM_FUSO = re.compile(r"[T ].*(?:Z|[+-]\d{2}:?\d{2})$")
+
+def _avisar_perdidos(log, col, bruto, tipados):
+    # Values present in the payload that did not survive typing
+    # (they used to reach MySQL as strings)
+    presentes = pd.notna(bruto) & (bruto != "")
+    perdidos = int((presentes & pd.isna(tipados)).sum())
+
+    if perdidos and log is not None:
+        exemplo = bruto[presentes & pd.isna(tipados)][0]
+        log(f"WARNING — PL Snapshot {col}: {perdidos} values not parsed (e.g. {exemplo!r}), stored as NULL.")
+
+def _tipar_coluna(bruto, tipo, escala, col=None, log=None):
+    if tipo == "texto":
+        return np.array([
+            None if v is None
+            else v if isinstance(v, str)
+            else json.dumps(v, ensure_ascii=False) if isinstance(v, (dict, list))
+            else str(v)
+            for v in bruto
+        ], dtype=object)
+
+    if tipo in ("datetime", "date"):
+        # Any ISO 8601 variant per value (fractional seconds,
+        # offsets). Values with an offset are converted to BRT
+        # wall time, like every other timestamp stored; values
+        # without one are kept as given
+        utc = pd.to_datetime(bruto, errors="coerce", format="ISO8601", utc=True)
+        com_fuso = np.array([isinstance(v, str) and _COM_FUSO.search(v) is not None for v in bruto], dtype=bool)
+        datas = pd.DatetimeIndex(np.where(
+            com_fuso,
+            utc.tz_convert("America/Sao_Paulo").tz_localize(None).values,
+            utc.tz_localize(None).values
+        ))
+        _avisar_perdidos(log, col, bruto, datas)
+        return datas.normalize() if tipo == "date" else datas
+
+    original = bruto
+
+    if tipo == "tinyint":
+        # JSON booleans / "true" / "false" -> 1 / 0
+        bruto = np.array([
+            int(v) if isinstance(v, bool)
+            else {"true": 1, "false": 0}.get(v.lower(), v) if isinstance(v, str)
+            else v
+            for v in bruto
+        ], dtype=object)
+
+    valores = np.asarray(pd.to_numeric(bruto, errors="coerce"), dtype="float64")
+    _avisar_perdidos(log, col, original, valores)
+
+    if tipo == "decimal":
+        return np.round(valores, escala)
+
+    return _coluna_inteira(valores, "int8" if tipo == "tinyint" else "int64")
+
+def normalizar_pl_snapshot(data, dt_carga, log=None):
+    n = len(data)
+    brutos = {col: np.empty(n, dtype=object) for col, _, _ in SCHEMA_PL_SNAPSHOT}
+
+    for i, registro in enumerate(data):
+        resultado = registro.get("resultado") or {}
+        detalhes = resultado.get("detalhesJson") or {}
+
+        for col, bruto in brutos.items():
+            if col in registro:
+                bruto[i] = registro[col]
+            elif col in resultado:
+                bruto[i] = resultado[col]
+            else:
+                bruto[i] = detalhes.get(col)
+
+    df = pd.DataFrame({
+        col: _tipar_coluna(brutos[col], tipo, escala, col=col, log=log)
+        for col, tipo, escala in SCHEMA_PL_SNAPSHOT
+    })
+    df["dt_carga"] = dt_carga
+
+    return df
+
 def run_pl_snapshot(log):
     log("Starting PL Snapshot job...")
 
@@ -168,67 +586,24 @@ def run_pl_snapshot(log):
         data = resp.json()
     except Exception as e:
         log(f"ERROR — PL Snapshot request failed: {e}")
-        return
-
-    # --------------------------------------------------------
-    # Base DataFrame
-    # --------------------------------------------------------
-    df = pd.DataFrame(data)
+        return False
 
-    if df.empty:
+    if not data:
         log("PL Snapshot returned no data.")
         return
 
     # --------------------------------------------------------
-    # Expand nested 'resultado' payload
+    # Schema-driven extraction + typing (load timestamp
+    # included)
     # --------------------------------------------------------
-    df_expanded = pd.json_normalize(df["resultado"], sep="_")
-
-    # Remove JSON prefix artifacts
-    df_expanded.columns = [
-        re.sub(r"^(detalhesJson[._])", "", c) for c in df_expanded.columns
-    ]
-
-    # Merge base + expanded
-    df_final = pd.concat(
-        [df.drop(columns=["resultado"]), df_expanded],
-        axis=1
-    )
+    dt_carga = datetime.now().replace(microsecond=0)
+    df_final = normalizar_pl_snapshot(data, dt_carga, log=log)
 
     # --------------------------------------------------------
-    # Load timestamp
-    # --------------------------------------------------------
-    df_final["dt_carga"] = datetime.now()
-
+    # Persist snapshot (append-only) + register batch
     # --------------------------------------------------------
-    # Enforce schema alignment (only valid columns)
-    # --------------------------------------------------------
-    colunas_validas = [
-        "sucesso", "erros", "cgePortfolio", "dataProcessamento", "dataPosicao",
-        "nomeFundo", "cnpj", "cgeGestor", "nomeGestor", "publicoAlvo",
-        "tipoPortfolio", "classAnbidScp", "fundoFechado", "restricaoInvestimento",
-        "classeCvm", "descClasseCvm", "pl", "margemPl", "contaCorrente",
-        "saldoCc", "derivativos", "derivativosRisco", "derivativosPl",
-        "derivativosRiscoPl", "liquidezPl", "rentabilidadeDia",
-        "rentabilidadeMes", "rentabilidadeAno", "criticidade",
-        "var95", "var99", "bull", "bear",
-        "bullParis", "bearParis",
-        "var95Paris3M", "var95Paris1Y", "var95Paris2Y",
-        "var99Paris3M", "var99Paris1Y", "var99Paris2Y",
-        "fiiFiq", "dt_carga"
-    ]
-
-    df_final = df_final[colunas_validas]
-
-    # --------------------------------------------------------
-    # Persist snapshot (append-only)
-    # --------------------------------------------------------
-    df_final.to_sql(
-        name="TB_ENQ_PL_SNAPSHOT",
-        con=ENGINE,
-        if_exists="append",
-        index=False
-    )
+    bulk_insert(df_final, "TB_ENQ_PL_SNAPSHOT", log=log)
+    registrar_lote("TB_ENQ_PL_SNAPSHOT", dt_carga, len(df_final))
 
     log("PL Snapshot completed.")
 
@@ -238,16 +613,16 @@ def run_pl_snapshot(log):
 # Purpose:
 # - Retrieve historical PL for a given reference date
 # - Persist daily PL history per fund
+# - METABASE_STREAMING=true reads and writes the card in
+#   chunks (run_pl_historico_stream)
 #
 # Source:
 # - Metabase public card with date parameter
 # ============================================================
 
-def run_pl_historico(log, data_carteira):
-    log(f"Starting PL Historical job ({data_carteira})...")
-
+def pl_historico_spec(data_carteira):
     # --------------------------------------------------------
-    # Build Metabase public card URL with date parameter
+    # Metabase public card URL with date parameter
     # --------------------------------------------------------
     url = (
         f"{METABASE_BASE}"
@@ -261,61 +636,453 @@ def run_pl_historico(log, data_carteira):
         )
     }
 
+    return {
+        "method": "GET",
+        "url": url,
+        "params": params,
+        "card": METABASE_CARD_PL_HIST
+    }
+
+def normalizar_pl_historico(data, dt_carga=None):
+    df = pd.DataFrame(data)
+
+    if df.empty:
+        return df
+
+    if "Data" in df.columns:
+        df["Data"] = pd.to_datetime(df["Data"], errors="coerce").dt.date
+
+    if dt_carga is None:
+        tz_brt = timezone(timedelta(hours=-3))
+        dt_carga = datetime.now(tz_brt).replace(microsecond=0)
+
+    df["dt_carga"] = dt_carga
+
+    return df.rename(columns={
+        "CgePortfolio": "cgePortfolio",
+        "Data": "data",
+        "PatrimonioAbertura": "patrimonio_abertura",
+        "PatrimonioFechamento": "patrimonio_fechamento"
+    })
+
+def gravar_pl_historico(df, log=None, mensal=True):
+    # One bulk load = one transaction (or one LOAD DATA).
+    # upsert: a re-loaded (cgePortfolio, data) replaces its row
+    # instead of adding a duplicate with a newer dt_carga.
+    # mensal=False defers the month-end rollup (streamed loads
+    # run it once, after the last chunk)
+    if PL_HISTORICO_LOAD_MODE == "upsert":
+        bulk_upsert(df, "TB_ENQ_PL_HISTORICO", ["cgePortfolio", "data"], log=log)
+    else:
+        bulk_insert(df, "TB_ENQ_PL_HISTORICO", log=log)
+
+    if mensal:
+        atualizar_pl_mensal(df["dt_carga"].iloc[0])
+
+def run_pl_historico_stream(log, data_carteira):
+    # Chunked variant of run_pl_historico: each chunk is
+    # normalized and written as it arrives, all under one
+    # dt_carga
+    tz_brt = timezone(timedelta(hours=-3))
+    dt_carga = datetime.now(tz_brt).replace(microsecond=0)
+    total = 0
+
+    try:
+        for bloco in mb_stream(**pl_historico_spec(data_carteira)):
+            df = normalizar_pl_historico(bloco, dt_carga)
+            gravar_pl_historico(df, log=log, mensal=False)
+            total += len(df)
+    except Exception as e:
+        log(f"ERROR — PL Historical stream failed after {total} rows: {e}")
+        return False
+
+    if not total:
+        log("PL Historical returned no data.")
+        return
+
+    atualizar_pl_mensal(dt_carga)
+
+    log(f"PL Historical completed ({total} rows, streamed).")
+
+def run_pl_historico(log, data_carteira):
+    log(f"Starting PL Historical job ({data_carteira})...")
+
+    if METABASE_STREAMING:
+        return run_pl_historico_stream(log, data_carteira)
+
     # --------------------------------------------------------
     # API request
     # --------------------------------------------------------
     try:
-        resp = mb_request(
-            method="GET",
-            url=url,
-            params=params,
-            timeout=REQUEST_TIMEOUT,
-            verify=VERIFY_SSL
-        )
-        data = resp.json()
+        data = mb_json(**pl_historico_spec(data_carteira))
     except Exception as e:
         log(f"ERROR — PL Historical request failed: {e}")
-        return
+        return False
 
     # --------------------------------------------------------
-    # Load into DataFrame
+    # Load into DataFrame + normalization
     # --------------------------------------------------------
-    df = pd.DataFrame(data)
+    df = normalizar_pl_historico(data)
 
     if df.empty:
         log("PL Historical returned no data.")
         return
 
     # --------------------------------------------------------
-    # Data normalization
+    # Persist historical data (upsert or append-only)
     # --------------------------------------------------------
-    if "Data" in df.columns:
-        df["Data"] = pd.to_datetime(df["Data"], errors="coerce").dt.date
+    gravar_pl_historico(df, log=log)
 
-    tz_brt = timezone(timedelta(hours=-3))
-    df["dt_carga"] = datetime.now(tz_brt)
+    log(f"PL Historical completed ({len(df)} rows).")
 
-    df = df.rename(columns={
-        "CgePortfolio": "cgePortfolio",
-        "Data": "data",
-        "PatrimonioAbertura": "patrimonio_abertura",
-        "PatrimonioFechamento": "patrimonio_fechamento"
-    })
+# ============================================================
+# JOB — PL HISTORICAL BACKFILL (DATE RANGE)
+# ============================================================
+# Purpose:
+# - Load every reference date of [data_inicio, data_fim] in
+#   one call (missed days, quarter rebuilds)
+#
+# Behavior:
+# - Dates already in TB_ENQ_PL_HISTORICO are skipped, found
+#   with a single range query on the `data` index
+#   (pular_existentes=False reloads them)
+# - Dates are fetched concurrently (max_workers) under the
+#   shared METABASE_MAX_RPS ceiling, in windows, so only a
+#   few payloads are held in memory at a time
+# - Each date is written in its own transaction; a failed
+#   date does not affect the others and can be re-run
+# - The dates of a window share one dt_carga, so the month-end
+#   rollup runs once per window instead of once per date
+# ============================================================
+
+def backfill_pl_historico(log, data_inicio, data_fim,
+                          max_workers=PL_BACKFILL_MAX_WORKERS,
+                          pular_existentes=True):
+    datas = [d.strftime("%Y-%m-%d") for d in pd.date_range(data_inicio, data_fim, freq="D")]
+
+    if not datas:
+        log("PL Historical backfill: empty date range.")
+        return False
+
+    log(f"Starting PL Historical backfill ({datas[0]} → {datas[-1]}, {len(datas)} dates)...")
+
+    if pular_existentes:
+        existentes = pd.read_sql(
+            text("""
+                SELECT DISTINCT `data`
+                FROM TB_ENQ_PL_HISTORICO
+                WHERE `data` BETWEEN :inicio AND :fim
+            """),
+            ENGINE,
+            params={"inicio": datas[0], "fim": datas[-1]}
+        )
+        ja_carregadas = {pd.Timestamp(d).strftime("%Y-%m-%d") for d in existentes["data"]}
+        datas = [d for d in datas if d not in ja_carregadas]
+
+        log(f"Skipping {len(ja_carregadas)} dates already loaded; {len(datas)} to fetch.")
+
+    limiter = RateLimiter(METABASE_MAX_RPS)
+    janela = max(max_workers, 1) * 4
+
+    linhas = 0
+    falhas = []
+
+    for i in range(0, len(datas), janela):
+        lote = datas[i:i + janela]
+
+        resultados = mb_fetch_json(
+            [pl_historico_spec(d) for d in lote],
+            max_workers=max_workers,
+            limiter=limiter
+        )
+
+        dt_carga = datetime.now(timezone(timedelta(hours=-3))).replace(microsecond=0)
+        gravadas = 0
+
+        for data_carteira, data in zip(lote, resultados):
+            if isinstance(data, Exception):
+                log(f"WARNING — PL Historical {data_carteira} failed: {data}")
+                falhas.append(data_carteira)
+                continue
+
+            df = normalizar_pl_historico(data, dt_carga)
 
+            if df.empty:
+                continue
+
+            try:
+                gravar_pl_historico(df, mensal=False)
+            except Exception as e:
+                log(f"WARNING — PL Historical {data_carteira} not written: {e}")
+                falhas.append(data_carteira)
+                continue
+
+            gravadas += len(df)
+
+        if gravadas:
+            atualizar_pl_mensal(dt_carga)
+            linhas += gravadas
+
+        log(f"PL Historical backfill: {min(i + janela, len(datas))}/{len(datas)} dates processed.")
+
+    if falhas:
+        log(f"ERROR — PL Historical backfill failed for {len(falhas)} dates: {', '.join(falhas)}")
+        return False
+
+    cache.evictar(forcar=True)
+    log(f"PL Historical backfill completed ({linhas} rows).")
+
+# ============================================================
+# JOB — PL HISTORICAL COMPACTION (ONE-OFF)
+# ============================================================
+# Purpose:
+# - Collapse the duplicates left by append-mode re-runs: per
+#   (cgePortfolio, data) keep the latest load (dt_carga, then
+#   id_carga — the same row the month-end rollup picks)
+# - Required before migration 0008 (unique key)
+#
+# Behavior:
+# - One DELETE transaction per month of `data`, so locks and
+#   undo stay bounded on the large table
+# - OPTIMIZE TABLE at the end rebuilds the table and returns
+#   the freed space
+# ============================================================
+
+def compactar_pl_historico(log):
+    log("Starting PL Historical compaction...")
+
+    with ENGINE.connect() as conn:
+        inicio, fim = conn.execute(text(
+            "SELECT MIN(`data`), MAX(`data`) FROM TB_ENQ_PL_HISTORICO"
+        )).one()
+
+    if inicio is None:
+        log("PL Historical is empty.")
+        return
+
+    removidas = 0
+    meses = pd.date_range(pd.Timestamp(inicio).replace(day=1), fim, freq="MS")
+
+    for n, mes in enumerate(meses, start=1):
+        params = {
+            "inicio": mes.date(),
+            "fim": (mes + pd.offsets.MonthBegin(1)).date()
+        }
+
+        with ENGINE.begin() as conn:
+            removidas += conn.execute(
+                text("""
+                    DELETE t
+                    FROM TB_ENQ_PL_HISTORICO t
+                    JOIN (
+                        SELECT id_carga
+                        FROM (
+                            SELECT
+                                id_carga,
+                                ROW_NUMBER() OVER (
+                                    PARTITION BY cgePortfolio, `data`
+                                    ORDER BY dt_carga DESC, id_carga DESC
+                                ) AS rn
+                            FROM TB_ENQ_PL_HISTORICO
+                            WHERE `data` >= :inicio AND `data` < :fim
+                        ) x
+                        WHERE rn > 1
+                    ) d
+                        ON d.id_carga = t.id_carga
+                    WHERE t.`data` >= :inicio AND t.`data` < :fim
+                """),
+                params
+            ).rowcount
+
+        log(f"PL Historical compaction: {n}/{len(meses)} months (up to {mes:%Y-%m}), {removidas} duplicates removed.")
+
+    with ENGINE.connect() as conn:
+        conn.exec_driver_sql("OPTIMIZE TABLE TB_ENQ_PL_HISTORICO").fetchall()
+
+    log(f"PL Historical compaction completed ({removidas} duplicates removed).")
+
+# ============================================================
+# POSITIONS — SHARED LAYOUT, NORMALIZATION & WRITER
+# ============================================================
+# Purpose:
+# - Single definition of the TB_ENQ_POSICOES_FUNDOS_EXPOSTOS
+#   layout used by run_posicoes and run_swaps
+# - Normalization that works on any chunk of rows, so the
+#   streaming mode and the accumulate-then-concat mode produce
+#   the same rows
+# - GravadorPosicoes: buffers normalized chunks and flushes
+#   them in bounded batches sharing one dt_insercao
+# - ClassificacaoFiltro (exterior / offshore aggregation
+#   class) is computed here once per row, from an in-memory
+#   codTipoAtivo → descricao lookup (TB_ENQ_DE_PARA_COD_ATIVO)
+# ============================================================
+
+COLS_POSICOES = [
+    "Nickname", "DataCarteira", "notional", "CgePortfolio",
+    "ValorCotacao", "NmClassificacao", "qtyposicao",
+    "IdClassificacao", "valorfinanceiro", "CodAtivo",
+    "NuIsin", "CodTipoAtivo", "dt_carteira", "dt_insercao",
+    "ValorSaldoAtivoSwap", "ValorSaldoPassivoSwap", "ClassificacaoFiltro"
+]
+
+# Rows inserted before this instant follow the old rule, where
+# 'Fundo Offshore' did not exist yet and counts as 'Exterior'
+CORTE_CLASSIFICACAO = pd.Timestamp("2025-12-02 15:45:56")
+
+def _ci(serie):
+    # Case / accent folding, as utf8mb4_0900_ai_ci compares strings
+    return (
+        serie.astype("string")
+        .str.normalize("NFKD")
+        .str.encode("ascii", "ignore")
+        .str.decode("ascii")
+        .str.lower()
+    )
+
+
+def carregar_de_para_ativos():
+    df = pd.read_sql(
+        "SELECT codTipoAtivo, descricao FROM TB_ENQ_DE_PARA_COD_ATIVO WHERE codTipoAtivo IS NOT NULL",
+        ENGINE
+    )
+    return dict(zip(df["codTipoAtivo"].astype(int), df["descricao"]))
+
+def classificar_filtro(df, de_para=None):
+    descricao = _ci(df["CodTipoAtivo"].map(de_para or {}))
+    classificacao = _ci(df["NmClassificacao"])
+    regra_nova = (pd.to_datetime(df["dt_insercao"]) >= CORTE_CLASSIFICACAO).to_numpy()
+
+    offshore = classificacao.isin(["fundo offshore"]).to_numpy()
+
+    df["ClassificacaoFiltro"] = np.select(
+        [
+            (descricao.isin(["opcao bm&f"]) | classificacao.isin(["otc opc"])).to_numpy(),
+            classificacao.isin(["otc swap"]).to_numpy(),
+            classificacao.isin(["investimento no exterior"]).to_numpy() | (offshore & ~regra_nova),
+            offshore,
+        ],
+        ["OPÇÃO BM&F", "OTC SWAP", "Exterior", "Fundo Offshore"],
+        "Outros"
+    )
+
+    return df
+
+def normalizar_posicoes(df, dt_insercao, nicknames_off, nicknames_otc, de_para=None):
     # --------------------------------------------------------
-    # Persist historical data (append-only)
+    # Data normalization (original)
     # --------------------------------------------------------
-    df.to_sql(
-        name="TB_ENQ_PL_HISTORICO",
-        con=ENGINE,
-        if_exists="append",
-        index=False,
-        method="multi",
-        chunksize=1000
-    )
+    df["DataCarteira"] = pd.to_datetime(df["DataCarteira"], errors="coerce")
+    df["dt_carteira"] = pd.to_datetime(df["dt_carteira"], errors="coerce")
 
-    log(f"PL Historical completed ({len(df)} rows).")
+    for col in ["notional", "ValorCotacao", "qtyposicao", "IdClassificacao", "valorfinanceiro"]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+
+    for col in ["CodAtivo", "CodTipoAtivo", "CgePortfolio"]:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+
+    # --------------------------------------------------------
+    # Final layout (original)
+    # --------------------------------------------------------
+    df["dt_insercao"] = dt_insercao
 
+    for col in COLS_POSICOES:
+        if col not in df.columns:
+            df[col] = None
+
+    df = df[COLS_POSICOES]
+
+    # --------------------------------------------------------
+    # Classification fix (original)
+    # --------------------------------------------------------
+    df.loc[df["Nickname"].isin(nicknames_off), "NmClassificacao"] = "Fundo Offshore"
+    df.loc[df["Nickname"].isin(nicknames_otc), "NmClassificacao"] = "OTC OPC"
+
+    return classificar_filtro(df, de_para)
+
+def normalizar_swaps(df, dt_insercao):
+    df["dt_carteira"] = pd.to_datetime(df["dt_carteira"], errors="coerce")
+
+    df["Nickname"]        = df["DsIndiceAtivo"]
+    df["notional"]        = df["ValorNocionalSwap"]
+    df["NmClassificacao"] = df["origem"]
+    df["NuIsin"]          = df["DsIndicePassivo"]
+    df["DataCarteira"]    = df["dt_carteira"]
+
+    df["ValorCotacao"]    = None
+    df["qtyposicao"]      = None
+    df["IdClassificacao"] = None
+    df["valorfinanceiro"] = None
+    df["CodAtivo"]        = None
+    df["CodTipoAtivo"]    = None
+
+    # Preserve batch timestamp
+    df["dt_insercao"] = dt_insercao
+
+    return classificar_filtro(df)[COLS_POSICOES]
+
+def gravar_posicoes(df, log=None):
+    bulk_insert(df, "TB_ENQ_POSICOES_FUNDOS_EXPOSTOS", log=log)
+
+class GravadorPosicoes:
+    def __init__(self, limite_linhas=POSICOES_FLUSH_ROWS, log=None):
+        self.limite_linhas = limite_linhas
+        self.log = log
+        self.linhas_gravadas = 0
+        self._buffer = []
+        self._linhas_buffer = 0
+
+    def adicionar(self, df):
+        if df.empty:
+            return
+
+        self._buffer.append(df)
+        self._linhas_buffer += len(df)
+
+        if self._linhas_buffer >= self.limite_linhas:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+
+        lote = pd.concat(self._buffer, ignore_index=True)
+        self._buffer = []
+        self._linhas_buffer = 0
+
+        gravar_posicoes(lote, log=self.log)
+        self.linhas_gravadas += len(lote)
+
+def limpar_cges_posicoes(dt_insercao, cges):
+    # Rows of the batch for CGEs about to be fetched again
+    # (checkpoint resume); makes a re-written window idempotent
+    ids = [int(c) for c in cges if str(c).lstrip("-").isdigit()]
+    removidas = 0
+
+    with ENGINE.begin() as conn:
+        for i in range(0, len(ids), 1000):
+            removidas += conn.execute(
+                text("""
+                    DELETE FROM TB_ENQ_POSICOES_FUNDOS_EXPOSTOS
+                    WHERE dt_insercao = :dt
+                      AND CgePortfolio IN :cges
+                """).bindparams(bindparam("cges", expanding=True)),
+                {"dt": pd.Timestamp(dt_insercao).to_pydatetime(), "cges": ids[i:i + 1000]}
+            ).rowcount
+
+    return removidas
+
+def contar_lote_posicoes(dt_insercao):
+    with ENGINE.connect() as conn:
+        return int(conn.execute(
+            text("""
+                SELECT COUNT(*)
+                FROM TB_ENQ_POSICOES_FUNDOS_EXPOSTOS
+                WHERE dt_insercao = :dt
+            """),
+            {"dt": pd.Timestamp(dt_insercao).to_pydatetime()}
+        ).scalar())
 
 # ============================================================
 # JOB — FUND POSITIONS (OTC / OFFSHORE / SWAPS)
@@ -365,14 +1132,17 @@ def run_posicoes(log):
     # 2. PRIVATE METABASE CARD QUERY (ORIGINAL LOGIC)
     # =========================================================
 
-    def consultar_card(card_id, data_ref):
+    def consultar_cards(card_ids, data_ref):
         """
-        Original behavior:
+        Original behavior (per card):
         - On error, return DataFrame with column 'CgePortfolio'
         - Prevents KeyError downstream
-        """
-        url = METABASE_PRIVATE_CARD_URL.format(card_id=card_id)
 
+        The cards are independent, so they are queried
+        concurrently; results come back in card_ids order.
+        Streamed cards keep only the distinct (CgePortfolio,
+        Nickname) pairs, the only columns read from them.
+        """
         body = (
             f'parameters=[{{'
             f'"type":"date/single",'
@@ -382,20 +1152,41 @@ def run_posicoes(log):
             f'}}]'
         )
 
-        try:
-            resp = mb_request(
-                method="POST",
-                url=url,
-                headers=HEADERS,
-                data=body,
-                timeout=REQUEST_TIMEOUT,
-                verify=VERIFY_SSL
-            )
-            data = resp.json()
-            return pd.DataFrame(data) if data else pd.DataFrame()
-        except Exception as e:
-            log(f"WARNING — Card {card_id} failed: {e}")
-            return pd.DataFrame(columns=["CgePortfolio"])
+        specs = [
+            {
+                "method": "POST",
+                "url": METABASE_PRIVATE_CARD_URL.format(card_id=card_id),
+                "headers": HEADERS,
+                "data": body,
+                "card": card_id
+            }
+            for card_id in card_ids
+        ]
+
+        if METABASE_STREAMING:
+            def _frame(spec):
+                try:
+                    return mb_frame(colunas=["CgePortfolio", "Nickname"], **spec)
+                except Exception as e:
+                    return e
+
+            with ThreadPoolExecutor(max_workers=len(specs)) as pool:
+                resultados = list(pool.map(_frame, specs))
+        else:
+            resultados = mb_fetch_json(specs, max_workers=len(specs))
+
+        dfs_cards = []
+
+        for card_id, data in zip(card_ids, resultados):
+            if isinstance(data, Exception):
+                log(f"WARNING — Card {card_id} failed: {data}")
+                dfs_cards.append(pd.DataFrame(columns=["CgePortfolio"]))
+            elif isinstance(data, pd.DataFrame):
+                dfs_cards.append(data)
+            else:
+                dfs_cards.append(pd.DataFrame(data) if data else pd.DataFrame())
+
+        return dfs_cards
 
     # =========================================================
     # 3. IDENTIFY EXPOSED CGEs (OTC / SWAP / OFF)
@@ -403,9 +1194,14 @@ def run_posicoes(log):
 
     data_ref_global = get_maior_data()
 
-    df_otc_full  = consultar_card(METABASE_CARD_POSICOES_OTC,  data_ref_global)
-    df_swap_full = consultar_card(METABASE_CARD_POSICOES_SWAP, data_ref_global)
-    df_off_full  = consultar_card(METABASE_CARD_POSICOES_OFF,  data_ref_global)
+    df_otc_full, df_swap_full, df_off_full = consultar_cards(
+        [
+            METABASE_CARD_POSICOES_OTC,
+            METABASE_CARD_POSICOES_SWAP,
+            METABASE_CARD_POSICOES_OFF
+        ],
+        data_ref_global
+    )
 
     df_otc  = df_otc_full[["CgePortfolio"]].drop_duplicates()
     df_swap = df_swap_full[["CgePortfolio"]].drop_duplicates()
@@ -414,7 +1210,7 @@ def run_posicoes(log):
     # Original integrity guard
     if df_otc.empty or df_swap.empty or df_off.empty:
         log("Aborting — one or more cards returned no data (OTC / SWAP / OFF).")
-        return
+        return False
 
     df_cges = (
         pd.concat([df_otc, df_swap, df_off], ignore_index=True)
@@ -443,14 +1239,27 @@ def run_posicoes(log):
     # =========================================================
     # 5. PUBLIC CARD — POSITIONS PER CGE
     # =========================================================
+    # Bounded worker pool (POSICOES_MAX_WORKERS) sharing one
+    # requests-per-second ceiling (METABASE_MAX_RPS).
+    #
+    # Batched mode: CGEs sharing the same ultima_data go in one
+    # request with up to POSICOES_BATCH_CGES values (the CGE
+    # template tag takes a list). The response is split back per
+    # CGE by its CgePortfolio column; a failed request (timeout,
+    # server error) is retried as two halves down to single CGEs,
+    # so a lone failing CGE still logs "WARNING — CGE x failed".
+    # POSICOES_BATCH_CGES=1 is one request per CGE.
+    #
+    # Results are collected in df_datas order, so the final
+    # DataFrame is identical to the sequential loop.
+    # =========================================================
 
-    dfs = []
+    limiter = RateLimiter(METABASE_MAX_RPS)
 
-    for _, row in df_datas.iterrows():
-        cge = str(int(row["CgePortfolio"]))
-        data_carteira = pd.to_datetime(row["ultima_data"]).strftime("%Y-%m-%d")
+    def montar_params(cges, data_carteira):
+        valores = ",".join(f'"{cge}"' for cge in cges)
 
-        params = {
+        return {
             "parameters": (
                 f'[{{'
                 f'"type":"date/single",'
@@ -458,174 +1267,561 @@ def run_posicoes(log):
                 f'"target":["variable",["template-tag","Data"]]'
                 f'}},'
                 f'{{'
-                f'"type":"number/=","value":["{cge}"],'
+                f'"type":"number/=","value":[{valores}],'
                 f'"target":["variable",["template-tag","CGE"]]'
                 f'}}]'
             )
         }
 
-        try:
-            resp = mb_request(
-                method="GET",
-                url=METABASE_PUBLIC_CARD_URL,
-                params=params,
-                timeout=REQUEST_TIMEOUT,
-                verify=VERIFY_SSL
-            )
+    tarefas = [
+        (
+            str(int(row["CgePortfolio"])),
+            pd.to_datetime(row["ultima_data"]).strftime("%Y-%m-%d")
+        )
+        for _, row in df_datas.iterrows()
+    ]
+
+    def agrupar(lote_tarefas):
+        # (data_carteira, [cges]) groups of at most POSICOES_BATCH_CGES
+        por_data = {}
+        for cge, data_carteira in lote_tarefas:
+            por_data.setdefault(data_carteira, []).append(cge)
+
+        tamanho = max(POSICOES_BATCH_CGES, 1)
+
+        return [
+            (data_carteira, cges[i:i + tamanho])
+            for data_carteira, cges in por_data.items()
+            for i in range(0, len(cges), tamanho)
+        ]
+
+    def buscar_grupos(grupos):
+        resultados = mb_fetch_json(
+            [
+                {
+                    "method": "GET",
+                    "url": METABASE_PUBLIC_CARD_URL,
+                    "params": montar_params(cges, data_carteira),
+                    "card": METABASE_CARD_POSICOES_PUBLIC
+                }
+                for data_carteira, cges in grupos
+            ],
+            max_workers=POSICOES_MAX_WORKERS,
+            limiter=limiter
+        )
+
+        por_cge = {}
+        refazer = []
+
+        for (data_carteira, cges), data in zip(grupos, resultados):
+            if isinstance(data, Exception):
+                if len(cges) == 1:
+                    log(f"WARNING — CGE {cges[0]} failed: {data}")
+                else:
+                    meio = len(cges) // 2
+                    refazer.append((data_carteira, cges[:meio]))
+                    refazer.append((data_carteira, cges[meio:]))
+                continue
 
-            data = resp.json()
             if not data:
+                por_cge.update({cge: pd.DataFrame() for cge in cges})
+                continue
+
+            df_resp = pd.DataFrame(data)
+
+            if len(cges) == 1:
+                por_cge[cges[0]] = df_resp
+
+            elif "CgePortfolio" in df_resp.columns:
+                chave = (
+                    pd.to_numeric(df_resp["CgePortfolio"], errors="coerce")
+                      .astype("Int64")
+                      .astype(str)
+                )
+                for cge, df_cge in df_resp.groupby(chave, sort=False):
+                    if cge in cges:
+                        por_cge[cge] = df_cge.reset_index(drop=True)
+
+                # CGEs absent from the response have no positions
+                for cge in cges:
+                    por_cge.setdefault(cge, pd.DataFrame())
+
+            else:
+                # Response cannot be attributed to CGEs: one request each
+                refazer.extend((data_carteira, [cge]) for cge in cges)
+
+        if refazer:
+            por_cge.update(buscar_grupos(refazer))
+
+        # Failed CGEs are absent; successful ones map to their
+        # rows (possibly an empty DataFrame)
+        return por_cge
+
+    def buscar_lote(lote_tarefas):
+        # Returns (DataFrames with rows, CGEs fetched successfully)
+        por_cge = buscar_grupos(agrupar(lote_tarefas))
+
+        dfs = []
+
+        for cge, data_carteira in lote_tarefas:
+            df_tmp = por_cge.get(cge)
+
+            if df_tmp is None or df_tmp.empty:
                 continue
 
-            df_tmp = pd.DataFrame(data)
             df_tmp["CgePortfolio"] = cge
             df_tmp["dt_carteira"] = data_carteira
 
             dfs.append(df_tmp)
 
-        except Exception as e:
-            log(f"WARNING — CGE {cge} failed: {e}")
-
-        sleep(REQUEST_RETRY_SLEEP)
-
-    final_df = pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+        return dfs, [cge for cge, _ in lote_tarefas if cge in por_cge]
 
-    if final_df.empty:
-        log("No positions returned.")
-        return
+    nicknames_off = df_off_full["Nickname"]
+    nicknames_otc = df_otc_full["Nickname"]
+    de_para = carregar_de_para_ativos()
 
     # =========================================================
-    # 6. DATA NORMALIZATION (ORIGINAL)
+    # 6. STREAMING MODE — NORMALIZE & FLUSH PER WINDOW
+    # =========================================================
+    # CGEs are fetched in windows of POSICOES_STREAM_CGES; each
+    # window is normalized and handed to GravadorPosicoes, which
+    # writes every POSICOES_FLUSH_ROWS rows. All flushes share
+    # the dt_insercao fixed here, so the batch stays consistent.
+    #
+    # With POSICOES_CHECKPOINT each window is flushed and its
+    # CGEs recorded in the local progress store; a run for the
+    # same reference date resumes the open batch (same
+    # dt_insercao) and skips the CGEs already persisted.
+    # - Rows of the batch for CGEs not yet marked (a window
+    #   written but not marked before a crash) are deleted
+    #   before they are fetched again
+    # - The batch stays open while any CGE failed, so the next
+    #   run retries those CGEs
+    # - The batch row count is re-counted from the table, so
+    #   it includes the rows written before the resume
     # =========================================================
 
-    final_df["DataCarteira"] = pd.to_datetime(final_df["DataCarteira"], errors="coerce")
-    final_df["dt_carteira"] = pd.to_datetime(final_df["dt_carteira"], errors="coerce")
+    retomado = False
 
-    for col in ["notional", "ValorCotacao", "qtyposicao", "IdClassificacao", "valorfinanceiro"]:
-        if col in final_df.columns:
-            final_df[col] = pd.to_numeric(final_df[col], errors="coerce")
+    if POSICOES_STREAMING or POSICOES_CHECKPOINT:
+        dt_insercao = pd.Timestamp.now().floor("s")
 
-    for col in ["CodAtivo", "CodTipoAtivo", "CgePortfolio"]:
-        if col in final_df.columns:
-            final_df[col] = pd.to_numeric(final_df[col], errors="coerce").astype("Int64")
+        if POSICOES_CHECKPOINT:
+            progresso = ProgressoPosicoes()
+            dt_aberto = progresso.lote_aberto(data_ref_global)
 
-    # =========================================================
-    # 7. FINAL LAYOUT (ORIGINAL)
-    # =========================================================
+            if dt_aberto is not None:
+                dt_insercao = pd.Timestamp(dt_aberto)
+                feitos = progresso.concluidos(data_ref_global)
+                tarefas = [t for t in tarefas if t[0] not in feitos]
+                retomado = True
+                log(
+                    f"Resuming batch {dt_insercao} — {len(feitos)} CGEs done, "
+                    f"{len(tarefas)} remaining."
+                )
 
-    final_df["dt_insercao"] = pd.Timestamp.now()
+                removidas = limpar_cges_posicoes(dt_insercao, [cge for cge, _ in tarefas])
+                if removidas:
+                    log(f"Removed {removidas} rows of unmarked CGEs from the open batch.")
+            else:
+                progresso.abrir_lote(data_ref_global, str(dt_insercao))
 
-    cols_final = [
-        "Nickname", "DataCarteira", "notional", "CgePortfolio",
-        "ValorCotacao", "NmClassificacao", "qtyposicao",
-        "IdClassificacao", "valorfinanceiro", "CodAtivo",
-        "NuIsin", "CodTipoAtivo", "dt_carteira", "dt_insercao",
-        "ValorSaldoAtivoSwap", "ValorSaldoPassivoSwap"
-    ]
+        gravador = GravadorPosicoes(log=log)
+        falhos = []
 
-    for col in cols_final:
-        if col not in final_df.columns:
-            final_df[col] = None
+        for i in range(0, len(tarefas), POSICOES_STREAM_CGES):
+            janela = tarefas[i:i + POSICOES_STREAM_CGES]
+            dfs, concluidos = buscar_lote(janela)
 
-    final_df = final_df[cols_final]
+            feitos_janela = set(concluidos)
+            falhos.extend(cge for cge, _ in janela if cge not in feitos_janela)
 
-    # =========================================================
-    # 8. CLASSIFICATION FIX (ORIGINAL)
-    # =========================================================
+            for df_tmp in dfs:
+                gravador.adicionar(
+                    normalizar_posicoes(df_tmp, dt_insercao, nicknames_off, nicknames_otc, de_para)
+                )
+
+            if POSICOES_CHECKPOINT:
+                gravador.flush()
+                progresso.marcar(data_ref_global, concluidos)
 
-    final_df.loc[
-        final_df["Nickname"].isin(df_off_full["Nickname"]),
-        "NmClassificacao"
-    ] = "Fundo Offshore"
+        gravador.flush()
+        linhas_gravadas = gravador.linhas_gravadas
 
-    final_df.loc[
-        final_df["Nickname"].isin(df_otc_full["Nickname"]),
-        "NmClassificacao"
-    ] = "OTC OPC"
+        if POSICOES_CHECKPOINT:
+            if falhos:
+                log(
+                    f"WARNING — {len(falhos)} CGEs failed; batch {dt_insercao} "
+                    f"kept open so the next run retries them."
+                )
+            else:
+                progresso.fechar_lote(data_ref_global)
+
+            linhas_gravadas = contar_lote_posicoes(dt_insercao)
 
     # =========================================================
-    # 9. PERSIST SNAPSHOT
+    # 7. BATCH MODE — ACCUMULATE, NORMALIZE, PERSIST (ORIGINAL)
     # =========================================================
 
-    final_df.to_sql(
-        name="TB_ENQ_POSICOES_FUNDOS_EXPOSTOS",
-        con=ENGINE,
-        if_exists="append",
-        index=False,
-        chunksize=2000,
-        method="multi"
+    else:
+        dfs, _ = buscar_lote(tarefas)
+
+        final_df = pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
+        dt_insercao = pd.Timestamp.now().floor("s")
+
+        if not final_df.empty:
+            final_df = normalizar_posicoes(
+                final_df,
+                dt_insercao,
+                nicknames_off,
+                nicknames_otc,
+                de_para
+            )
+
+            gravar_posicoes(final_df, log=log)
+
+        linhas_gravadas = len(final_df)
+
+    if linhas_gravadas == 0 and not retomado:
+        log("No positions returned.")
+        return
+
+    # Checkpoint mode counted the whole batch (rows written
+    # before a resume included), so the count replaces the
+    # registered one instead of adding to it
+    registrar_lote(
+        "TB_ENQ_POSICOES_FUNDOS_EXPOSTOS",
+        dt_insercao,
+        linhas_gravadas,
+        acumular=not POSICOES_CHECKPOINT
     )
 
-    log("Fund Positions job completed.")
+    atualizar_posicoes_latest(dt_insercao)
+    atualizar_exterior_mensal(dt_insercao)
+
+    cache.evictar(forcar=True)
+    log(f"Fund Positions job completed ({linhas_gravadas} rows).")
 
 # ============================================================
-# AUX — UPDATE RISK EXPOSURE SNAPSHOT
+# AUX — BATCH REGISTRY (TB_ENQ_LOTES)
 # ============================================================
 # Purpose:
-# - Rebuild TB_ENQ_EXPOSI_RISCO_SNAPSHOT based on the
-#   latest batch of positions (dt_insercao)
-# - Ensure exposure consistency across OTC / Offshore / Swaps
+# - Record every completed snapshot batch (table + batch
+#   timestamp) once its rows are fully written
+# - BI queries resolve "latest batch" with a primary-key
+#   lookup on this small table instead of MAX(dt_carga) over
+#   the whole snapshot table, and never see a half-written
+#   batch
 #
-# IMPORTANT:
-# - Logic preserved exactly as original implementation
+# acumular=True adds to the row count of an existing batch
+# (swaps appended to the positions batch).
 # ============================================================
 
-# This function exists only to make partial re-runs idempotent.
-def atualizar_exposi_risco_snapshot():
-    # --------------------------------------------------------
-    # 1. Get latest batch timestamp from positions table
-    # --------------------------------------------------------
-    max_dt = pd.read_sql(
-        "SELECT MAX(dt_insercao) AS max_dt FROM TB_ENQ_POSICOES_FUNDOS_EXPOSTOS",
-        ENGINE
-    ).iloc[0]["max_dt"]
+def registrar_lote(tabela, dt_carga, linhas, acumular=False):
+    if isinstance(dt_carga, pd.Timestamp):
+        dt_carga = dt_carga.to_pydatetime()
 
-    if max_dt is None:
-        return
+    atualizacao = "linhas + VALUES(linhas)" if acumular else "VALUES(linhas)"
 
-    max_dt_sql = max_dt.strftime("%Y-%m-%d %H:%M:%S")
+    with ENGINE.begin() as conn:
+        conn.execute(
+            text(f"""
+                INSERT INTO TB_ENQ_LOTES (tabela, dt_carga, linhas, dt_registro)
+                VALUES (:tabela, :dt_carga, :linhas, NOW())
+                ON DUPLICATE KEY UPDATE
+                    linhas = {atualizacao},
+                    dt_registro = VALUES(dt_registro)
+            """),
+            {
+                "tabela": tabela,
+                "dt_carga": dt_carga.replace(tzinfo=None),
+                "linhas": int(linhas)
+            }
+        )
 
-    # --------------------------------------------------------
-    # 2. Build snapshot dataset
-    # --------------------------------------------------------
-    query = f"""
+# ============================================================
+# AUX — MONTH-END PL ROLLUP
+# ============================================================
+# Purpose:
+# - Keep TB_ENQ_PL_HISTORICO_MENSAL (one row per CGE / month,
+#   latest `data` of the month, latest load wins) in sync
+#   without re-ranking the whole history table
+#
+# Behavior:
+# - Only (CGE, month) pairs present in the given load are
+#   re-ranked; their history rows are read through the
+#   (cgePortfolio, data) index and REPLACEd in the rollup
+# - Full rebuild: migrations/0004_pl_historico_mensal.sql
+# ============================================================
+
+def atualizar_pl_mensal(dt_carga):
+    if isinstance(dt_carga, pd.Timestamp):
+        dt_carga = dt_carga.to_pydatetime()
+
+    with ENGINE.begin() as conn:
+        conn.execute(
+            text("""
+                REPLACE INTO TB_ENQ_PL_HISTORICO_MENSAL
+                    (cgePortfolio, ano, mes, `data`, patrimonio_abertura,
+                     patrimonio_fechamento, dt_carga, id_carga)
+                SELECT
+                    cgePortfolio, ano, mes, `data`, patrimonio_abertura,
+                    patrimonio_fechamento, dt_carga, id_carga
+                FROM (
+                    SELECT
+                        t.cgePortfolio,
+                        k.ano,
+                        k.mes,
+                        t.`data`,
+                        t.patrimonio_abertura,
+                        t.patrimonio_fechamento,
+                        t.dt_carga,
+                        t.id_carga,
+                        ROW_NUMBER() OVER (
+                            PARTITION BY t.cgePortfolio, k.ano, k.mes
+                            ORDER BY t.`data` DESC, t.dt_carga DESC, t.id_carga DESC
+                        ) AS rn
+                    FROM (
+                        SELECT DISTINCT
+                            cgePortfolio,
+                            YEAR(`data`)  AS ano,
+                            MONTH(`data`) AS mes,
+                            `data` - INTERVAL (DAYOFMONTH(`data`) - 1) DAY AS inicio
+                        FROM TB_ENQ_PL_HISTORICO
+                        WHERE dt_carga = :dt_carga
+                    ) k
+                    JOIN TB_ENQ_PL_HISTORICO t
+                        ON  t.cgePortfolio = k.cgePortfolio
+                        AND t.`data` >= k.inicio
+                        AND t.`data` <  k.inicio + INTERVAL 1 MONTH
+                ) s
+                WHERE rn = 1
+            """),
+            {"dt_carga": dt_carga.replace(tzinfo=None)}
+        )
+
+# ============================================================
+# AUX — LATEST POSITIONS (TB_ENQ_POSICOES_LATEST)
+# ============================================================
+# Purpose:
+# - Maintain the result of 3-transform/positions_latest.sql at
+#   load time: per CGE, only its latest dt_carteira; per
+#   (CGE, Nickname, swap legs) only the latest dt_insercao
+#
+# Behavior:
+# - Called once per positions batch (dt_insercao), after the
+#   rows are written; idempotent, so the swaps job simply
+#   re-applies the whole batch it appended to
+# - CGEs whose dt_carteira moved forward lose their older rows
+# - Rows of a dt_carteira older than the one already kept for
+#   a CGE are ignored
+# - Key: (CgePortfolio, Nickname, hash_swap); hash_swap is
+#   SHA1 of the swap legs for 'OTC SWAP' rows, '' otherwise.
+#   NULL Nicknames are stored as ''
+# ============================================================
+
+def atualizar_posicoes_latest(dt_insercao):
+    if isinstance(dt_insercao, pd.Timestamp):
+        dt_insercao = dt_insercao.to_pydatetime()
+
+    params = {"dt": dt_insercao.replace(tzinfo=None)}
+
+    colunas = [c for c in COLS_POSICOES if c != "Nickname"]
+    destino = ", ".join(["Nickname"] + colunas + ["hash_swap"])
+    origem = ", ".join(["COALESCE(b.Nickname, '')"] + [f"b.{c}" for c in colunas])
+    atualizacao = ", ".join(f"{c} = VALUES({c})" for c in colunas)
+
+    lote = """
+        SELECT CgePortfolio, MAX(dt_carteira) AS max_dt
+        FROM TB_ENQ_POSICOES_FUNDOS_EXPOSTOS
+        WHERE dt_insercao = :dt
+        GROUP BY CgePortfolio
+    """
+
+    with ENGINE.begin() as conn:
+        conn.execute(text(f"""
+            DELETE l
+            FROM TB_ENQ_POSICOES_LATEST l
+            JOIN ({lote}) nb
+                ON  l.CgePortfolio = nb.CgePortfolio
+                AND l.dt_carteira  < nb.max_dt
+        """), params)
+
+        conn.execute(text(f"""
+            INSERT INTO TB_ENQ_POSICOES_LATEST ({destino})
+            SELECT
+                {origem},
+                CASE
+                    WHEN b.NmClassificacao = 'OTC SWAP'
+                        THEN COALESCE(SHA1(CONCAT(b.notional, '_', b.ValorSaldoAtivoSwap, '_', b.ValorSaldoPassivoSwap)), 'NULL')
+                    ELSE ''
+                END
+            FROM TB_ENQ_POSICOES_FUNDOS_EXPOSTOS b
+            JOIN ({lote}) nb
+                ON  b.CgePortfolio = nb.CgePortfolio
+                AND b.dt_carteira  = nb.max_dt
+            LEFT JOIN (
+                SELECT CgePortfolio, MAX(dt_carteira) AS max_dt
+                FROM TB_ENQ_POSICOES_LATEST
+                GROUP BY CgePortfolio
+            ) atual
+                ON atual.CgePortfolio = b.CgePortfolio
+            WHERE b.dt_insercao = :dt
+              AND (atual.max_dt IS NULL OR atual.max_dt <= b.dt_carteira)
+            ON DUPLICATE KEY UPDATE {atualizacao}
+        """), params)
+
+# ============================================================
+# AUX — MONTHLY EXTERIOR / OFFSHORE AGGREGATE
+# ============================================================
+# Purpose:
+# - Maintain TB_ENQ_POSICOES_EXTERIOR_MENSAL, the result of
+#   3-transform/positions_exterior_aggregation.sql: per CGE and
+#   month, SomaExterior_Offshore of the latest DataCarteira
+#
+# Behavior:
+# - Only (CGE, month of DataCarteira) pairs present in the given
+#   batch are recomputed (delete + insert, one transaction)
+# - Uses the stored ClassificacaoFiltro; rows before
+#   CORTE_CLASSIFICACAO count 'Exterior', later ones
+#   'Fundo Offshore'
+# - Full rebuild: migrations/0007_classificacao_filtro.sql
+# ============================================================
+
+def atualizar_exterior_mensal(dt_insercao):
+    if isinstance(dt_insercao, pd.Timestamp):
+        dt_insercao = dt_insercao.to_pydatetime()
+
+    params = {
+        "dt": dt_insercao.replace(tzinfo=None),
+        "corte": CORTE_CLASSIFICACAO.to_pydatetime()
+    }
+
+    pares = """
         SELECT DISTINCT
-            CAST(CgePortfolio AS SIGNED) AS cgePortfolio,
-            NmClassificacao              AS origem,
-            dt_insercao                  AS dt_carga
+            CgePortfolio,
+            YEAR(DataCarteira)  AS ano,
+            MONTH(DataCarteira) AS mes,
+            DataCarteira - INTERVAL (DAYOFMONTH(DataCarteira) - 1) DAY AS inicio
         FROM TB_ENQ_POSICOES_FUNDOS_EXPOSTOS
-        WHERE dt_insercao = '{max_dt_sql}'
+        WHERE dt_insercao = :dt
+          AND CgePortfolio IS NOT NULL
+          AND DataCarteira IS NOT NULL
     """
-    df = pd.read_sql(query, ENGINE)
 
-    if df.empty:
-        return
+    with ENGINE.begin() as conn:
+        conn.execute(text(f"""
+            DELETE a
+            FROM TB_ENQ_POSICOES_EXTERIOR_MENSAL a
+            JOIN ({pares}) k
+                ON  a.CgePortfolio = k.CgePortfolio
+                AND a.ano = k.ano
+                AND a.mes = k.mes
+        """), params)
+
+        conn.execute(text(f"""
+            INSERT INTO TB_ENQ_POSICOES_EXTERIOR_MENSAL
+                (CgePortfolio, ano, mes, DataCarteira, SomaExterior_Offshore,
+                 dt_insercao, ClassificacaoFiltro)
+            SELECT
+                CgePortfolio, ano, mes, DataCarteira, SomaExterior_Offshore,
+                dt_insercao, ClassificacaoFiltro
+            FROM (
+                SELECT
+                    s.*,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY CgePortfolio, ano, mes
+                        ORDER BY DataCarteira DESC, dt_insercao DESC
+                    ) AS rn2
+                FROM (
+                    SELECT
+                        CgePortfolio,
+                        YEAR(DataCarteira)  AS ano,
+                        MONTH(DataCarteira) AS mes,
+                        DataCarteira,
+                        SUM(valorfinanceiro) AS SomaExterior_Offshore,
+                        dt_insercao,
+                        ClassificacaoFiltro
+                    FROM (
+                        SELECT
+                            A.*,
+                            ROW_NUMBER() OVER (
+                                PARTITION BY A.CgePortfolio, A.Nickname, A.dt_carteira
+                                ORDER BY A.dt_insercao DESC
+                            ) AS rn
+                        FROM TB_ENQ_POSICOES_FUNDOS_EXPOSTOS A
+                        JOIN ({pares}) k
+                            ON  A.CgePortfolio = k.CgePortfolio
+                            AND A.DataCarteira >= k.inicio
+                            AND A.DataCarteira <  k.inicio + INTERVAL 1 MONTH
+                    ) f
+                    WHERE rn = 1
+                      AND (
+                            (ClassificacaoFiltro = 'Exterior'       AND dt_insercao <  :corte)
+                         OR (ClassificacaoFiltro = 'Fundo Offshore' AND dt_insercao >= :corte)
+                      )
+                    GROUP BY CgePortfolio, DataCarteira, dt_insercao, ClassificacaoFiltro
+                ) s
+            ) t
+            WHERE rn2 = 1
+        """), params)
 
-    # --------------------------------------------------------
-    # 3. Clean existing snapshot for the same batch
-    # --------------------------------------------------------
+# ============================================================
+# AUX — UPDATE RISK EXPOSURE SNAPSHOT
+# ============================================================
+# Purpose:
+# - Rebuild TB_ENQ_EXPOSI_RISCO_SNAPSHOT based on the
+#   latest batch of positions (dt_insercao)
+# - Ensure exposure consistency across OTC / Offshore / Swaps
+#
+# IMPORTANT:
+# - Logic preserved exactly as original implementation
+# - Runs server-side: DELETE + INSERT ... SELECT DISTINCT in one
+#   transaction, no rows pass through Python
+# ============================================================
+
+# This function exists only to make partial re-runs idempotent.
+def atualizar_exposi_risco_snapshot():
     with ENGINE.begin() as conn:
-        conn.execute(text("SET SQL_SAFE_UPDATES = 0;"))
+        # ----------------------------------------------------
+        # 1. Latest batch timestamp from positions table
+        # ----------------------------------------------------
+        max_dt = conn.execute(text(
+            "SELECT MAX(dt_insercao) FROM TB_ENQ_POSICOES_FUNDOS_EXPOSTOS"
+        )).scalar()
+
+        if max_dt is None:
+            return
+
+        # ----------------------------------------------------
+        # 2. Replace the snapshot of that batch, server-side
+        #    (same transaction: readers see old or new, never
+        #    an empty batch)
+        # ----------------------------------------------------
         conn.execute(
             text("""
                 DELETE FROM TB_ENQ_EXPOSI_RISCO_SNAPSHOT
                 WHERE dt_carga = :dt
             """),
-            {"dt": max_dt_sql}
+            {"dt": max_dt}
         )
-        conn.execute(text("SET SQL_SAFE_UPDATES = 1;"))
 
-    # --------------------------------------------------------
-    # 4. Persist snapshot
-    # --------------------------------------------------------
-    df.to_sql(
-        name="TB_ENQ_EXPOSI_RISCO_SNAPSHOT",
-        con=ENGINE,
-        if_exists="append",
-        index=False,
-        chunksize=1000,
-        method="multi"
-    )
+        linhas = conn.execute(
+            text("""
+                INSERT INTO TB_ENQ_EXPOSI_RISCO_SNAPSHOT (CgePortfolio, origem, dt_carga)
+                SELECT DISTINCT
+                    CAST(CgePortfolio AS SIGNED),
+                    NmClassificacao,
+                    dt_insercao
+                FROM TB_ENQ_POSICOES_FUNDOS_EXPOSTOS
+                WHERE dt_insercao = :dt
+                  AND CgePortfolio IS NOT NULL
+            """),
+            {"dt": max_dt}
+        ).rowcount
+
+    if linhas:
+        registrar_lote("TB_ENQ_EXPOSI_RISCO_SNAPSHOT", max_dt, linhas)
 
 
 # ============================================================
@@ -665,7 +1861,7 @@ def run_swaps(log):
     if pd.notna(df_dt.iloc[0]["dt_insercao"]):
         dt_insercao_padrao = df_dt.iloc[0]["dt_insercao"]
     else:
-        dt_insercao_padrao = pd.Timestamp.now()
+        dt_insercao_padrao = pd.Timestamp.now().floor("s")
 
     # --------------------------------------------------------
     # Identify latest available reference date
@@ -705,13 +1901,16 @@ def run_swaps(log):
     )
 
     # --------------------------------------------------------
-    # API loop — retrieve swaps
+    # API requests — retrieve swaps (one per reference date)
     # --------------------------------------------------------
-    dfs = []
+    datas_carteira = [
+        pd.to_datetime(row.ultima_data_mes).strftime("%Y-%m-%d")
+        for row in df_datas_unicas.itertuples()
+    ]
 
-    for row in df_datas_unicas.itertuples():
-        data_carteira = pd.to_datetime(row.ultima_data_mes).strftime("%Y-%m-%d")
+    specs = []
 
+    for data_carteira in datas_carteira:
         body = (
             f'parameters=[{{'
             f'"type":"date/single",'
@@ -721,206 +1920,487 @@ def run_swaps(log):
             f'}}]'
         )
 
-        try:
-            resp = mb_request(
-                method="POST",
-                url=url,
-                headers=headers,
-                data=body,
-                timeout=REQUEST_TIMEOUT,
-                verify=VERIFY_SSL
-            )
+        specs.append({
+            "method": "POST",
+            "url": url,
+            "headers": headers,
+            "data": body,
+            "card": METABASE_CARD_POSICOES_SWAP
+        })
+
+    limiter = RateLimiter(METABASE_MAX_RPS)
+    falhas = []
+
+    def buscar_swaps_stream(lote_datas, lote_specs):
+        # METABASE_STREAMING: chunks are yielded while the
+        # response downloads; a date failing midway keeps the
+        # chunks already yielded and is reported in falhas
+        for data_carteira, spec in zip(lote_datas, lote_specs):
+            limiter.acquire()
+            try:
+                for df_tmp in mb_stream(**spec):
+                    df_tmp["dt_carteira"] = data_carteira
+                    yield df_tmp
+            except Exception as e:
+                log(f"WARNING — Swaps failed ({data_carteira}): {e}")
+                falhas.append(data_carteira)
+
+    def buscar_swaps(lote_datas, lote_specs):
+        if METABASE_STREAMING:
+            yield from buscar_swaps_stream(lote_datas, lote_specs)
+            return
+
+        resultados = mb_fetch_json(lote_specs, limiter=limiter)
+
+        for data_carteira, data in zip(lote_datas, resultados):
+            if isinstance(data, Exception):
+                log(f"WARNING — Swaps failed ({data_carteira}): {data}")
+                falhas.append(data_carteira)
+                continue
 
-            data = resp.json()
             if not data:
                 continue
 
             df_tmp = pd.DataFrame(data)
             df_tmp["dt_carteira"] = data_carteira
-            dfs.append(df_tmp)
-
-        except Exception as e:
-            log(f"WARNING — Swaps failed ({data_carteira}): {e}")
-
-        sleep(REQUEST_RETRY_SLEEP)
-
-    final_df = pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
-
-    if final_df.empty:
-        log("No swaps returned.")
-        return
-
-    # --------------------------------------------------------
-    # Normalize layout to positions schema
-    # --------------------------------------------------------
-    final_df["dt_carteira"] = pd.to_datetime(final_df["dt_carteira"], errors="coerce")
-
-    final_df["Nickname"]        = final_df["DsIndiceAtivo"]
-    final_df["notional"]        = final_df["ValorNocionalSwap"]
-    final_df["NmClassificacao"] = final_df["origem"]
-    final_df["NuIsin"]          = final_df["DsIndicePassivo"]
-    final_df["DataCarteira"]    = final_df["dt_carteira"]
+            yield df_tmp
+
+    if POSICOES_STREAMING:
+        # ----------------------------------------------------
+        # Streaming mode: one reference date at a time,
+        # normalized and flushed in bounded batches
+        # ----------------------------------------------------
+        gravador = GravadorPosicoes(log=log)
+
+        for i in range(len(specs)):
+            for df_tmp in buscar_swaps(datas_carteira[i:i + 1], specs[i:i + 1]):
+                gravador.adicionar(normalizar_swaps(df_tmp, dt_insercao_padrao))
+
+        gravador.flush()
+        linhas_gravadas = gravador.linhas_gravadas
+
+        if linhas_gravadas == 0:
+            if falhas:
+                log("ERROR — Swaps request failed; nothing written.")
+                return False
+            log("No swaps returned.")
+            return
 
-    final_df["ValorCotacao"]    = None
-    final_df["qtyposicao"]      = None
-    final_df["IdClassificacao"] = None
-    final_df["valorfinanceiro"] = None
-    final_df["CodAtivo"]        = None
-    final_df["CodTipoAtivo"]    = None
+    else:
+        dfs = list(buscar_swaps(datas_carteira, specs))
 
-    # Preserve batch timestamp
-    final_df["dt_insercao"] = dt_insercao_padrao
-
-    cols_final = [
-        "Nickname", "DataCarteira", "notional", "CgePortfolio",
-        "ValorCotacao", "NmClassificacao", "qtyposicao",
-        "IdClassificacao", "valorfinanceiro", "CodAtivo",
-        "NuIsin", "CodTipoAtivo", "dt_carteira", "dt_insercao",
-        "ValorSaldoAtivoSwap", "ValorSaldoPassivoSwap"
-    ]
+        final_df = pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame()
 
-    final_df = final_df[cols_final]
+        if final_df.empty:
+            if falhas:
+                log("ERROR — Swaps request failed; nothing written.")
+                return False
+            log("No swaps returned.")
+            return
 
-    # --------------------------------------------------------
-    # Persist swaps
-    # --------------------------------------------------------
-    final_df.to_sql(
-        name="TB_ENQ_POSICOES_FUNDOS_EXPOSTOS",
-        con=ENGINE,
-        if_exists="append",
-        index=False,
-        chunksize=2000,
-        method="multi"
+        # ----------------------------------------------------
+        # Normalize layout to positions schema
+        # ----------------------------------------------------
+        final_df = normalizar_swaps(final_df, dt_insercao_padrao)
+
+        # ----------------------------------------------------
+        # Persist swaps
+        # ----------------------------------------------------
+        gravar_posicoes(final_df, log=log)
+        linhas_gravadas = len(final_df)
+
+    registrar_lote(
+        "TB_ENQ_POSICOES_FUNDOS_EXPOSTOS",
+        dt_insercao_padrao,
+        linhas_gravadas,
+        acumular=True
     )
 
+    atualizar_posicoes_latest(dt_insercao_padrao)
+    atualizar_exterior_mensal(dt_insercao_padrao)
+
     # --------------------------------------------------------
     # Update risk exposure snapshot (same batch)
     # --------------------------------------------------------
     atualizar_exposi_risco_snapshot()
+    cache.evictar(forcar=True)
+
+    # Partial batch: downstream jobs must not treat it as complete
+    if falhas:
+        log(f"ERROR — Swaps incomplete, failed reference dates: {', '.join(falhas)}")
+        return False
 
     log("Swaps job completed.")
 
 # ============================================================
-# JOB — FULL REMOTE → LOCAL DATABASE REPLICATION
+# JOB — MARGIN CONSOLIDATED (MATERIALIZED)
 # ============================================================
 # Purpose:
-# - Fully replicate ALL tables from the remote database
-# - Preserve schema 1:1 (DDL, types, precision, nullability)
-# - Copy all data into a local MySQL instance
+# - Compute the 3-transform/margin_consolidated.sql output once
+#   per run and store it in TB_ENQ_MARGEM_CONSOLIDADA, so the
+#   BI layer (fact_margin_consolidated.sql) reads a plain table
 #
-# IMPORTANT:
-# - This is NOT a dump/export
-# - This is a full structural + data replication
-# - Logic preserved exactly from original implementation
+# Behavior:
+# - Source CTEs (PL / EXPOSI / ENTUBA / V / E) are read as-is
+#   (latest batches, casts done by MySQL)
+# - Joins, CASE chains and the global ordering are vectorized
+#   in pandas / NumPy (calcular_margem_consolidada)
+# - String comparisons mirror utf8mb4_0900_ai_ci (case and
+#   accent insensitive), like the SQL view
+# - CURDATE() becomes the BRT run date, stored in dt_calculo;
+#   status columns are as of that date
+# - The table is swapped atomically (RENAME TABLE)
+#
+# Parity with the SQL view: tests/test_margem_consolidada.py
+# (fixture frames) and bench/parity_margin_consolidated.py
+# (live MySQL)
 # ============================================================
 
-def backup_local(log):
-    log("Starting local database replication.")
+FONTES_MARGEM_CONSOLIDADA = {
+    "pl": """
+        SELECT
+            CAST(p.cgePortfolio AS SIGNED) AS cgePortfolio,
+            p.nomeFundo,
+            p.descClasseCvm,
+            p.nomeGestor,
+            p.publicoAlvo,
+            CAST(p.pl AS DECIMAL(20,2)) AS pl,
+            p.dt_carga AS dt_carga_pl
+        FROM TB_ENQ_PL_SNAPSHOT p
+        WHERE p.nomeGestor NOT LIKE '%%BTG%%'
+          AND p.dt_carga = (SELECT MAX(dt_carga) FROM TB_ENQ_LOTES WHERE tabela = 'TB_ENQ_PL_SNAPSHOT')
+    """,
+    "exposi": """
+        SELECT
+            CAST(e.CgePortfolio AS SIGNED) AS cgePortfolio,
+            e.origem,
+            e.dt_carga AS dt_carga_exposi
+        FROM TB_ENQ_EXPOSI_RISCO_SNAPSHOT e
+        WHERE e.dt_carga = (SELECT MAX(dt_carga) FROM TB_ENQ_LOTES WHERE tabela = 'TB_ENQ_EXPOSI_RISCO_SNAPSHOT')
+    """,
+    "entuba": """
+        SELECT
+            CAST(m.CgePortfolio AS SIGNED) AS cgePortfolio,
+            CAST(m.DataEnvio AS DATE) AS DataEnvio,
+            CAST(m.MargemLocal AS DECIMAL(20,2)) AS MargemLocal,
+            CAST(m.MargemOffshore AS DECIMAL(20,2)) AS MargemOffshore,
+            m.dt_carga AS dt_carga_entuba
+        FROM VW_ENQ_MARGEM_GESTOR_ULTIMO_LOTE m
+    """,
+    "v": """
+        SELECT
+            CAST(cge AS SIGNED) AS cgePortfolio,
+            MAX(CAST(data AS DATE)) AS data_validacao,
+            MAX(status_valid) AS status_valid
+        FROM TB_ENQ_VALIDACAO_MARGEM
+        WHERE dt_carga = (SELECT MAX(dt_carga) FROM TB_ENQ_VALIDACAO_MARGEM)
+        GROUP BY CAST(cge AS SIGNED)
+    """,
+    "e": """
+        SELECT CAST(cge AS SIGNED) AS cgePortfolio, status
+        FROM TB_ENQ_EXCECOES_MARGEM
+    """,
+}
+
+COLS_MARGEM_CONSOLIDADA = [
+    "cge_fundo", "fundo", "desc_classe_cvm", "nomeGestor", "publicoAlvo", "pl", "origem",
+    "DataEnvioEfetiva", "DataEnvio", "data_validacao", "MargemLocal", "MargemOffshore",
+    "periodicidade_dias", "data_limite_proximo_envio", "dias_para_limite", "status_prazo",
+    "flag_envio_por_validacao", "flag_envio", "flag_exposicao", "margem_consolidada",
+    "exposicao_consolidada", "status_valid", "status", "status_envio",
+    "UltimoEnvio_Ajustado", "StatusPrazo_Ajustado", "UltimoEnvio_Ordem",
+    "dt_carga_pl", "dt_carga_exposi", "dt_carga_entuba",
+]
+
+
+def carregar_fontes_margem(engine=ENGINE):
+    return {
+        nome: pd.read_sql(sql, engine)
+        for nome, sql in FONTES_MARGEM_CONSOLIDADA.items()
+    }
 
-    # ======================================================
-    # 1. LIST ALL TABLES FROM REMOTE DATABASE
-    # ======================================================
 
-    def listar_tabelas():
-        query = "SHOW TABLES;"
-        df = pd.read_sql(query, ENGINE)
-        tabelas = df.iloc[:, 0].tolist()
+def calcular_margem_consolidada(fontes, hoje):
+    hoje = pd.Timestamp(hoje)
 
-        print("\n=== TABLES FOUND IN REMOTE DATABASE ===")
-        for t in tabelas:
-            print(" -", t)
+    # --------------------------------------------------------
+    # BASE + DERIVADO joins (NULL keys never match, as in SQL)
+    # --------------------------------------------------------
+    df = fontes["pl"]
+    for nome in ["exposi", "entuba", "v", "e"]:
+        direita = fontes[nome].dropna(subset=["cgePortfolio"])
+        df = df.merge(direita, on="cgePortfolio", how="left")
+
+    for col in ["DataEnvio", "data_validacao"]:
+        df[col] = pd.to_datetime(df[col])
+
+    for col in ["pl", "MargemLocal", "MargemOffshore"]:
+        df[col] = pd.to_numeric(df[col])
+
+    df["status"] = df["status"].fillna(0)
+
+    efetiva = df["DataEnvio"].fillna(df["data_validacao"])
+    sem_efetiva = efetiva.isna().to_numpy()
+    com_envio = df["DataEnvio"].notna().to_numpy()
+    com_origem = df["origem"].notna().to_numpy()
+
+    origem = _ci(df["origem"])
+    exposicao = np.select(
+        [
+            origem.isin(["otc opc", "otc swap"]).to_numpy(),
+            origem.isin(["fundo offshore"]).to_numpy(),
+        ],
+        ["OTC", "OFFSHORE"],
+        "N/A"
+    )
+    otc = exposicao == "OTC"
 
-        return tabelas
+    # --------------------------------------------------------
+    # PER — periodicity by exposure / target audience
+    # --------------------------------------------------------
+    publico = _ci(df["publicoAlvo"])
+    periodicidade = np.select(
+        [
+            otc & publico.isin(["nao qualificado"]).to_numpy(),
+            otc & publico.isin(["qualificado"]).to_numpy(),
+            otc & publico.isin(["investidor profissional"]).to_numpy(),
+            exposicao == "OFFSHORE",
+        ],
+        [7, 30, 90, 30],
+        np.nan
+    )
 
-    # ======================================================
-    # 2. RECREATE LOCAL TABLE WITH IDENTICAL SCHEMA
-    # ======================================================
+    # --------------------------------------------------------
+    # FINAL — flag and deadline derivations
+    # --------------------------------------------------------
+    flag_validacao = (
+        ~com_envio
+        & df["data_validacao"].notna().to_numpy()
+        & (exposicao != "N/A")
+    )
 
-    def recriar_tabela_local(tabela):
-        print(f"\nRecreating table: {tabela}")
+    limite = efetiva + pd.to_timedelta(periodicidade, unit="D")
+    em_dia = (limite.notna() & (hoje <= limite)).to_numpy()
 
-        # Retrieve remote DDL
-        ddl_query = f"SHOW CREATE TABLE {tabela};"
-        ddl_remote = pd.read_sql(ddl_query, ENGINE).iloc[0, 1]
+    status_prazo = np.select(
+        [exposicao == "N/A", sem_efetiva, em_dia],
+        ["N/A", "Sem Envio", "Em Dia"],
+        "Pendente"
+    )
 
-        print(" - Remote DDL captured.")
+    status_valid = df["status_valid"]
+    status_envio = np.select(
+        [
+            df["data_validacao"].notna().to_numpy(),
+            (df["status"] == 1).to_numpy(),
+            com_envio & com_origem & (status_valid == 1).to_numpy(),
+            com_envio & com_origem & (status_valid.fillna(0) == 0).to_numpy(),
+            ~com_envio & com_origem,
+        ],
+        [
+            "Recebido e Validado",
+            "Recebido e Validado",
+            "Recebido e Validado",
+            "Recebido e N/ Validado",
+            "Não Recebido",
+        ],
+        "N/A"
+    )
 
-        # Drop and recreate locally
-        with ENGINE_LOCAL.begin() as conn:
-            print(" - Dropping local table if exists...")
-            conn.execute(text(f"DROP TABLE IF EXISTS {tabela};"))
+    cem_por_cento = flag_validacao & sem_efetiva
+
+    out = pd.DataFrame({
+        "cge_fundo": df["cgePortfolio"],
+        "fundo": df["nomeFundo"],
+        "desc_classe_cvm": df["descClasseCvm"],
+        "nomeGestor": df["nomeGestor"],
+        "publicoAlvo": df["publicoAlvo"],
+        "pl": df["pl"],
+        "origem": df["origem"],
+        "DataEnvioEfetiva": efetiva,
+        "DataEnvio": df["DataEnvio"],
+        "data_validacao": df["data_validacao"],
+        "MargemLocal": df["MargemLocal"],
+        "MargemOffshore": df["MargemOffshore"],
+        "periodicidade_dias": pd.array(periodicidade, dtype="Int64"),
+        "data_limite_proximo_envio": limite,
+        "dias_para_limite": pd.array((limite - hoje).dt.days, dtype="Int64"),
+        "status_prazo": status_prazo,
+        "flag_envio_por_validacao": flag_validacao.astype(int),
+        "flag_envio": com_envio.astype(int),
+        "flag_exposicao": com_origem.astype(int),
+        "margem_consolidada": df["MargemLocal"].fillna(0) + df["MargemOffshore"].fillna(0),
+        "exposicao_consolidada": exposicao,
+        "status_valid": df["status_valid"],
+        "status": df["status"],
+        "status_envio": status_envio,
+        "UltimoEnvio_Ajustado": efetiva.dt.strftime("%d/%m/%Y").where(
+            ~cem_por_cento, "100% da Exposição"
+        ),
+        "StatusPrazo_Ajustado": np.where(flag_validacao, "N/A", status_prazo),
+        "dt_carga_pl": df["dt_carga_pl"],
+        "dt_carga_exposi": df["dt_carga_exposi"],
+        "dt_carga_entuba": df["dt_carga_entuba"],
+    })
 
-            print(" - Creating local table...")
-            conn.execute(text(ddl_remote))
+    # --------------------------------------------------------
+    # ORDEM — global ROW_NUMBER (NULL dates / CGEs sort first)
+    # --------------------------------------------------------
+    out["_grupo"] = np.select([cem_por_cento, sem_efetiva], [1, 2], 3)
+    out = out.sort_values(
+        ["_grupo", "DataEnvioEfetiva", "cge_fundo"],
+        na_position="first",
+        kind="mergesort"
+    ).drop(columns="_grupo")
+    out["UltimoEnvio_Ordem"] = np.arange(1, len(out) + 1)
 
-        print(f"   Table {tabela} recreated locally.")
+    return out[COLS_MARGEM_CONSOLIDADA].reset_index(drop=True)
 
-    # ======================================================
-    # 3. COPY DATA FROM REMOTE TO LOCAL
-    # ======================================================
 
-    def copiar_dados(tabela):
-        print(f"\nCopying data from table: {tabela}")
+def substituir_tabela(df, tabela, log=None):
+    # Load into a shadow copy, then swap: readers never see a
+    # partially written table
+    nova, antiga = f"{tabela}_NOVA", f"{tabela}_ANTIGA"
 
-        df = pd.read_sql(f"SELECT * FROM {tabela};", ENGINE)
-        print(f" - Rows found in remote: {len(df)}")
+    with ENGINE.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {nova}"))
+        conn.execute(text(f"CREATE TABLE {nova} LIKE {tabela}"))
 
-        if df.empty:
-            print(" - Table empty. Nothing to copy.")
-            return
+    bulk_insert(df, nova, log=log)
 
-        # Clean zero-date issues (only if columns exist)
-        for col in ["dataProcessamento", "dataPosicao"]:
-            if col in df.columns:
-                df[col] = pd.to_datetime(
-                    df[col].replace(
-                        ["0000-00-00 00:00:00", "0000-00-00", ""],
-                        None
-                    ),
-                    errors="coerce"
-                )
+    with ENGINE.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {antiga}"))
+        conn.execute(text(f"RENAME TABLE {tabela} TO {antiga}, {nova} TO {tabela}"))
+        conn.execute(text(f"DROP TABLE {antiga}"))
 
-        df.to_sql(
-            tabela,
-            con=ENGINE_LOCAL,
-            if_exists="append",
-            index=False,
-            chunksize=2000,
-            method="multi"
-        )
 
-        print(f"   Copied {len(df)} rows to local.")
+def run_margem_consolidada(log):
+    log("Starting Margin Consolidated job...")
+
+    tz_brt = timezone(timedelta(hours=-3))
+    agora = datetime.now(tz_brt).replace(microsecond=0, tzinfo=None)
 
-    # ======================================================
-    # 4. FULL REPLICATION PROCESS
-    # ======================================================
+    fontes = carregar_fontes_margem()
 
-    def replicar_completo():
-        print("\n=======================================================")
-        print("        STARTING REMOTE → LOCAL REPLICATION")
-        print("=======================================================\n")
+    if fontes["pl"].empty:
+        log("Margin Consolidated: no PL snapshot available.")
+        return False
 
-        tabelas = listar_tabelas()
+    df = calcular_margem_consolidada(fontes, agora.date())
+    df["dt_calculo"] = agora
 
-        for tabela in tabelas:
-            log(f"Processing table: {tabela}")
+    substituir_tabela(df, "TB_ENQ_MARGEM_CONSOLIDADA", log=log)
 
-            print("\n-------------------------------------------------------")
-            print(f"PROCESSING TABLE: {tabela}")
-            print("-------------------------------------------------------")
+    log(f"Margin Consolidated completed ({len(df)} rows).")
 
-            recriar_tabela_local(tabela)
-            copiar_dados(tabela)
+# ============================================================
+# JOB — PARQUET SNAPSHOT ARCHIVE
+# ============================================================
+# Purpose:
+# - Export every snapshot batch to compressed, date-partitioned
+#   Parquet files (app.arquivo) for replays and ad-hoc analysis
+#   without a database
+#
+# Behavior:
+# - Batches are listed from TB_ENQ_LOTES; only batches without
+#   a file are exported (the latest batch of each table is
+#   always rewritten, since it may still be growing)
+# - Delta manager margin batches are exported in full
+#   (rebuilt from TB_ENQ_MARGEM_LOTE_MEMBROS)
+# - Batches no longer in the table (e.g. superseded exposure
+#   snapshots) keep the file written while they existed
+# - Requires pyarrow; returns False when it is missing
+# ============================================================
+
+# Snapshot table → batch column
+TABELAS_ARQUIVO = {
+    "TB_ENQ_PL_SNAPSHOT": "dt_carga",
+    "TB_ENQ_MARGEM_GESTOR_SNAPSHOT": "dt_carga",
+    "TB_ENQ_EXPOSI_RISCO_SNAPSHOT": "dt_carga",
+    "TB_ENQ_POSICOES_FUNDOS_EXPOSTOS": "dt_insercao",
+}
+
+# Full-batch queries that differ from "WHERE <batch column> = :lote"
+CONSULTAS_ARQUIVO = {
+    "TB_ENQ_MARGEM_GESTOR_SNAPSHOT": """
+        SELECT
+            s.id_carga, mb.dt_carga, s.CgeGestor, s.DataEnvio, s.Status, s.Cnpj,
+            s.CgePortfolio, s.NomePortfolio, s.MargemLocal, s.MargemOffshore, s.MetologiaUtilizada
+        FROM TB_ENQ_MARGEM_LOTE_MEMBROS mb
+        JOIN TB_ENQ_MARGEM_GESTOR_SNAPSHOT s
+            ON s.id_carga = mb.id_carga
+        WHERE mb.dt_carga = :lote
+        UNION ALL
+        SELECT
+            s.id_carga, s.dt_carga, s.CgeGestor, s.DataEnvio, s.Status, s.Cnpj,
+            s.CgePortfolio, s.NomePortfolio, s.MargemLocal, s.MargemOffshore, s.MetologiaUtilizada
+        FROM TB_ENQ_MARGEM_GESTOR_SNAPSHOT s
+        WHERE s.dt_carga = :lote
+          AND NOT EXISTS (
+              SELECT 1
+              FROM TB_ENQ_MARGEM_LOTE_MEMBROS mb
+              WHERE mb.dt_carga = :lote
+          )
+    """,
+}
+
+def run_arquivo_parquet(log, tabelas=None, destino=ARQUIVO_PARQUET_DIR):
+    log("Starting Parquet snapshot archive...")
+
+    try:
+        from app import arquivo
+    except ImportError as e:
+        log(f"ERROR — Parquet archive requires pyarrow: {e}")
+        return False
+
+    for tabela in tabelas or TABELAS_ARQUIVO:
+        coluna = TABELAS_ARQUIVO[tabela]
+        consulta = CONSULTAS_ARQUIVO.get(
+            tabela,
+            f"SELECT * FROM {tabela} WHERE {coluna} = :lote"
+        )
+
+        lotes = pd.read_sql(
+            text("""
+                SELECT dt_carga
+                FROM TB_ENQ_LOTES
+                WHERE tabela = :tabela
+                ORDER BY dt_carga
+            """),
+            ENGINE,
+            params={"tabela": tabela}
+        )["dt_carga"].tolist()
+
+        existentes = arquivo.lotes_arquivados(destino, tabela)
+        pendentes = [
+            lote for i, lote in enumerate(lotes)
+            if arquivo.nome_lote(lote) not in existentes or i == len(lotes) - 1
+        ]
+
+        arquivos = linhas = 0
+
+        for lote in pendentes:
+            df = pd.read_sql(
+                text(consulta),
+                ENGINE,
+                params={"lote": pd.Timestamp(lote).to_pydatetime()}
+            )
+
+            if df.empty:
+                continue
 
-            log(f"Table {tabela} processed.")
+            # Zero dates come back as strings (same cleanup as backup)
+            for col in ["dataProcessamento", "dataPosicao"]:
+                if col in df.columns:
+                    df[col] = pd.to_datetime(
+                        df[col].replace(["0000-00-00 00:00:00", "0000-00-00", ""], None),
+                        errors="coerce"
+                    )
 
-        print("\n=======================================================")
-        print("   REPLICATION FINISHED SUCCESSFULLY")
-        print("=======================================================\n")
+            arquivo.gravar_lote(df, destino, tabela, lote)
+            arquivos += 1
+            linhas += len(df)
 
-    # ======================================================
-    # EXECUTION
-    # ======================================================
+        log(f"{tabela}: {arquivos} batch file(s) written ({linhas} rows)")
 
-    replicar_completo()
-    log("Local database replication completed successfully.")
+    log("Parquet snapshot archive completed.")
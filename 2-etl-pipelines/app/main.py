@@ -14,8 +14,11 @@ from app.jobs import (
     run_pl_historico,
     run_posicoes,
     run_swaps,
-    backup_local
+    run_margem_consolidada,
+    run_arquivo_parquet
 )
+from app.backup import backup_local
+from app.dag import executar_dag, pipeline_completo
 
 # ============================================================
 # THREAD HELPER (avoid UI freeze)
@@ -32,7 +35,7 @@ class App:
     def __init__(self, root):
         self.root = root
         root.title("Risk Capital Jobs")
-        root.geometry("500x550")
+        root.geometry("500x640")
 
         # ----------------------------------------------------
         # DATE PICKER (PL HISTORICAL)
@@ -74,12 +77,24 @@ class App:
             command=lambda: run_in_thread(lambda: run_swaps(self.log))
         ).pack(fill="x", padx=20, pady=5)
 
+        ttk.Button(
+            root,
+            text="Run Margin Consolidated",
+            command=lambda: run_in_thread(lambda: run_margem_consolidada(self.log))
+        ).pack(fill="x", padx=20, pady=5)
+
         ttk.Button(
             root,
             text="Local Backup (Remote → Local)",
             command=lambda: run_in_thread(lambda: backup_local(self.log))
         ).pack(fill="x", padx=20, pady=5)
 
+        ttk.Button(
+            root,
+            text="Export Parquet Archive",
+            command=lambda: run_in_thread(lambda: run_arquivo_parquet(self.log))
+        ).pack(fill="x", padx=20, pady=5)
+
         ttk.Button(
             root,
             text="Run ALL",
@@ -98,7 +113,12 @@ class App:
     # --------------------------------------------------------
     def log(self, msg):
         ts = datetime.now().strftime("%H:%M:%S")
-        self.log_box.insert(tk.END, f"[{ts}] {msg}\n")
+        # Jobs log from worker threads; Tk widgets are only
+        # touched from the main loop
+        self.root.after(0, self._append_log, f"[{ts}] {msg}\n")
+
+    def _append_log(self, line):
+        self.log_box.insert(tk.END, line)
         self.log_box.see(tk.END)
 
     # --------------------------------------------------------
@@ -112,14 +132,13 @@ class App:
         data = self.date_picker.get()
         self.log("Starting full pipeline...")
 
-        run_margem(self.log)
-        run_pl_snapshot(self.log)
-        run_pl_historico(self.log, data)
-        run_posicoes(self.log)
-        run_swaps(self.log)
-        backup_local(self.log)
+        status = executar_dag(pipeline_completo(self.log, data), self.log)
 
-        self.log("Pipeline finished successfully.")
+        if all(s == "ok" for s in status.values()):
+            self.log("Pipeline finished successfully.")
+        else:
+            falhas = [n for n, s in status.items() if s != "ok"]
+            self.log(f"Pipeline finished with failures: {', '.join(falhas)}")
 
 # ============================================================
 # ENTRY POINT
@@ -0,0 +1,185 @@
+import asyncio
+import atexit
+import threading
+
+import aiohttp
+
+from app.config import (
+    METABASE_BASE,
+    METABASE_USER,
+    METABASE_PASS,
+    METABASE_MAX_CONN_PER_HOST,
+    REQUEST_TIMEOUT,
+    VERIFY_SSL
+)
+
+# ============================================================
+# METABASE — ASYNC CLIENT
+# ============================================================
+# Purpose:
+# - asyncio replacement for the shared requests.Session
+# - HTTP/1.1 keep-alive pooling (one aiohttp connector per client)
+# - Per-host concurrency limit (METABASE_MAX_CONN_PER_HOST)
+# - Single-flight re-login on 401: concurrent 401s wait for
+#   one metabase_login instead of each logging in again
+#
+# Usage from synchronous jobs:
+# - fetch_json_all(specs) runs a list of independent requests
+#   concurrently and returns payloads (or exceptions) in order
+# - Every call (every batch of every job, from any thread)
+#   goes through one client on one background event loop, so
+#   the keep-alive pool, the cookies and the single-flight
+#   login are shared across calls; the client is closed at
+#   interpreter exit
+# ============================================================
+
+# Session token shared by every client created in this process
+_SESSION_TOKEN = None
+
+
+class AsyncMetabaseClient:
+    def __init__(self, limit_per_host=METABASE_MAX_CONN_PER_HOST):
+        self.limit_per_host = limit_per_host
+        self.login_count = 0
+        self._session = None
+        self._login_lock = None
+        self._login_generation = 0
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit_per_host=self.limit_per_host,
+            ssl=None if VERIFY_SSL else False
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            cookie_jar=aiohttp.CookieJar(unsafe=True),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        )
+        self._login_lock = asyncio.Lock()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._session.close()
+
+    # --------------------------------------------------------
+    # AUTH (single-flight)
+    # --------------------------------------------------------
+    async def metabase_login(self, generation):
+        global _SESSION_TOKEN
+
+        async with self._login_lock:
+            # Another coroutine already re-logged while we waited
+            if generation != self._login_generation:
+                return
+
+            async with self._session.post(
+                f"{METABASE_BASE}/api/session",
+                json={
+                    "username": METABASE_USER,
+                    "password": METABASE_PASS
+                }
+            ) as r:
+                r.raise_for_status()
+                payload = await r.json(content_type=None)
+
+            _SESSION_TOKEN = (payload or {}).get("id")
+            self._login_generation += 1
+            self.login_count += 1
+
+    # --------------------------------------------------------
+    # REQUEST (auto re-login on 401)
+    # --------------------------------------------------------
+    async def _send(self, method, url, headers=None, **kwargs):
+        headers = dict(headers or {})
+        if _SESSION_TOKEN:
+            headers["X-Metabase-Session"] = _SESSION_TOKEN
+
+        async with self._session.request(
+            method, url, headers=headers, **kwargs
+        ) as r:
+            if r.status == 401:
+                return r.status, None
+
+            r.raise_for_status()
+            return r.status, await r.json(content_type=None)
+
+    async def request_json(self, method, url, **kwargs):
+        generation = self._login_generation
+
+        status, data = await self._send(method, url, **kwargs)
+
+        if status == 401:
+            await self.metabase_login(generation)
+            status, data = await self._send(method, url, **kwargs)
+
+            if status == 401:
+                raise PermissionError(f"Metabase returned 401 after re-login: {url}")
+
+        return data
+
+
+# ============================================================
+# SYNC ENTRY POINT
+# ============================================================
+
+_loop = None
+_cliente = None
+_lock = threading.Lock()
+
+
+def cliente_compartilhado():
+    # Background event loop + client, created on first use
+    global _loop, _cliente
+
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="metabase-async", daemon=True).start()
+
+            _cliente = asyncio.run_coroutine_threadsafe(
+                AsyncMetabaseClient().__aenter__(), loop
+            ).result()
+            _loop = loop
+
+    return _loop, _cliente
+
+
+@atexit.register
+def fechar():
+    global _loop, _cliente
+
+    with _lock:
+        if _loop is None:
+            return
+
+        asyncio.run_coroutine_threadsafe(_cliente.__aexit__(None, None, None), _loop).result()
+        _loop.call_soon_threadsafe(_loop.stop)
+        _loop, _cliente = None, None
+
+
+async def _fetch_json_all(client, specs, limiter=None):
+    async def _one(spec):
+        if limiter is not None:
+            await limiter.acquire_async()
+        try:
+            return await client.request_json(**spec)
+        except Exception as e:
+            return e
+
+    return await asyncio.gather(*(_one(spec) for spec in specs))
+
+
+def fetch_json_all(specs, limiter=None):
+    """
+    Run independent Metabase requests concurrently.
+
+    specs: list of dicts with method, url and optional
+           params / data / headers (same keys as mb_request)
+
+    Returns one entry per spec, in order: the decoded JSON
+    payload, or the exception raised by that request.
+    """
+    loop, client = cliente_compartilhado()
+    return asyncio.run_coroutine_threadsafe(
+        _fetch_json_all(client, specs, limiter), loop
+    ).result()
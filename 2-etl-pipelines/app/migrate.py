@@ -0,0 +1,182 @@
+import hashlib
+import os
+import re
+
+import pandas as pd
+from sqlalchemy import text
+
+from app.db import ENGINE_REMOTE
+
+# ============================================================
+# SCHEMA MIGRATIONS (VERSIONED)
+# ============================================================
+# Purpose:
+# - Apply versioned DDL on top of 1-data-model/schema.sql
+#   (indexes, partitioning, new tables) exactly once per DB
+#
+# Layout:
+# - 2-etl-pipelines/migrations/NNNN_description.sql
+# - Statements separated by ';' at end of line
+# - Applied versions recorded in TB_ENQ_SCHEMA_MIGRACOES
+#   with the file checksum (edited files are reported)
+#
+# Notes:
+# - MySQL DDL auto-commits per statement, so a migration may
+#   fail half-applied; each statement that succeeds is
+#   recorded in TB_ENQ_SCHEMA_MIGRACOES_PASSOS and a re-run
+#   resumes after the last applied statement instead of
+#   repeating it (ADD KEY / REORGANIZE are not idempotent)
+# - PRE_CONDICOES: checks run before a migration's first
+#   statement; a failed check stops the run with a clear
+#   message before any DDL is issued (0008 needs the PL
+#   history compacted first)
+# - A migration is recorded in TB_ENQ_SCHEMA_MIGRACOES only
+#   after all of its statements succeed; its step rows are
+#   then removed
+# ============================================================
+
+MIGRACOES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "migrations"
+)
+
+_NOME = re.compile(r"^(\d{4})_(\w+)\.sql$")
+
+
+def _pl_historico_sem_duplicatas(conn):
+    duplicada = conn.execute(text("""
+        SELECT 1
+        FROM TB_ENQ_PL_HISTORICO
+        GROUP BY cgePortfolio, `data`
+        HAVING COUNT(*) > 1
+        LIMIT 1
+    """)).first()
+
+    if duplicada is not None:
+        raise RuntimeError(
+            "TB_ENQ_PL_HISTORICO has duplicate (cgePortfolio, data) rows; "
+            "run `python -m app.cli compact pl_historico` before migration 0008."
+        )
+
+
+PRE_CONDICOES = {
+    "0008": _pl_historico_sem_duplicatas,
+}
+
+
+def listar_migracoes(pasta=MIGRACOES_DIR):
+    migracoes = []
+    for arquivo in sorted(os.listdir(pasta)):
+        m = _NOME.match(arquivo)
+        if m:
+            migracoes.append((m.group(1), m.group(2), os.path.join(pasta, arquivo)))
+    return migracoes
+
+
+def instrucoes(sql):
+    # Split on ';' closing a line; drop comment-only chunks
+    partes = re.split(r";\s*$", sql, flags=re.MULTILINE)
+    resultado = []
+    for parte in partes:
+        linhas = [l for l in parte.strip().splitlines() if not l.strip().startswith("--")]
+        corpo = "\n".join(linhas).strip()
+        if corpo:
+            resultado.append(corpo)
+    return resultado
+
+
+def aplicar_migracoes(log, engine=ENGINE_REMOTE, ate=None, dry_run=False):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS TB_ENQ_SCHEMA_MIGRACOES (
+                versao char(4) NOT NULL,
+                nome varchar(200) NOT NULL,
+                checksum char(64) NOT NULL,
+                dt_aplicacao datetime NOT NULL,
+                PRIMARY KEY (versao)
+            )
+        """))
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS TB_ENQ_SCHEMA_MIGRACOES_PASSOS (
+                versao char(4) NOT NULL,
+                passo int NOT NULL,
+                checksum char(64) NOT NULL,
+                dt_aplicacao datetime NOT NULL,
+                PRIMARY KEY (versao, passo)
+            )
+        """))
+
+    aplicadas = pd.read_sql("SELECT versao, checksum FROM TB_ENQ_SCHEMA_MIGRACOES", engine)
+    aplicadas = dict(zip(aplicadas["versao"], aplicadas["checksum"]))
+
+    passos = pd.read_sql("SELECT versao, passo, checksum FROM TB_ENQ_SCHEMA_MIGRACOES_PASSOS", engine)
+    passos = {(v, int(p)): c for v, p, c in zip(passos["versao"], passos["passo"], passos["checksum"])}
+
+    novas = 0
+
+    for versao, nome, caminho in listar_migracoes():
+        if ate is not None and versao > ate:
+            break
+
+        with open(caminho, encoding="utf-8") as f:
+            sql = f.read()
+        checksum = hashlib.sha256(sql.encode("utf-8")).hexdigest()
+
+        if versao in aplicadas:
+            if aplicadas[versao] != checksum:
+                log(f"WARNING — Migration {versao}_{nome} changed after being applied.")
+            continue
+
+        log(f"Applying migration {versao}_{nome}...")
+
+        if dry_run:
+            for passo, stmt in enumerate(instrucoes(sql)):
+                feito = " (already applied)" if (versao, passo) in passos else ""
+                log(f"  {stmt.splitlines()[0]} ...{feito}")
+            continue
+
+        with engine.connect() as conn:
+            if versao in PRE_CONDICOES and (versao, 0) not in passos:
+                PRE_CONDICOES[versao](conn)
+
+            for passo, stmt in enumerate(instrucoes(sql)):
+                chk_passo = hashlib.sha256(stmt.encode("utf-8")).hexdigest()
+
+                # Resume a half-applied migration after its last
+                # successful statement
+                if (versao, passo) in passos:
+                    if passos[(versao, passo)] != chk_passo:
+                        raise RuntimeError(
+                            f"Migration {versao}_{nome} statement {passo + 1} changed "
+                            f"after being applied; fix the schema by hand."
+                        )
+                    log(f"  Statement {passo + 1} already applied, skipping.")
+                    continue
+
+                conn.exec_driver_sql(stmt)
+                conn.execute(
+                    text("""
+                        INSERT INTO TB_ENQ_SCHEMA_MIGRACOES_PASSOS (versao, passo, checksum, dt_aplicacao)
+                        VALUES (:versao, :passo, :checksum, NOW())
+                    """),
+                    {"versao": versao, "passo": passo, "checksum": chk_passo}
+                )
+                conn.commit()
+
+            conn.execute(
+                text("DELETE FROM TB_ENQ_SCHEMA_MIGRACOES_PASSOS WHERE versao = :versao"),
+                {"versao": versao}
+            )
+            conn.execute(
+                text("""
+                    INSERT INTO TB_ENQ_SCHEMA_MIGRACOES (versao, nome, checksum, dt_aplicacao)
+                    VALUES (:versao, :nome, :checksum, NOW())
+                """),
+                {"versao": versao, "nome": nome, "checksum": checksum}
+            )
+            conn.commit()
+
+        novas += 1
+
+    log(f"Migrations up to date ({novas} applied).")
+    return novas
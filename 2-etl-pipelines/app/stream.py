@@ -0,0 +1,178 @@
+import codecs
+import csv
+import json
+import re
+
+import pandas as pd
+
+# ============================================================
+# STREAMING READERS — METABASE CARD RESPONSES
+# ============================================================
+# Purpose:
+# - Parse a card response while it is downloaded instead of
+#   holding the raw body, the list of dicts and the DataFrame
+#   in memory at the same time
+#
+# Behavior:
+# - Input is an iterable of byte chunks (resp.iter_content)
+# - linhas_json: top-level JSON array of row objects, decoded
+#   one row at a time with json.JSONDecoder.raw_decode
+# - linhas_csv: CSV export (header + rows; quoted multi-line
+#   fields supported), empty cells as None
+# - em_blocos: groups rows into column lists and yields one
+#   DataFrame per `tamanho` rows, so peak memory follows the
+#   chunk size, not the response size
+# - CSV cells arrive as text: columns whose every value is
+#   numeric (no leading zeros, e.g. CNPJ) are converted
+# ============================================================
+
+TAMANHO_LEITURA = 1 << 20
+
+_DECODER = json.JSONDecoder()
+_ESPACOS = " \t\r\n"
+_ZERO_A_ESQUERDA = re.compile(r"^-?0\d")
+
+
+def _textos(partes):
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    for parte in partes:
+        texto = decoder.decode(parte)
+        if texto:
+            yield texto
+
+    fim = decoder.decode(b"", final=True)
+    if fim:
+        yield fim
+
+
+def linhas_json(partes):
+    buffer = ""
+    pos = 0
+    estado = "inicio"
+
+    for texto in _textos(partes):
+        buffer = buffer[pos:] + texto
+        pos = 0
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in _ESPACOS:
+                pos += 1
+
+            if pos >= len(buffer) or estado == "fim":
+                break
+
+            if estado == "inicio":
+                if buffer[pos] != "[":
+                    raise ValueError(
+                        f"Expected a JSON array of rows, got: {buffer[pos:pos + 300]!r}"
+                    )
+                pos += 1
+                estado = "item"
+
+            elif estado == "separador":
+                if buffer[pos] == ",":
+                    pos += 1
+                    estado = "item"
+                elif buffer[pos] == "]":
+                    pos += 1
+                    estado = "fim"
+                else:
+                    raise ValueError(f"Malformed JSON near: {buffer[pos:pos + 100]!r}")
+
+            elif buffer[pos] == "]":
+                pos += 1
+                estado = "fim"
+
+            else:
+                # An incomplete row raises; wait for the next chunk
+                try:
+                    linha, fim = _DECODER.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    break
+
+                if fim == len(buffer) and not isinstance(linha, (dict, list)):
+                    break
+
+                yield linha
+                pos = fim
+                estado = "separador"
+
+    if estado != "fim":
+        raise ValueError("Truncated JSON response")
+
+
+def _linhas_texto(partes):
+    resto = ""
+
+    for texto in _textos(partes):
+        linhas = (resto + texto).split("\n")
+        resto = linhas.pop()
+        for linha in linhas:
+            yield linha + "\n"
+
+    if resto:
+        yield resto
+
+
+def linhas_csv(partes):
+    leitor = csv.reader(_linhas_texto(partes))
+    cabecalho = next(leitor, None)
+
+    if not cabecalho:
+        return
+
+    cabecalho[0] = cabecalho[0].lstrip("\ufeff")
+
+    for valores in leitor:
+        if valores:
+            yield dict(zip(cabecalho, (v if v != "" else None for v in valores)))
+
+
+def _numericos(df):
+    for col in df.columns:
+        valores = df[col].dropna()
+
+        if valores.empty or valores.map(lambda v: not isinstance(v, str)).any():
+            continue
+        if valores.str.match(_ZERO_A_ESQUERDA).any():
+            continue
+
+        convertidos = pd.to_numeric(df[col], errors="coerce")
+        if convertidos.notna().sum() == len(valores):
+            df[col] = convertidos
+
+    return df
+
+
+def _bloco(colunas, converter):
+    df = pd.DataFrame(colunas)
+    return _numericos(df) if converter else df
+
+
+def em_blocos(linhas, tamanho, converter_numericos=False):
+    colunas = {}
+    n = 0
+
+    for linha in linhas:
+        for chave, valor in linha.items():
+            coluna = colunas.get(chave)
+            if coluna is None:
+                coluna = colunas[chave] = [None] * n
+            coluna.append(valor)
+
+        n += 1
+
+        # Keys absent from this row
+        if len(linha) != len(colunas):
+            for coluna in colunas.values():
+                if len(coluna) < n:
+                    coluna.append(None)
+
+        if n >= tamanho:
+            yield _bloco(colunas, converter_numericos)
+            colunas = {}
+            n = 0
+
+    if n:
+        yield _bloco(colunas, converter_numericos)
@@ -0,0 +1,46 @@
+import asyncio
+import threading
+from time import monotonic, sleep
+
+# ============================================================
+# RATE LIMITER — GLOBAL REQUESTS PER SECOND
+# ============================================================
+# Purpose:
+# - Replace the fixed sleep between Metabase requests
+# - Enforce one requests-per-second ceiling shared by every
+#   worker thread of a job
+#
+# Behavior:
+# - Each acquire() reserves the next free time slot and sleeps
+#   until it is reached (slots are spaced by 1 / max_rps)
+# - acquire_async() is the same slot reservation for asyncio
+#   callers (awaits instead of blocking the event loop)
+# - max_rps <= 0 disables the limit
+# ============================================================
+
+class RateLimiter:
+    def __init__(self, max_rps):
+        self.interval = 1.0 / max_rps if max_rps and max_rps > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def _reservar(self):
+        if not self.interval:
+            return 0.0
+
+        with self._lock:
+            now = monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+
+        return slot - now
+
+    def acquire(self):
+        delay = self._reservar()
+        if delay > 0:
+            sleep(delay)
+
+    async def acquire_async(self):
+        delay = self._reservar()
+        if delay > 0:
+            await asyncio.sleep(delay)
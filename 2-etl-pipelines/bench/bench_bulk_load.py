@@ -0,0 +1,103 @@
+# ============================================================
+# BENCHMARK — BULK LOADER VS pandas to_sql
+# ============================================================
+# Purpose:
+# - Compare app.db.bulk_insert paths against the legacy
+#   to_sql(method="multi") path on a synthetic positions batch
+#
+# Usage (from 2-etl-pipelines/):
+#   python -m bench.bench_bulk_load
+#   python -m bench.bench_bulk_load --url mysql+pymysql://u:p@localhost/bench
+#   python -m bench.bench_bulk_load --rows 500000
+#
+# Default target is a SQLite stand-in (infile is skipped there).
+# ============================================================
+
+import argparse
+import os
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+# app.db builds its engines at import time; placeholders keep the
+# import working when no .env is present (nothing connects to them)
+for _var in ["DB_REMOTE_PORT", "DB_LOCAL_PORT"]:
+    os.environ.setdefault(_var, "3306")
+
+from app.db import bulk_insert  # noqa: E402
+
+TABELA = "BENCH_POSICOES"
+
+
+def gerar_posicoes(n):
+    rng = np.random.default_rng(42)
+    agora = pd.Timestamp.now().floor("s")
+
+    return pd.DataFrame({
+        "Nickname": [f"ATIVO_{i % 5000}" for i in range(n)],
+        "DataCarteira": pd.Timestamp("2025-12-01"),
+        "notional": rng.normal(1e6, 2e5, n).round(6),
+        "CgePortfolio": rng.integers(1000, 9999, n),
+        "ValorCotacao": rng.normal(100, 10, n).round(6),
+        "NmClassificacao": rng.choice(["OTC OPC", "OTC SWAP", "Fundo Offshore"], n),
+        "qtyposicao": rng.integers(1, 10000, n).astype(float),
+        "valorfinanceiro": rng.normal(5e5, 1e5, n).round(6),
+        "NuIsin": [None if i % 7 == 0 else f"BR{i:010d}" for i in range(n)],
+        "dt_insercao": agora,
+    })
+
+
+def preparar_tabela(engine, df):
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABELA}"))
+    df.head(0).to_sql(TABELA, engine, index=False)
+
+
+def medir(engine, df, metodo):
+    preparar_tabela(engine, df)
+
+    inicio = perf_counter()
+    bulk_insert(df, TABELA, engine=engine, metodo=metodo)
+    duracao = perf_counter() - inicio
+
+    with engine.connect() as conn:
+        total = conn.execute(text(f"SELECT COUNT(*) FROM {TABELA}")).scalar()
+
+    return duracao, total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="sqlite:///bench_bulk_load.db")
+    parser.add_argument("--rows", type=int, default=200_000)
+    args = parser.parse_args()
+
+    engine = create_engine(
+        args.url,
+        connect_args={"local_infile": True} if args.url.startswith("mysql") else {}
+    )
+    df = gerar_posicoes(args.rows)
+
+    metodos = ["to_sql", "executemany"]
+    if engine.dialect.name == "mysql":
+        metodos.append("infile")
+
+    print(f"{args.rows:,} rows -> {engine.dialect.name}")
+
+    base = None
+    for metodo in metodos:
+        duracao, total = medir(engine, df, metodo)
+        base = base or duracao
+        print(
+            f"  {metodo:<12} {duracao:8.2f}s  "
+            f"{total / duracao:12,.0f} rows/s  x{base / duracao:5.1f}"
+        )
+
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABELA}"))
+
+
+if __name__ == "__main__":
+    main()
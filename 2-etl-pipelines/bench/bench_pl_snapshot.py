@@ -0,0 +1,143 @@
+# ============================================================
+# BENCHMARK — PL SNAPSHOT NORMALIZER
+# ============================================================
+# Purpose:
+# - Compare the legacy json_normalize path (flatten everything,
+#   rename with a regex, concat, select columns) against the
+#   schema-driven normalizar_pl_snapshot on a large synthetic
+#   payload shaped like the Funds Platform response
+# - Check that both paths yield the same values
+#
+# Usage (from 2-etl-pipelines/):
+#   python -m bench.bench_pl_snapshot
+#   python -m bench.bench_pl_snapshot --rows 500000 --extra 40
+#
+# No database is needed.
+# ============================================================
+
+import argparse
+import os
+import re
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+for _var in ["DB_REMOTE_PORT", "DB_LOCAL_PORT"]:
+    os.environ.setdefault(_var, "3306")
+
+from app.jobs import SCHEMA_PL_SNAPSHOT, normalizar_pl_snapshot  # noqa: E402
+
+DECIMAIS = [col for col, tipo, _ in SCHEMA_PL_SNAPSHOT if tipo == "decimal"]
+
+
+def gerar_payload(n, extra):
+    rng = np.random.default_rng(42)
+    metricas = rng.normal(1e6, 3e5, (n, len(DECIMAIS)))
+    payload = []
+
+    for i in range(n):
+        resultado = {
+            "cgePortfolio": 100000 + i,
+            # ISO 8601 variants seen in the API (fraction, offset)
+            "dataProcessamento": ["2025-12-01T06:15:00", "2025-12-01T06:15:00.123", "2025-12-01T03:15:00-03:00"][i % 3],
+            "dataPosicao": "2025-11-28T00:00:00",
+            "nomeFundo": f"FUNDO {i}",
+            "cnpj": f"{i:014d}",
+            "cgeGestor": 500 + i % 300,
+            "nomeGestor": f"GESTORA {i % 300}",
+            "publicoAlvo": ["Geral", "Qualificado", "Investidor Profissional"][i % 3],
+            "tipoPortfolio": "FUNDO",
+            "classAnbidScp": "Multimercado",
+            "fundoFechado": bool(i % 5 == 0),
+            "restricaoInvestimento": None,
+            "classeCvm": "FIM",
+            "descClasseCvm": "Multimercado",
+            "detalhesJson": {"criticidade": ["Baixa", "Média", "Alta"][i % 3]},
+            # Fields the snapshot does not keep (flattened anyway
+            # by the legacy path)
+            "cadastro": {f"campo{k}": k * i for k in range(extra)},
+        }
+
+        detalhes = resultado["detalhesJson"]
+        for j, col in enumerate(DECIMAIS):
+            detalhes[col] = None if (i + j) % 17 == 0 else float(metricas[i, j])
+
+        payload.append({"sucesso": True, "erros": None, "resultado": resultado})
+
+    return payload
+
+
+def normalizar_legado(data, dt_carga):
+    # run_pl_snapshot before the schema-driven normalizer
+    df = pd.DataFrame(data)
+    df_expanded = pd.json_normalize(df["resultado"], sep="_")
+    df_expanded.columns = [
+        re.sub(r"^(detalhesJson[._])", "", c) for c in df_expanded.columns
+    ]
+    df_final = pd.concat([df.drop(columns=["resultado"]), df_expanded], axis=1)
+    df_final["dt_carga"] = dt_carga
+
+    return df_final[[col for col, _, _ in SCHEMA_PL_SNAPSHOT] + ["dt_carga"]]
+
+
+def medir(funcao, data, dt_carga, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = perf_counter()
+        df = funcao(data, dt_carga)
+        tempos.append(perf_counter() - inicio)
+    return min(tempos), df
+
+
+def divergencias(legado, novo):
+    total = 0
+
+    for col, tipo, escala in SCHEMA_PL_SNAPSHOT:
+        a, b = legado[col], novo[col]
+
+        if tipo in ("decimal", "bigint", "tinyint"):
+            a = pd.to_numeric(a.astype(object), errors="coerce").to_numpy(dtype=float)
+            b = b.to_numpy(dtype=float, na_value=np.nan)
+            iguais = pd.Series(np.isclose(np.round(a, escala or 0), b, equal_nan=True))
+        elif tipo in ("datetime", "date"):
+            a = pd.to_datetime(a, errors="coerce", format="ISO8601", utc=True).dt.tz_localize(None)
+            a = a.dt.normalize() if tipo == "date" else a
+            iguais = (a == b) | (a.isna() & b.isna())
+        else:
+            iguais = (a.astype(object).where(a.notna(), None) == b) | (a.isna() & b.isna())
+
+        if not iguais.all():
+            total += int((~iguais).sum())
+            print(f"  {col}: {(~iguais).sum()} mismatches")
+
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--extra", type=int, default=20, help="unused nested fields per record")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    data = gerar_payload(args.rows, args.extra)
+    dt_carga = pd.Timestamp.now().floor("s")
+
+    print(f"{args.rows:,} records, {len(SCHEMA_PL_SNAPSHOT)} target fields, {args.extra} unused nested fields")
+
+    t_legado, df_legado = medir(normalizar_legado, data, dt_carga, args.repeat)
+    t_novo, df_novo = medir(normalizar_pl_snapshot, data, dt_carga, args.repeat)
+
+    for nome, duracao in [("json_normalize", t_legado), ("schema-driven", t_novo)]:
+        print(f"  {nome:<15} {duracao:8.2f}s  {args.rows / duracao:12,.0f} rows/s  x{t_legado / duracao:5.1f}")
+
+    memoria = lambda df: df.memory_usage(deep=True).sum() / 2**20  # noqa: E731
+    print(f"  DataFrame memory: {memoria(df_legado):,.1f} MiB -> {memoria(df_novo):,.1f} MiB")
+
+    total = divergencias(df_legado, df_novo)
+    print(f"  {total} value mismatches")
+
+
+if __name__ == "__main__":
+    main()
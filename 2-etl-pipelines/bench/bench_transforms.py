@@ -0,0 +1,189 @@
+# ============================================================
+# BENCHMARK — 3-transform QUERIES BEFORE / AFTER MIGRATIONS
+# ============================================================
+# Purpose:
+# - Time every 3-transform/*.sql query on the baseline schema
+#   (1-data-model/schema.sql + the batch registry, migration
+#   0001), then apply the other migrations (indexes,
+#   partitioning) and time them again on the same data
+#
+# Usage (from 2-etl-pipelines/):
+#   python -m bench.bench_transforms --url mysql+pymysql://u:p@localhost/bench
+#   python -m bench.bench_transforms --url ... --funds 3000 --days 1000
+#
+# The target database is wiped (all schema.sql tables are
+# dropped and recreated) — never point this at a real DB.
+# ============================================================
+
+import argparse
+import glob
+import os
+import re
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+# app.db builds its engines at import time; placeholders keep the
+# import working when no .env is present (nothing connects to them)
+for _var in ["DB_REMOTE_PORT", "DB_LOCAL_PORT"]:
+    os.environ.setdefault(_var, "3306")
+
+from app.db import bulk_insert  # noqa: E402
+from app.migrate import aplicar_migracoes, instrucoes  # noqa: E402
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SCHEMA = os.path.join(RAIZ, "1-data-model", "schema.sql")
+TRANSFORM_DIR = os.path.join(RAIZ, "3-transform")
+
+
+def log(msg):
+    print(msg, flush=True)
+
+
+def criar_schema(engine):
+    with open(SCHEMA, encoding="utf-8") as f:
+        ddl = f.read()
+
+    tabelas = re.findall(r"CREATE TABLE `(\w+)`", ddl)
+
+    with engine.connect() as conn:
+        conn.exec_driver_sql("DROP TABLE IF EXISTS TB_ENQ_SCHEMA_MIGRACOES")
+        conn.exec_driver_sql("DROP TABLE IF EXISTS TB_ENQ_LOTES")
+        for tabela in tabelas:
+            conn.exec_driver_sql(f"DROP TABLE IF EXISTS `{tabela}`")
+        for stmt in instrucoes(ddl):
+            conn.exec_driver_sql(stmt)
+        conn.commit()
+
+
+def gerar_dados(engine, n_fundos, n_dias, n_cargas):
+    rng = np.random.default_rng(42)
+    cges = np.arange(100000, 100000 + n_fundos)
+    cargas = pd.date_range(end=pd.Timestamp.now().floor("s"), periods=n_cargas, freq="D")
+
+    pl_hist = pd.DataFrame({
+        "cgePortfolio": np.repeat(cges, n_dias),
+        "data": np.tile(pd.date_range(end=pd.Timestamp.today().normalize(), periods=n_dias), n_fundos),
+    })
+    pl_hist["patrimonio_abertura"] = rng.normal(1e8, 2e7, len(pl_hist)).round(2)
+    pl_hist["patrimonio_fechamento"] = pl_hist["patrimonio_abertura"]
+    pl_hist["dt_carga"] = cargas[-1]
+
+    snapshot, margem, exposi, posicoes, lotes = [], [], [], [], []
+
+    for dt in cargas:
+        snapshot.append(pd.DataFrame({
+            "dt_carga": dt,
+            "cgePortfolio": cges,
+            "nomeFundo": [f"FUNDO {c}" for c in cges],
+            "nomeGestor": rng.choice(["GESTORA A", "GESTORA B", "GESTORA C"], n_fundos),
+            "publicoAlvo": "GERAL",
+            "descClasseCvm": rng.choice(["Multimercado", "Ações", "Renda Fixa"], n_fundos),
+            "pl": rng.normal(1e8, 2e7, n_fundos).round(2),
+        }))
+        margem.append(pd.DataFrame({
+            "dt_carga": dt,
+            "CgeGestor": rng.integers(1, 50, n_fundos),
+            "DataEnvio": dt - pd.Timedelta(days=1),
+            "Status": 1,
+            "CgePortfolio": cges,
+            "MargemLocal": rng.uniform(0, 0.4, n_fundos).round(6),
+            "MargemOffshore": rng.uniform(0, 0.2, n_fundos).round(6),
+        }))
+        exposi.append(pd.DataFrame({
+            "CgePortfolio": cges[: n_fundos // 3],
+            "origem": "OFFSHORE",
+            "dt_carga": dt,
+        }))
+        posicoes.append(pd.DataFrame({
+            "Nickname": [f"ATIVO_{i % 500}" for i in range(n_fundos * 5)],
+            "DataCarteira": dt.normalize(),
+            "CgePortfolio": np.repeat(cges, 5),
+            "NmClassificacao": rng.choice(["OTC OPC", "OTC SWAP", "Fundo Offshore", "Investimento no Exterior"], n_fundos * 5),
+            "valorfinanceiro": rng.normal(5e5, 1e5, n_fundos * 5).round(6),
+            "CodTipoAtivo": rng.integers(1, 40, n_fundos * 5),
+            "dt_carteira": dt.normalize(),
+            "dt_insercao": dt,
+        }))
+        for tabela in ["TB_ENQ_PL_SNAPSHOT", "TB_ENQ_MARGEM_GESTOR_SNAPSHOT", "TB_ENQ_EXPOSI_RISCO_SNAPSHOT", "TB_ENQ_POSICOES_FUNDOS_EXPOSTOS"]:
+            lotes.append({"tabela": tabela, "dt_carga": dt, "linhas": 0, "dt_registro": dt})
+
+    bulk_insert(pl_hist, "TB_ENQ_PL_HISTORICO", engine=engine, log=log)
+    bulk_insert(pd.concat(snapshot), "TB_ENQ_PL_SNAPSHOT", engine=engine, log=log)
+    bulk_insert(pd.concat(margem), "TB_ENQ_MARGEM_GESTOR_SNAPSHOT", engine=engine, log=log)
+    bulk_insert(pd.concat(exposi), "TB_ENQ_EXPOSI_RISCO_SNAPSHOT", engine=engine, log=log)
+    bulk_insert(pd.concat(posicoes), "TB_ENQ_POSICOES_FUNDOS_EXPOSTOS", engine=engine, log=log)
+    bulk_insert(pd.DataFrame(lotes), "TB_ENQ_LOTES", engine=engine, log=log)
+
+    with engine.connect() as conn:
+        for tabela in ["TB_ENQ_PL_HISTORICO", "TB_ENQ_PL_SNAPSHOT", "TB_ENQ_MARGEM_GESTOR_SNAPSHOT",
+                       "TB_ENQ_EXPOSI_RISCO_SNAPSHOT", "TB_ENQ_POSICOES_FUNDOS_EXPOSTOS"]:
+            conn.exec_driver_sql(f"ANALYZE TABLE {tabela}")
+
+
+def medir_transforms(engine, repeticoes):
+    tempos = {}
+
+    for caminho in sorted(glob.glob(os.path.join(TRANSFORM_DIR, "*.sql"))):
+        nome = os.path.basename(caminho)
+        with open(caminho, encoding="utf-8") as f:
+            sql = f.read().strip().rstrip(";")
+
+        melhores = []
+        try:
+            for _ in range(repeticoes):
+                inicio = perf_counter()
+                with engine.connect() as conn:
+                    conn.exec_driver_sql(sql).fetchall()
+                melhores.append(perf_counter() - inicio)
+            tempos[nome] = min(melhores)
+        except Exception as e:
+            log(f"  {nome}: failed ({type(e).__name__})")
+            tempos[nome] = None
+
+    return tempos
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", required=True, help="MySQL URL of a throwaway database")
+    parser.add_argument("--funds", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=750)
+    parser.add_argument("--loads", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    engine = create_engine(args.url, connect_args={"local_infile": True})
+
+    log("Creating baseline schema...")
+    criar_schema(engine)
+    # The 3-transform queries resolve batches through TB_ENQ_LOTES,
+    # so the registry is part of the baseline being timed
+    aplicar_migracoes(log, engine=engine, ate="0001")
+    log("Generating data...")
+    gerar_dados(engine, args.funds, args.days, args.loads)
+
+    log("Timing baseline...")
+    antes = medir_transforms(engine, args.repeat)
+
+    aplicar_migracoes(log, engine=engine)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ANALYZE TABLE TB_ENQ_PL_HISTORICO, TB_ENQ_POSICOES_FUNDOS_EXPOSTOS")
+
+    log("Timing after migrations...")
+    depois = medir_transforms(engine, args.repeat)
+
+    print()
+    print(f"{'query':<40} {'before (s)':>12} {'after (s)':>12} {'speedup':>9}")
+    for nome in antes:
+        a, d = antes[nome], depois[nome]
+        if a is None or d is None:
+            print(f"{nome:<40} {'-':>12} {'-':>12} {'-':>9}")
+            continue
+        print(f"{nome:<40} {a:>12.3f} {d:>12.3f} {a / d:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# ============================================================
+# PARITY — margin_consolidated.sql VS run_margem_consolidada
+# ============================================================
+# Purpose:
+# - Load a small fixture covering every CASE branch of
+#   3-transform/margin_consolidated.sql into a throwaway MySQL
+#   database, run the SQL view and the pandas / NumPy engine
+#   (calcular_margem_consolidada) and compare every column
+#
+# Usage (from 2-etl-pipelines/):
+#   python -m bench.parity_margin_consolidated --url mysql+pymysql://u:p@localhost/bench
+#
+# Exit code 0 when both outputs match, 1 otherwise.
+# The source tables are dropped and recreated.
+# ============================================================
+
+import argparse
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+for _var in ["DB_REMOTE_PORT", "DB_LOCAL_PORT"]:
+    os.environ.setdefault(_var, "3306")
+
+from app.migrate import instrucoes  # noqa: E402
+from app.jobs import (  # noqa: E402
+    COLS_MARGEM_CONSOLIDADA,
+    calcular_margem_consolidada,
+    carregar_fontes_margem,
+)
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+SCHEMA = os.path.join(RAIZ, "1-data-model", "schema.sql")
+MIGRACAO_LOTES = os.path.join(RAIZ, "2-etl-pipelines", "migrations", "0001_registro_lotes.sql")
+MIGRACAO_DELTA = os.path.join(RAIZ, "2-etl-pipelines", "migrations", "0009_margem_delta.sql")
+VIEW = os.path.join(RAIZ, "3-transform", "margin_consolidated.sql")
+
+TABELAS = [
+    "TB_ENQ_LOTES",
+    "TB_ENQ_PL_SNAPSHOT",
+    "TB_ENQ_EXPOSI_RISCO_SNAPSHOT",
+    "TB_ENQ_MARGEM_GESTOR_SNAPSHOT",
+    "TB_ENQ_VALIDACAO_MARGEM",
+    "TB_ENQ_EXCECOES_MARGEM",
+]
+
+CARGA = pd.Timestamp("2025-12-01 08:00:00")
+ANTERIOR = pd.Timestamp("2025-11-30 08:00:00")
+
+
+def criar_tabelas(engine):
+    # Baseline tables + the batch registry (migration 0001)
+    ddl = ""
+    for caminho in [SCHEMA, MIGRACAO_LOTES]:
+        with open(caminho, encoding="utf-8") as f:
+            ddl += f.read()
+
+    with engine.begin() as conn:
+        for tabela in TABELAS:
+            bloco = re.search(rf"CREATE TABLE (?:IF NOT EXISTS )?`{tabela}` \(.*?\) ENGINE=[^;]*;", ddl, re.S).group(0)
+            conn.execute(text(f"DROP TABLE IF EXISTS `{tabela}`"))
+            conn.exec_driver_sql(bloco)
+
+        # Delta margin batches: hash_linha, membership table and
+        # VW_ENQ_MARGEM_GESTOR_ULTIMO_LOTE
+        conn.execute(text("DROP TABLE IF EXISTS `TB_ENQ_MARGEM_LOTE_MEMBROS`"))
+        with open(MIGRACAO_DELTA, encoding="utf-8") as f:
+            for sql in instrucoes(f.read()):
+                conn.exec_driver_sql(sql)
+
+
+def fixture(hoje):
+    d = lambda dias: (hoje - pd.Timedelta(days=dias)).date()  # noqa: E731
+
+    # cge, gestor, publico, origem, envio, validacao, status_valid, excecao
+    casos = [
+        (1, "GESTORA A", "Não qualificado", "OTC OPC", d(3), None, None, None),        # OTC 7d, em dia
+        (2, "GESTORA A", "Não qualificado", "OTC SWAP", d(20), None, 1, None),          # OTC 7d, pendente, validado
+        (3, "GESTORA B", "Qualificado", "OTC OPC", d(10), None, 0, None),               # OTC 30d, n/ validado
+        (4, "GESTORA B", "Investidor Profissional", "OTC OPC", d(100), None, None, None),
+        (5, "GESTORA C", "Qualificado", "Fundo Offshore", None, d(5), 1, None),          # envio por validação
+        (6, "GESTORA C", "Qualificado", "Fundo Offshore", None, None, None, None),       # sem envio
+        (7, "GESTORA C", "Geral", None, d(2), None, None, None),                        # sem exposição
+        (8, "GESTORA D", "Geral", "OTC OPC", d(4), None, None, None),                   # OTC sem periodicidade
+        (9, "GESTORA D", "não QUALIFICADO", "otc opc", d(1), None, None, None),         # collation ai_ci
+        (10, "GESTORA D", "Qualificado", "Investimento no Exterior", None, None, None, 1),  # exceção
+        (11, "BTG PACTUAL", "Qualificado", "OTC OPC", d(1), None, None, None),          # gestor excluído
+        (12, None, "Qualificado", "OTC OPC", d(1), None, None, None),                   # gestor NULL
+        (13, "GESTORA E", "Qualificado", "OTC OPC", None, None, 2, None),               # não recebido
+        (14, "GESTORA E", "Qualificado", "OTC OPC", d(30), None, None, None),           # limite = hoje
+    ]
+
+    pl, exposi, margem, membros, validacao, excecoes = [], [], [], [], [], []
+
+    for i, (cge, gestor, publico, origem, envio, valid, status_valid, excecao) in enumerate(casos):
+        pl.append({
+            "dt_carga": CARGA, "cgePortfolio": cge, "nomeFundo": f"FUNDO {cge}",
+            "nomeGestor": gestor, "publicoAlvo": publico,
+            "descClasseCvm": "Multimercado", "pl": 1e6 + i * 12345.678,
+        })
+        if origem:
+            exposi.append({"CgePortfolio": cge, "origem": origem, "dt_carga": CARGA})
+        if envio:
+            # Latest batch written in delta mode: odd rows are
+            # unchanged and reused from the previous batch
+            margem.append({
+                "id_carga": cge, "dt_carga": ANTERIOR if i % 2 else CARGA, "CgePortfolio": cge,
+                "DataEnvio": pd.Timestamp(envio) + pd.Timedelta(hours=10),
+                "MargemLocal": 0.123456 * i, "MargemOffshore": None if i % 2 else 0.05,
+            })
+            membros.append({"dt_carga": CARGA, "id_carga": cge})
+        if valid or status_valid is not None:
+            validacao.append({"cge": cge, "data": valid, "status_valid": status_valid, "dt_carga": CARGA})
+        if excecao is not None:
+            excecoes.append({"cge": cge, "status": excecao})
+
+    # Older batches must be ignored by both engines
+    pl.append({"dt_carga": ANTERIOR, "cgePortfolio": 99, "nomeFundo": "ANTIGO", "nomeGestor": "X",
+               "publicoAlvo": "Qualificado", "descClasseCvm": "Multimercado", "pl": 1.0})
+    exposi.append({"CgePortfolio": 1, "origem": "Fundo Offshore", "dt_carga": ANTERIOR})
+    margem.append({"id_carga": 100, "dt_carga": ANTERIOR, "CgePortfolio": 6,
+                   "DataEnvio": pd.Timestamp(d(2)), "MargemLocal": 9.0, "MargemOffshore": 9.0})
+
+    lotes = [
+        {"tabela": t, "dt_carga": dt, "linhas": 0, "dt_registro": dt}
+        for t in ["TB_ENQ_PL_SNAPSHOT", "TB_ENQ_EXPOSI_RISCO_SNAPSHOT", "TB_ENQ_MARGEM_GESTOR_SNAPSHOT"]
+        for dt in [ANTERIOR, CARGA]
+    ]
+
+    return {
+        "TB_ENQ_LOTES": pd.DataFrame(lotes),
+        "TB_ENQ_PL_SNAPSHOT": pd.DataFrame(pl),
+        "TB_ENQ_EXPOSI_RISCO_SNAPSHOT": pd.DataFrame(exposi),
+        "TB_ENQ_MARGEM_GESTOR_SNAPSHOT": pd.DataFrame(margem),
+        "TB_ENQ_MARGEM_LOTE_MEMBROS": pd.DataFrame(membros),
+        "TB_ENQ_VALIDACAO_MARGEM": pd.DataFrame(validacao),
+        "TB_ENQ_EXCECOES_MARGEM": pd.DataFrame(excecoes),
+    }
+
+
+def normalizar(df):
+    df = df[COLS_MARGEM_CONSOLIDADA].sort_values("UltimoEnvio_Ordem").reset_index(drop=True)
+
+    for col in df.columns:
+        if col.startswith(("Data", "data_", "dt_carga")):
+            df[col] = pd.to_datetime(df[col])
+        elif df[col].dtype == object and df[col].map(lambda v: hasattr(v, "as_integer_ratio")).any():
+            df[col] = pd.to_numeric(df[col])
+
+    return df.astype(object).where(df.notna(), None)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", required=True, help="MySQL URL of a throwaway database")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+
+    with engine.connect() as conn:
+        hoje = pd.Timestamp(conn.execute(text("SELECT CURDATE()")).scalar())
+
+    criar_tabelas(engine)
+    for tabela, df in fixture(hoje).items():
+        if not df.empty:
+            df.to_sql(tabela, engine, if_exists="append", index=False)
+
+    with open(VIEW, encoding="utf-8") as f:
+        esperado = pd.read_sql(f.read().strip().rstrip(";").replace("%", "%%"), engine)
+
+    obtido = calcular_margem_consolidada(carregar_fontes_margem(engine), hoje)
+
+    esperado, obtido = normalizar(esperado), normalizar(obtido)
+
+    if len(esperado) != len(obtido):
+        print(f"Row count differs: SQL {len(esperado)} vs Python {len(obtido)}")
+        return 1
+
+    divergencias = 0
+    for col in COLS_MARGEM_CONSOLIDADA:
+        for i, (a, b) in enumerate(zip(esperado[col], obtido[col])):
+            iguais = (a is None and b is None) or (
+                a is not None and b is not None and (
+                    np.isclose(float(a), float(b), atol=0.005)
+                    if isinstance(a, (int, float, np.number)) and not isinstance(a, bool)
+                    else a == b
+                )
+            )
+            if not iguais:
+                divergencias += 1
+                print(f"row {i + 1} {col}: SQL={a!r} Python={b!r}")
+
+    print(f"{len(esperado)} rows, {len(COLS_MARGEM_CONSOLIDADA)} columns, {divergencias} mismatches")
+    return 0 if divergencias == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,32 @@
+-- ============================================================
+-- 0001 — Batch registry (TB_ENQ_LOTES) + backfill
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS `TB_ENQ_LOTES` (
+  `tabela` varchar(64) NOT NULL,
+  `dt_carga` datetime NOT NULL,
+  `linhas` bigint NOT NULL DEFAULT '0',
+  `dt_registro` datetime NOT NULL,
+  PRIMARY KEY (`tabela`,`dt_carga`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+INSERT IGNORE INTO TB_ENQ_LOTES (tabela, dt_carga, linhas, dt_registro)
+SELECT 'TB_ENQ_PL_SNAPSHOT', dt_carga, COUNT(*), NOW()
+FROM TB_ENQ_PL_SNAPSHOT
+GROUP BY dt_carga;
+
+INSERT IGNORE INTO TB_ENQ_LOTES (tabela, dt_carga, linhas, dt_registro)
+SELECT 'TB_ENQ_MARGEM_GESTOR_SNAPSHOT', dt_carga, COUNT(*), NOW()
+FROM TB_ENQ_MARGEM_GESTOR_SNAPSHOT
+GROUP BY dt_carga;
+
+INSERT IGNORE INTO TB_ENQ_LOTES (tabela, dt_carga, linhas, dt_registro)
+SELECT 'TB_ENQ_POSICOES_FUNDOS_EXPOSTOS', dt_insercao, COUNT(*), NOW()
+FROM TB_ENQ_POSICOES_FUNDOS_EXPOSTOS
+WHERE dt_insercao IS NOT NULL
+GROUP BY dt_insercao;
+
+INSERT IGNORE INTO TB_ENQ_LOTES (tabela, dt_carga, linhas, dt_registro)
+SELECT 'TB_ENQ_EXPOSI_RISCO_SNAPSHOT', dt_carga, COUNT(*), NOW()
+FROM TB_ENQ_EXPOSI_RISCO_SNAPSHOT
+GROUP BY dt_carga;
@@ -0,0 +1,32 @@
+-- ============================================================
+-- 0002 — Secondary / covering indexes for job and BI filters
+-- ============================================================
+-- - TB_ENQ_PL_HISTORICO: MAX(data) global and per CGE,
+--   month-end ROW_NUMBER (cgePortfolio, data, dt_carga)
+-- - Snapshot tables: latest-batch filters on dt_carga /
+--   dt_insercao, joined by CGE
+-- - Positions: per-CGE latest dt_carteira (positions_latest)
+-- ============================================================
+
+ALTER TABLE TB_ENQ_PL_HISTORICO
+  ADD INDEX idx_plh_cge_data (cgePortfolio, `data`, dt_carga, patrimonio_abertura, patrimonio_fechamento),
+  ADD INDEX idx_plh_data (`data`),
+  ADD INDEX idx_plh_dt_carga (dt_carga);
+
+ALTER TABLE TB_ENQ_PL_SNAPSHOT
+  ADD INDEX idx_pls_dt_carga_cge (dt_carga, cgePortfolio);
+
+ALTER TABLE TB_ENQ_MARGEM_GESTOR_SNAPSHOT
+  ADD INDEX idx_mgs_dt_carga_cge (dt_carga, CgePortfolio),
+  ADD INDEX idx_mgs_cge_envio (CgePortfolio, DataEnvio);
+
+ALTER TABLE TB_ENQ_POSICOES_FUNDOS_EXPOSTOS
+  ADD INDEX idx_pos_dt_insercao (dt_insercao, CgePortfolio, NmClassificacao),
+  ADD INDEX idx_pos_cge_carteira (CgePortfolio, dt_carteira);
+
+ALTER TABLE TB_ENQ_EXPOSI_RISCO_SNAPSHOT
+  ADD INDEX idx_exr_dt_carga_cge (dt_carga, CgePortfolio, origem),
+  ADD INDEX idx_exr_cge (CgePortfolio);
+
+ALTER TABLE TB_ENQ_VALIDACAO_MARGEM
+  ADD INDEX idx_val_dt_carga_cge (dt_carga, cge);
@@ -0,0 +1,33 @@
+-- ============================================================
+-- 0003 — RANGE partitioning by date on the large tables
+-- ============================================================
+-- - TB_ENQ_PL_HISTORICO by `data` (yearly)
+--   MySQL requires the partitioning column in every unique
+--   key, so the primary key becomes (id_carga, data)
+-- - TB_ENQ_POSICOES_FUNDOS_EXPOSTOS by dt_insercao (yearly,
+--   TIMESTAMP → UNIX_TIMESTAMP)
+-- - pmax catches future rows; split it yearly with
+--   ALTER TABLE ... REORGANIZE PARTITION pmax INTO (...)
+-- ============================================================
+
+ALTER TABLE TB_ENQ_PL_HISTORICO
+  DROP PRIMARY KEY,
+  ADD PRIMARY KEY (id_carga, `data`);
+
+ALTER TABLE TB_ENQ_PL_HISTORICO
+  PARTITION BY RANGE COLUMNS (`data`) (
+    PARTITION p2022 VALUES LESS THAN ('2023-01-01'),
+    PARTITION p2023 VALUES LESS THAN ('2024-01-01'),
+    PARTITION p2024 VALUES LESS THAN ('2025-01-01'),
+    PARTITION p2025 VALUES LESS THAN ('2026-01-01'),
+    PARTITION p2026 VALUES LESS THAN ('2027-01-01'),
+    PARTITION pmax  VALUES LESS THAN (MAXVALUE)
+  );
+
+ALTER TABLE TB_ENQ_POSICOES_FUNDOS_EXPOSTOS
+  PARTITION BY RANGE (UNIX_TIMESTAMP(dt_insercao)) (
+    PARTITION p2024 VALUES LESS THAN (UNIX_TIMESTAMP('2025-01-01 00:00:00')),
+    PARTITION p2025 VALUES LESS THAN (UNIX_TIMESTAMP('2026-01-01 00:00:00')),
+    PARTITION p2026 VALUES LESS THAN (UNIX_TIMESTAMP('2027-01-01 00:00:00')),
+    PARTITION pmax  VALUES LESS THAN (MAXVALUE)
+  );
@@ -0,0 +1,44 @@
+-- ============================================================
+-- 0004 — Month-end PL rollup (TB_ENQ_PL_HISTORICO_MENSAL)
+-- ============================================================
+-- - One row per (cgePortfolio, year, month): latest `data` of
+--   the month, latest load (dt_carga) for that date
+-- - Kept in sync by run_pl_historico (atualizar_pl_mensal);
+--   the backfill below is also the full-rebuild statement
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS `TB_ENQ_PL_HISTORICO_MENSAL` (
+  `cgePortfolio` bigint NOT NULL,
+  `ano` smallint NOT NULL,
+  `mes` tinyint NOT NULL,
+  `data` date NOT NULL,
+  `patrimonio_abertura` decimal(20,2) DEFAULT NULL,
+  `patrimonio_fechamento` decimal(20,2) DEFAULT NULL,
+  `dt_carga` datetime NOT NULL,
+  `id_carga` bigint NOT NULL,
+  PRIMARY KEY (`cgePortfolio`,`ano`,`mes`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+REPLACE INTO TB_ENQ_PL_HISTORICO_MENSAL
+    (cgePortfolio, ano, mes, `data`, patrimonio_abertura,
+     patrimonio_fechamento, dt_carga, id_carga)
+SELECT
+    cgePortfolio, ano, mes, `data`, patrimonio_abertura,
+    patrimonio_fechamento, dt_carga, id_carga
+FROM (
+    SELECT
+        t.cgePortfolio,
+        YEAR(t.`data`)  AS ano,
+        MONTH(t.`data`) AS mes,
+        t.`data`,
+        t.patrimonio_abertura,
+        t.patrimonio_fechamento,
+        t.dt_carga,
+        t.id_carga,
+        ROW_NUMBER() OVER (
+            PARTITION BY t.cgePortfolio, YEAR(t.`data`), MONTH(t.`data`)
+            ORDER BY t.`data` DESC, t.dt_carga DESC, t.id_carga DESC
+        ) AS rn
+    FROM TB_ENQ_PL_HISTORICO t
+) s
+WHERE rn = 1;
@@ -0,0 +1,43 @@
+-- ============================================================
+-- 0005 — Materialized margin consolidation
+-- ============================================================
+-- - Output of 3-transform/margin_consolidated.sql, computed by
+--   run_margem_consolidada and swapped in atomically each run
+-- - Read by 3-transform/fact_margin_consolidated.sql
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS `TB_ENQ_MARGEM_CONSOLIDADA` (
+  `cge_fundo` bigint DEFAULT NULL,
+  `fundo` varchar(255) DEFAULT NULL,
+  `desc_classe_cvm` varchar(100) DEFAULT NULL,
+  `nomeGestor` varchar(255) DEFAULT NULL,
+  `publicoAlvo` varchar(100) DEFAULT NULL,
+  `pl` decimal(20,2) DEFAULT NULL,
+  `origem` varchar(50) DEFAULT NULL,
+  `DataEnvioEfetiva` date DEFAULT NULL,
+  `DataEnvio` date DEFAULT NULL,
+  `data_validacao` date DEFAULT NULL,
+  `MargemLocal` decimal(20,2) DEFAULT NULL,
+  `MargemOffshore` decimal(20,2) DEFAULT NULL,
+  `periodicidade_dias` int DEFAULT NULL,
+  `data_limite_proximo_envio` date DEFAULT NULL,
+  `dias_para_limite` int DEFAULT NULL,
+  `status_prazo` varchar(20) DEFAULT NULL,
+  `flag_envio_por_validacao` tinyint NOT NULL,
+  `flag_envio` tinyint NOT NULL,
+  `flag_exposicao` tinyint NOT NULL,
+  `margem_consolidada` decimal(21,2) NOT NULL,
+  `exposicao_consolidada` varchar(10) NOT NULL,
+  `status_valid` bigint DEFAULT NULL,
+  `status` bigint NOT NULL,
+  `status_envio` varchar(30) NOT NULL,
+  `UltimoEnvio_Ajustado` varchar(20) DEFAULT NULL,
+  `StatusPrazo_Ajustado` varchar(20) DEFAULT NULL,
+  `UltimoEnvio_Ordem` int NOT NULL,
+  `dt_carga_pl` datetime DEFAULT NULL,
+  `dt_carga_exposi` datetime DEFAULT NULL,
+  `dt_carga_entuba` datetime DEFAULT NULL,
+  `dt_calculo` datetime NOT NULL,
+  KEY `idx_mc_cge` (`cge_fundo`),
+  KEY `idx_mc_ordem` (`UltimoEnvio_Ordem`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
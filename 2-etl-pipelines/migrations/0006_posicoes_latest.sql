@@ -0,0 +1,67 @@
+-- ============================================================
+-- 0006 — Latest positions (TB_ENQ_POSICOES_LATEST) + backfill
+-- ============================================================
+-- - Result of 3-transform/positions_latest.sql, maintained by
+--   run_posicoes / run_swaps (atualizar_posicoes_latest)
+-- - hash_swap: SHA1 of the swap legs for 'OTC SWAP' rows,
+--   '' otherwise; NULL Nicknames are stored as ''
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS `TB_ENQ_POSICOES_LATEST` (
+  `CgePortfolio` bigint NOT NULL,
+  `Nickname` varchar(150) NOT NULL DEFAULT '',
+  `hash_swap` char(40) NOT NULL DEFAULT '',
+  `DataCarteira` date DEFAULT NULL,
+  `notional` decimal(20,6) DEFAULT NULL,
+  `ValorCotacao` decimal(20,6) DEFAULT NULL,
+  `NmClassificacao` varchar(150) DEFAULT NULL,
+  `qtyposicao` decimal(20,6) DEFAULT NULL,
+  `IdClassificacao` decimal(10,2) DEFAULT NULL,
+  `valorfinanceiro` decimal(20,6) DEFAULT NULL,
+  `CodAtivo` bigint DEFAULT NULL,
+  `NuIsin` varchar(20) DEFAULT NULL,
+  `CodTipoAtivo` int DEFAULT NULL,
+  `dt_carteira` date NOT NULL,
+  `dt_insercao` timestamp NULL DEFAULT NULL,
+  `ValorSaldoAtivoSwap` decimal(18,6) DEFAULT NULL,
+  `ValorSaldoPassivoSwap` decimal(18,6) DEFAULT NULL,
+  PRIMARY KEY (`CgePortfolio`,`Nickname`,`hash_swap`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+INSERT IGNORE INTO TB_ENQ_POSICOES_LATEST
+    (Nickname, DataCarteira, notional, CgePortfolio, ValorCotacao, NmClassificacao,
+     qtyposicao, IdClassificacao, valorfinanceiro, CodAtivo, NuIsin, CodTipoAtivo,
+     dt_carteira, dt_insercao, ValorSaldoAtivoSwap, ValorSaldoPassivoSwap, hash_swap)
+SELECT
+    COALESCE(Nickname, ''), DataCarteira, notional, CgePortfolio, ValorCotacao, NmClassificacao,
+    qtyposicao, IdClassificacao, valorfinanceiro, CodAtivo, NuIsin, CodTipoAtivo,
+    dt_carteira, dt_insercao, ValorSaldoAtivoSwap, ValorSaldoPassivoSwap, hash_swap
+FROM (
+    SELECT
+        t.*,
+        CASE
+            WHEN t.NmClassificacao = 'OTC SWAP'
+                THEN COALESCE(SHA1(CONCAT(t.notional, '_', t.ValorSaldoAtivoSwap, '_', t.ValorSaldoPassivoSwap)), 'NULL')
+            ELSE ''
+        END AS hash_swap,
+        ROW_NUMBER() OVER (
+            PARTITION BY
+                t.CgePortfolio,
+                t.Nickname,
+                CASE
+                    WHEN t.NmClassificacao = 'OTC SWAP'
+                        THEN CONCAT(t.notional, '_', t.ValorSaldoAtivoSwap, '_', t.ValorSaldoPassivoSwap)
+                    ELSE ''
+                END
+            ORDER BY t.dt_insercao DESC
+        ) AS rn
+    FROM TB_ENQ_POSICOES_FUNDOS_EXPOSTOS t
+    INNER JOIN (
+        SELECT CgePortfolio, MAX(dt_carteira) AS max_dt
+        FROM TB_ENQ_POSICOES_FUNDOS_EXPOSTOS
+        GROUP BY CgePortfolio
+    ) ult
+        ON  t.CgePortfolio = ult.CgePortfolio
+        AND t.dt_carteira  = ult.max_dt
+) s
+WHERE rn = 1;
@@ -0,0 +1,99 @@
+-- ============================================================
+-- 0007 — ClassificacaoFiltro on positions + monthly exterior /
+--        offshore aggregate (TB_ENQ_POSICOES_EXTERIOR_MENSAL)
+-- ============================================================
+-- - ClassificacaoFiltro is filled by the positions / swaps
+--   jobs at load time; history is backfilled below with the
+--   rule of 3-transform/positions_exterior_aggregation.sql
+--   (cutover 2025-12-02 15:45:56)
+-- - The aggregate is kept in sync by atualizar_exterior_mensal;
+--   the last statement is also the full-rebuild statement
+-- ============================================================
+
+ALTER TABLE TB_ENQ_POSICOES_FUNDOS_EXPOSTOS
+  ADD COLUMN `ClassificacaoFiltro` varchar(30) DEFAULT NULL,
+  ADD INDEX idx_pos_cge_datacarteira (CgePortfolio, DataCarteira);
+
+ALTER TABLE TB_ENQ_POSICOES_LATEST
+  ADD COLUMN `ClassificacaoFiltro` varchar(30) DEFAULT NULL;
+
+UPDATE TB_ENQ_POSICOES_FUNDOS_EXPOSTOS A
+LEFT JOIN TB_ENQ_DE_PARA_COD_ATIVO B
+       ON A.CodTipoAtivo = B.codTipoAtivo
+SET A.ClassificacaoFiltro =
+    CASE
+        WHEN B.descricao = 'OPÇÃO BM&F' OR A.NmClassificacao = 'OTC OPC'
+            THEN 'OPÇÃO BM&F'
+        WHEN A.NmClassificacao = 'OTC SWAP'
+            THEN 'OTC SWAP'
+        WHEN A.NmClassificacao = 'Investimento no Exterior'
+            THEN 'Exterior'
+        WHEN A.NmClassificacao = 'Fundo Offshore' AND A.dt_insercao >= '2025-12-02 15:45:56'
+            THEN 'Fundo Offshore'
+        WHEN A.NmClassificacao = 'Fundo Offshore'
+            THEN 'Exterior'
+        ELSE 'Outros'
+    END;
+
+UPDATE TB_ENQ_POSICOES_LATEST L
+JOIN TB_ENQ_POSICOES_FUNDOS_EXPOSTOS A
+  ON  A.CgePortfolio = L.CgePortfolio
+  AND A.dt_carteira  = L.dt_carteira
+  AND A.dt_insercao  = L.dt_insercao
+  AND COALESCE(A.Nickname, '') = L.Nickname
+SET L.ClassificacaoFiltro = A.ClassificacaoFiltro;
+
+CREATE TABLE IF NOT EXISTS `TB_ENQ_POSICOES_EXTERIOR_MENSAL` (
+  `CgePortfolio` bigint NOT NULL,
+  `ano` smallint NOT NULL,
+  `mes` tinyint NOT NULL,
+  `DataCarteira` date NOT NULL,
+  `SomaExterior_Offshore` decimal(32,6) DEFAULT NULL,
+  `dt_insercao` timestamp NULL DEFAULT NULL,
+  `ClassificacaoFiltro` varchar(30) NOT NULL,
+  PRIMARY KEY (`CgePortfolio`,`ano`,`mes`),
+  KEY `idx_ext_datacarteira` (`DataCarteira`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+REPLACE INTO TB_ENQ_POSICOES_EXTERIOR_MENSAL
+    (CgePortfolio, ano, mes, DataCarteira, SomaExterior_Offshore,
+     dt_insercao, ClassificacaoFiltro)
+SELECT
+    CgePortfolio, ano, mes, DataCarteira, SomaExterior_Offshore,
+    dt_insercao, ClassificacaoFiltro
+FROM (
+    SELECT
+        s.*,
+        ROW_NUMBER() OVER (
+            PARTITION BY CgePortfolio, ano, mes
+            ORDER BY DataCarteira DESC, dt_insercao DESC
+        ) AS rn2
+    FROM (
+        SELECT
+            CgePortfolio,
+            YEAR(DataCarteira)  AS ano,
+            MONTH(DataCarteira) AS mes,
+            DataCarteira,
+            SUM(valorfinanceiro) AS SomaExterior_Offshore,
+            dt_insercao,
+            ClassificacaoFiltro
+        FROM (
+            SELECT
+                A.*,
+                ROW_NUMBER() OVER (
+                    PARTITION BY A.CgePortfolio, A.Nickname, A.dt_carteira
+                    ORDER BY A.dt_insercao DESC
+                ) AS rn
+            FROM TB_ENQ_POSICOES_FUNDOS_EXPOSTOS A
+            WHERE A.CgePortfolio IS NOT NULL
+              AND A.DataCarteira IS NOT NULL
+        ) f
+        WHERE rn = 1
+          AND (
+                (ClassificacaoFiltro = 'Exterior'       AND dt_insercao <  '2025-12-02 15:45:56')
+             OR (ClassificacaoFiltro = 'Fundo Offshore' AND dt_insercao >= '2025-12-02 15:45:56')
+          )
+        GROUP BY CgePortfolio, DataCarteira, dt_insercao, ClassificacaoFiltro
+    ) s
+) t
+WHERE rn2 = 1;
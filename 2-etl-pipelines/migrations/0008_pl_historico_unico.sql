@@ -0,0 +1,16 @@
+-- ============================================================
+-- 0008 — Unique (cgePortfolio, data) on TB_ENQ_PL_HISTORICO
+-- ============================================================
+-- - Backs the upsert load mode (PL_HISTORICO_LOAD_MODE=upsert):
+--   re-running a date updates its rows instead of appending
+--   a duplicate set
+-- - Existing duplicates must be collapsed first:
+--     python -m app.cli compact pl_historico
+-- - `data` is the partitioning column (0003), so the key is
+--   valid on the partitioned table
+-- - idx_plh_cge_data stays: it covers the PL columns for the
+--   month-end rollup
+-- ============================================================
+
+ALTER TABLE TB_ENQ_PL_HISTORICO
+  ADD UNIQUE KEY uq_plh_cge_data (cgePortfolio, `data`);
@@ -0,0 +1,51 @@
+-- ============================================================
+-- 0009 — Delta (change-data-only) manager margin snapshots
+-- ============================================================
+-- - hash_linha: SHA1 of the row values, written by
+--   run_margem in delta mode (MARGEM_DELTA=true); NULL for
+--   rows loaded in full mode
+-- - TB_ENQ_MARGEM_LOTE_MEMBROS: (dt_carga, id_carga) of every
+--   row belonging to a delta batch, reused or new
+-- - VW_ENQ_MARGEM_GESTOR_ULTIMO_LOTE: full latest batch with
+--   the original snapshot columns; delta batches come from the
+--   membership table, full batches from dt_carga
+-- ============================================================
+
+ALTER TABLE TB_ENQ_MARGEM_GESTOR_SNAPSHOT
+  ADD COLUMN `hash_linha` char(40) DEFAULT NULL;
+
+CREATE TABLE IF NOT EXISTS `TB_ENQ_MARGEM_LOTE_MEMBROS` (
+  `dt_carga` datetime NOT NULL,
+  `id_carga` bigint NOT NULL,
+  PRIMARY KEY (`dt_carga`,`id_carga`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+CREATE OR REPLACE VIEW VW_ENQ_MARGEM_GESTOR_ULTIMO_LOTE AS
+SELECT
+    s.id_carga, u.dt_carga, s.CgeGestor, s.DataEnvio, s.Status, s.Cnpj,
+    s.CgePortfolio, s.NomePortfolio, s.MargemLocal, s.MargemOffshore, s.MetologiaUtilizada
+FROM (
+    SELECT MAX(dt_carga) AS dt_carga
+    FROM TB_ENQ_LOTES
+    WHERE tabela = 'TB_ENQ_MARGEM_GESTOR_SNAPSHOT'
+) u
+JOIN TB_ENQ_MARGEM_LOTE_MEMBROS mb
+    ON mb.dt_carga = u.dt_carga
+JOIN TB_ENQ_MARGEM_GESTOR_SNAPSHOT s
+    ON s.id_carga = mb.id_carga
+UNION ALL
+SELECT
+    s.id_carga, s.dt_carga, s.CgeGestor, s.DataEnvio, s.Status, s.Cnpj,
+    s.CgePortfolio, s.NomePortfolio, s.MargemLocal, s.MargemOffshore, s.MetologiaUtilizada
+FROM (
+    SELECT MAX(dt_carga) AS dt_carga
+    FROM TB_ENQ_LOTES
+    WHERE tabela = 'TB_ENQ_MARGEM_GESTOR_SNAPSHOT'
+) u
+JOIN TB_ENQ_MARGEM_GESTOR_SNAPSHOT s
+    ON s.dt_carga = u.dt_carga
+WHERE NOT EXISTS (
+    SELECT 1
+    FROM TB_ENQ_MARGEM_LOTE_MEMBROS mb
+    WHERE mb.dt_carga = u.dt_carga
+);
@@ -0,0 +1,91 @@
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# app.db builds the engines at import time (no connection is made);
+# the ports only need to be valid integers
+for _var in ["DB_REMOTE_PORT", "DB_LOCAL_PORT"]:
+    os.environ.setdefault(_var, "3306")
+
+
+class StubMetabase(ThreadingHTTPServer):
+    # Local stand-in for the Metabase card endpoints:
+    # /api/card/<n>/query/json answers [{"n": <n>}] after a delay
+    # that varies with n (responses finish out of order);
+    # /api/card/erro/query/json answers 500. With exigir_login,
+    # cards answer 401 until POST /api/session (slow, counted in
+    # logins) has been called
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _StubHandler)
+        self.chegadas = []
+        self.lock = threading.Lock()
+        self.exigir_login = False
+        self.autenticado = False
+        self.logins = 0
+
+    @property
+    def base(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status, corpo):
+        dados = json.dumps(corpo).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _tratar(self):
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        if tamanho:
+            self.rfile.read(tamanho)
+
+        with self.server.lock:
+            self.server.chegadas.append((self.path, time.monotonic()))
+
+        if self.path == "/api/session":
+            with self.server.lock:
+                self.server.logins += 1
+            time.sleep(0.1)
+            self.server.autenticado = True
+            return self._responder(200, {"id": "sessao-stub"})
+
+        if self.server.exigir_login and not self.server.autenticado:
+            return self._responder(401, {"erro": "sem sessao"})
+
+        m = re.match(r"^/api/card/(\w+)/query/json", self.path)
+        if not m:
+            return self._responder(404, {"erro": self.path})
+        if m.group(1) == "erro":
+            return self._responder(500, {"erro": "falha simulada"})
+
+        n = int(m.group(1))
+        time.sleep((3 - n % 3) * 0.03)
+        self._responder(200, [{"n": n}])
+
+    do_GET = _tratar
+    do_POST = _tratar
+
+
+@pytest.fixture
+def stub_metabase():
+    servidor = StubMetabase()
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield servidor
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
@@ -0,0 +1,33 @@
+import importlib
+import os
+import subprocess
+import sys
+
+from app.cli import JOB_FUNCOES
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _modulos_carregados(codigo):
+    saida = subprocess.run(
+        [sys.executable, "-c", codigo + "; import sys; print(' '.join(sys.modules))"],
+        cwd=RAIZ, capture_output=True, text=True, check=True,
+        env={**os.environ, "DB_REMOTE_PORT": "3306", "DB_LOCAL_PORT": "3306"},
+    )
+    return set(saida.stdout.split())
+
+
+def test_todo_job_aponta_para_uma_funcao():
+    for modulo, funcao in JOB_FUNCOES.values():
+        assert callable(getattr(importlib.import_module(modulo), funcao))
+
+
+def test_cli_nao_importa_dependencias_pesadas():
+    modulos = _modulos_carregados("import app.cli")
+    assert not {"pandas", "sqlalchemy", "requests", "tkinter", "app.jobs"} & modulos
+
+
+def test_backup_nao_carrega_o_cliente_metabase():
+    modulos = _modulos_carregados("import app.backup")
+    assert "app.jobs" not in modulos
+    assert "requests" not in modulos
@@ -0,0 +1,170 @@
+# ============================================================
+# calcular_margem_consolidada VS margin_consolidated.sql
+# ============================================================
+# In-memory fixture frames shaped like the source CTEs (PL /
+# EXPOSI / ENTUBA / V / E); each row is checked against the
+# value the CASE rules of 3-transform/margin_consolidated.sql
+# give for it. The live-MySQL comparison of both engines is
+# bench/parity_margin_consolidated.py.
+# ============================================================
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.jobs import COLS_MARGEM_CONSOLIDADA, calcular_margem_consolidada
+
+HOJE = pd.Timestamp("2025-06-30")
+CARGA = pd.Timestamp("2025-06-30 08:00:00")
+d = pd.Timestamp
+
+
+def fontes():
+    pl = pd.DataFrame([
+        # cge, publicoAlvo
+        (10, "Não qualificado"),
+        (11, "Qualificado"),
+        (12, "Geral"),
+        (13, "Investidor Profissional"),
+        (14, "Qualificado"),
+        (15, "NAO QUALIFICADO"),
+        (None, "Qualificado"),
+        (17, "Qualificado"),
+    ], columns=["cgePortfolio", "publicoAlvo"])
+    pl["nomeFundo"] = "FUNDO"
+    pl["descClasseCvm"] = "Multimercado"
+    pl["nomeGestor"] = "GESTORA"
+    pl["pl"] = 1e6
+    pl["dt_carga_pl"] = CARGA
+
+    exposi = pd.DataFrame([
+        (10, "OTC SWAP"),
+        (11, "OTC OPC"),
+        (12, "Fundo Offshore"),
+        (13, "OTC SWAP"),
+        (15, "otc swap"),
+        (None, "OTC SWAP"),          # NULL key: never joins
+        (17, "OTC OPC"),
+    ], columns=["cgePortfolio", "origem"])
+    exposi["dt_carga_exposi"] = CARGA
+
+    entuba = pd.DataFrame([
+        (10, d("2025-06-25"), 100.0, None),
+        (11, d("2025-05-01"), 50.0, 25.0),
+        (14, d("2025-06-01"), None, None),
+        (17, d("2025-05-31"), None, 10.0),
+    ], columns=["cgePortfolio", "DataEnvio", "MargemLocal", "MargemOffshore"])
+    entuba["dt_carga_entuba"] = CARGA
+
+    v = pd.DataFrame([
+        (11, None, 1),
+        (12, d("2025-06-10"), 0),
+    ], columns=["cgePortfolio", "data_validacao", "status_valid"])
+
+    e = pd.DataFrame([(13, 1)], columns=["cgePortfolio", "status"])
+
+    return {"pl": pl, "exposi": exposi, "entuba": entuba, "v": v, "e": e}
+
+
+# cge → expected columns (SQL CASE rules evaluated by hand, CURDATE() = HOJE)
+ESPERADO = {
+    # OTC / Não qualificado → 7 days; sent 5 days ago
+    10: dict(exposicao_consolidada="OTC", periodicidade_dias=7,
+             data_limite_proximo_envio=d("2025-07-02"), dias_para_limite=2,
+             status_prazo="Em Dia", flag_envio_por_validacao=0, flag_envio=1, flag_exposicao=1,
+             margem_consolidada=100.0, status_envio="Recebido e N/ Validado",
+             UltimoEnvio_Ajustado="25/06/2025", StatusPrazo_Ajustado="Em Dia", UltimoEnvio_Ordem=8),
+    # OTC / Qualificado → 30 days, overdue; V row without date, status_valid = 1
+    11: dict(exposicao_consolidada="OTC", periodicidade_dias=30,
+             data_limite_proximo_envio=d("2025-05-31"), dias_para_limite=-30,
+             status_prazo="Pendente", flag_envio_por_validacao=0, flag_envio=1, flag_exposicao=1,
+             margem_consolidada=75.0, status_envio="Recebido e Validado",
+             UltimoEnvio_Ajustado="01/05/2025", StatusPrazo_Ajustado="Pendente", UltimoEnvio_Ordem=4),
+    # OFFSHORE → 30 days; no send, validation date becomes the effective
+    # send (flag_envio_por_validacao); the 100% rule needs a NULL
+    # effective date, so the date is shown
+    12: dict(exposicao_consolidada="OFFSHORE", periodicidade_dias=30,
+             data_limite_proximo_envio=d("2025-07-10"), dias_para_limite=10,
+             status_prazo="Em Dia", flag_envio_por_validacao=1, flag_envio=0, flag_exposicao=1,
+             margem_consolidada=0.0, status_envio="Recebido e Validado",
+             UltimoEnvio_Ajustado="10/06/2025", StatusPrazo_Ajustado="N/A", UltimoEnvio_Ordem=7),
+    # OTC / Investidor Profissional → 90 days; never sent, exception status = 1
+    13: dict(exposicao_consolidada="OTC", periodicidade_dias=90,
+             data_limite_proximo_envio=None, dias_para_limite=None,
+             status_prazo="Sem Envio", flag_envio_por_validacao=0, flag_envio=0, flag_exposicao=1,
+             margem_consolidada=0.0, status_envio="Recebido e Validado",
+             UltimoEnvio_Ajustado=None, StatusPrazo_Ajustado="Sem Envio", UltimoEnvio_Ordem=2),
+    # No exposure: periodicity NULL, so the deadline is NULL too
+    14: dict(exposicao_consolidada="N/A", periodicidade_dias=None,
+             data_limite_proximo_envio=None, dias_para_limite=None,
+             status_prazo="N/A", flag_envio_por_validacao=0, flag_envio=1, flag_exposicao=0,
+             margem_consolidada=0.0, status_envio="N/A",
+             UltimoEnvio_Ajustado="01/06/2025", StatusPrazo_Ajustado="N/A", UltimoEnvio_Ordem=6),
+    # Case / accent insensitive match (utf8mb4_0900_ai_ci)
+    15: dict(exposicao_consolidada="OTC", periodicidade_dias=7,
+             data_limite_proximo_envio=None, dias_para_limite=None,
+             status_prazo="Sem Envio", flag_envio_por_validacao=0, flag_envio=0, flag_exposicao=1,
+             margem_consolidada=0.0, status_envio="Não Recebido",
+             UltimoEnvio_Ajustado=None, StatusPrazo_Ajustado="Sem Envio", UltimoEnvio_Ordem=3),
+    # NULL CGE: joins nothing, sorts first among the NULL dates
+    None: dict(exposicao_consolidada="N/A", periodicidade_dias=None,
+               data_limite_proximo_envio=None, dias_para_limite=None,
+               status_prazo="N/A", flag_envio_por_validacao=0, flag_envio=0, flag_exposicao=0,
+               margem_consolidada=0.0, status_envio="N/A",
+               UltimoEnvio_Ajustado=None, StatusPrazo_Ajustado="N/A", UltimoEnvio_Ordem=1),
+    # Deadline equal to CURDATE() is still 'Em Dia'
+    17: dict(exposicao_consolidada="OTC", periodicidade_dias=30,
+             data_limite_proximo_envio=d("2025-06-30"), dias_para_limite=0,
+             status_prazo="Em Dia", flag_envio_por_validacao=0, flag_envio=1, flag_exposicao=1,
+             margem_consolidada=10.0, status_envio="Recebido e N/ Validado",
+             UltimoEnvio_Ajustado="31/05/2025", StatusPrazo_Ajustado="Em Dia", UltimoEnvio_Ordem=5),
+}
+
+
+def _valor(v):
+    if v is None or v is pd.NA or (isinstance(v, float) and np.isnan(v)) or v is pd.NaT:
+        return None
+    if isinstance(v, np.generic):
+        return v.item()
+    return v
+
+
+@pytest.fixture(scope="module")
+def resultado():
+    return calcular_margem_consolidada(fontes(), HOJE)
+
+
+def test_layout(resultado):
+    assert list(resultado.columns) == COLS_MARGEM_CONSOLIDADA
+    assert len(resultado) == len(ESPERADO)
+
+
+@pytest.mark.parametrize("cge", list(ESPERADO), ids=lambda c: f"cge_{c}")
+def test_linha(resultado, cge):
+    chave = resultado["cge_fundo"].isna() if cge is None else resultado["cge_fundo"] == cge
+    linha = resultado[chave]
+    assert len(linha) == 1
+
+    linha = linha.iloc[0]
+    for coluna, esperado in ESPERADO[cge].items():
+        assert _valor(linha[coluna]) == esperado, coluna
+
+
+def test_ordem_global(resultado):
+    # 100% rule first, then NULL effective dates (NULL CGE first),
+    # then by effective date and CGE
+    ordem = resultado.sort_values("UltimoEnvio_Ordem")["cge_fundo"]
+    assert [_valor(c) for c in ordem] == [None, 13, 15, 11, 17, 14, 12, 10]
+    assert list(resultado["UltimoEnvio_Ordem"]) == list(range(1, len(resultado) + 1))
+
+
+def test_fontes_sobrevivem_ao_pyformat():
+    # pd.read_sql hands raw strings to PyMySQL with an empty
+    # params dict, which then runs `query % {}`: a literal '%'
+    # must be written '%%'
+    from app.jobs import FONTES_MARGEM_CONSOLIDADA
+
+    for sql in FONTES_MARGEM_CONSOLIDADA.values():
+        sql % {}
+
+    assert "NOT LIKE '%BTG%'" in FONTES_MARGEM_CONSOLIDADA["pl"] % {}
@@ -0,0 +1,53 @@
+# ============================================================
+# mb_fetch_json against a local stub Metabase (thread pool path)
+# ============================================================
+
+import pytest
+import requests
+
+from app import cache, jobs
+from app.throttle import RateLimiter
+
+
+@pytest.fixture(autouse=True)
+def sem_cache(monkeypatch):
+    monkeypatch.setattr(cache, "_modo", "off")
+    monkeypatch.setattr(jobs, "METABASE_ASYNC", False)
+
+
+def _spec(stub, card):
+    return {"method": "GET", "url": f"{stub.base}/api/card/{card}/query/json"}
+
+
+def test_resultados_na_ordem_das_specs(stub_metabase):
+    specs = [_spec(stub_metabase, n) for n in range(9)]
+
+    resultados = jobs.mb_fetch_json(specs, max_workers=4)
+
+    assert resultados == [[{"n": n}] for n in range(9)]
+
+
+def test_excecoes_devolvidas_no_lugar(stub_metabase):
+    specs = [_spec(stub_metabase, 0), _spec(stub_metabase, "erro"), _spec(stub_metabase, 2)]
+
+    resultados = jobs.mb_fetch_json(specs, max_workers=3)
+
+    assert resultados[0] == [{"n": 0}]
+    assert isinstance(resultados[1], requests.HTTPError)
+    assert resultados[2] == [{"n": 2}]
+
+    with pytest.raises(requests.HTTPError):
+        jobs.mb_json(**specs[1])
+
+
+def test_teto_de_requisicoes_por_segundo(stub_metabase):
+    rps = 20
+    specs = [_spec(stub_metabase, n) for n in range(10)]
+
+    jobs.mb_fetch_json(specs, max_workers=10, limiter=RateLimiter(rps))
+
+    chegadas = sorted(t for _, t in stub_metabase.chegadas)
+    assert len(chegadas) == 10
+    # Slots are 1/rps apart; allow scheduling jitter
+    assert chegadas[-1] - chegadas[0] >= (len(chegadas) - 1) / rps * 0.9
+    assert min(b - a for a, b in zip(chegadas, chegadas[1:])) >= 1 / rps * 0.5
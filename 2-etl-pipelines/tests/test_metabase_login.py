@@ -0,0 +1,53 @@
+# ============================================================
+# Single-flight re-login: fifty concurrent 401s → one login
+# ============================================================
+
+import pytest
+
+from app import cache, jobs
+
+
+@pytest.fixture(autouse=True)
+def sem_cache(monkeypatch):
+    monkeypatch.setattr(cache, "_modo", "off")
+
+
+@pytest.fixture
+def stub_com_login(stub_metabase, monkeypatch):
+    stub_metabase.exigir_login = True
+    monkeypatch.setattr(jobs, "METABASE_BASE", stub_metabase.base)
+    return stub_metabase
+
+
+def _specs(stub, n=50):
+    return [{"method": "GET", "url": f"{stub.base}/api/card/{i}/query/json"} for i in range(n)]
+
+
+def test_login_unico_no_pool_de_threads(stub_com_login, monkeypatch):
+    monkeypatch.setattr(jobs, "METABASE_ASYNC", False)
+
+    resultados = jobs.mb_fetch_json(_specs(stub_com_login), max_workers=50)
+
+    assert resultados == [[{"n": i}] for i in range(50)]
+    assert stub_com_login.logins == 1
+
+
+def test_login_unico_no_cliente_async(stub_com_login, monkeypatch):
+    pytest.importorskip("aiohttp")
+    from app import metabase_async
+
+    monkeypatch.setattr(metabase_async, "METABASE_BASE", stub_com_login.base)
+    monkeypatch.setattr(jobs, "METABASE_ASYNC", True)
+
+    primeiro = jobs.mb_fetch_json(_specs(stub_com_login))
+    _, cliente = metabase_async.cliente_compartilhado()
+
+    # Session expired between two batches of the same job: the
+    # shared client logs in once more, not once per request
+    stub_com_login.autenticado = False
+    segundo = jobs.mb_fetch_json(_specs(stub_com_login))
+
+    assert primeiro == segundo == [[{"n": i}] for i in range(50)]
+    assert stub_com_login.logins == 2
+    assert metabase_async.cliente_compartilhado()[1] is cliente
+    assert cliente.login_count == 2
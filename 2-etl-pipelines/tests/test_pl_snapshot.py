@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from app.jobs import _tipar_coluna
+
+
+def _objetos(valores):
+    return np.array(valores, dtype=object)
+
+
+def test_datas_iso_mistas_em_horario_de_brasilia():
+    bruto = _objetos([
+        "2025-01-02T10:00:00",
+        "2025-01-02T10:00:00.123",
+        "2025-01-02T10:00:00-03:00",
+        "2025-01-02T13:00:00Z",
+        None,
+    ])
+
+    datas = _tipar_coluna(bruto, "datetime", None)
+
+    assert list(datas[:4]) == [
+        pd.Timestamp("2025-01-02 10:00:00"),
+        pd.Timestamp("2025-01-02 10:00:00.123"),
+        pd.Timestamp("2025-01-02 10:00:00"),
+        pd.Timestamp("2025-01-02 10:00:00"),
+    ]
+    assert pd.isna(datas[4])
+
+
+def test_data_com_fuso_nao_muda_de_dia():
+    bruto = _objetos(["2025-01-02T22:00:00-03:00", "2025-01-02"])
+
+    datas = _tipar_coluna(bruto, "date", None)
+
+    assert list(datas) == [pd.Timestamp("2025-01-02")] * 2
+
+
+def test_valores_perdidos_geram_aviso():
+    avisos = []
+
+    datas = _tipar_coluna(_objetos(["2025-01-02", "ontem", "", None]), "datetime", None,
+                          col="dataPosicao", log=avisos.append)
+    flags = _tipar_coluna(_objetos([True, "false", "sim", None]), "tinyint", None,
+                          col="fundoFechado", log=avisos.append)
+
+    assert pd.isna(datas[1])
+    assert list(flags[:2]) == [1, 0] and pd.isna(flags[2])
+    assert len(avisos) == 2
+    assert "dataPosicao: 1 values" in avisos[0] and "'ontem'" in avisos[0]
+    assert "fundoFechado: 1 values" in avisos[1] and "'sim'" in avisos[1]
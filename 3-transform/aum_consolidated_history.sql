@@ -4,21 +4,18 @@ WITH dados_cge AS (
         nomeFundo,
         descClasseCvm
     FROM TB_ENQ_PL_SNAPSHOT
-    WHERE dt_carga = (SELECT MAX(dt_carga) FROM TB_ENQ_PL_SNAPSHOT)
+    WHERE dt_carga = (SELECT MAX(dt_carga) FROM TB_ENQ_LOTES WHERE tabela = 'TB_ENQ_PL_SNAPSHOT')
     ORDER BY cgePortfolio
 ),
 dados_pl AS (
-    SELECT *
-    FROM (
-        SELECT
-            t.*,
-            ROW_NUMBER() OVER (
-                PARTITION BY cgePortfolio, YEAR(`data`), MONTH(`data`)
-                ORDER BY `data` DESC, `dt_carga` DESC
-            ) AS rn
-        FROM TB_ENQ_PL_HISTORICO t
-    ) sub
-    WHERE rn = 1
+    SELECT
+        id_carga,
+        cgePortfolio,
+        `data`,
+        patrimonio_abertura,
+        patrimonio_fechamento,
+        dt_carga
+    FROM TB_ENQ_PL_HISTORICO_MENSAL
 ),
 margem_mes AS (
 SELECT *
@@ -2,5 +2,6 @@ SELECT *
 FROM TB_ENQ_PL_SNAPSHOT
 WHERE dt_carga = (
     SELECT MAX(dt_carga)
-    FROM TB_ENQ_PL_SNAPSHOT
+    FROM TB_ENQ_LOTES
+    WHERE tabela = 'TB_ENQ_PL_SNAPSHOT'
 );
@@ -3,5 +3,6 @@ SELECT
 FROM TB_ENQ_EXPOSI_RISCO_SNAPSHOT
 WHERE dt_carga = (
     SELECT MAX(dt_carga)
-    FROM TB_ENQ_EXPOSI_RISCO_SNAPSHOT
+    FROM TB_ENQ_LOTES
+    WHERE tabela = 'TB_ENQ_EXPOSI_RISCO_SNAPSHOT'
 );
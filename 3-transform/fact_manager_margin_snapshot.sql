@@ -1,3 +1,3 @@
-SELECT * 
-    FROM TB_ENQ_MARGEM_GESTOR_SNAPSHOT
-WHERE dt_carga = (SELECT MAX(dt_carga) FROM TB_ENQ_MARGEM_GESTOR_SNAPSHOT);
+-- Full latest batch (delta or full load), see migration 0009
+SELECT *
+    FROM VW_ENQ_MARGEM_GESTOR_ULTIMO_LOTE;
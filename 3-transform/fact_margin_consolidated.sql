@@ -0,0 +1,3 @@
+SELECT *
+FROM TB_ENQ_MARGEM_CONSOLIDADA
+ORDER BY UltimoEnvio_Ordem;
@@ -13,7 +13,7 @@ PL AS (
         p.dt_carga AS dt_carga_pl
     FROM TB_ENQ_PL_SNAPSHOT p
     WHERE p.nomeGestor NOT LIKE '%BTG%'
-      AND p.dt_carga = (SELECT MAX(dt_carga) FROM TB_ENQ_PL_SNAPSHOT)
+      AND p.dt_carga = (SELECT MAX(dt_carga) FROM TB_ENQ_LOTES WHERE tabela = 'TB_ENQ_PL_SNAPSHOT')
 ),
 
 EXPOSI AS (
@@ -22,7 +22,7 @@ EXPOSI AS (
         e.origem,
         e.dt_carga AS dt_carga_exposi
     FROM TB_ENQ_EXPOSI_RISCO_SNAPSHOT e
-    WHERE e.dt_carga = (SELECT MAX(dt_carga) FROM TB_ENQ_EXPOSI_RISCO_SNAPSHOT)
+    WHERE e.dt_carga = (SELECT MAX(dt_carga) FROM TB_ENQ_LOTES WHERE tabela = 'TB_ENQ_EXPOSI_RISCO_SNAPSHOT')
 ),
 
 ENTUBA AS (
@@ -32,8 +32,7 @@ ENTUBA AS (
         CAST(m.MargemLocal AS DECIMAL(20,2)) AS MargemLocal,
         CAST(m.MargemOffshore AS DECIMAL(20,2)) AS MargemOffshore,
         m.dt_carga AS dt_carga_entuba
-    FROM TB_ENQ_MARGEM_GESTOR_SNAPSHOT m
-    WHERE m.dt_carga = (SELECT MAX(dt_carga) FROM TB_ENQ_MARGEM_GESTOR_SNAPSHOT)
+    FROM VW_ENQ_MARGEM_GESTOR_ULTIMO_LOTE m
 ),
 
 V AS (